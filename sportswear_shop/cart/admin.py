@@ -1,3 +1,20 @@
+from typing import Any
+
 from django.contrib import admin
 
-# Register your models here.
+from .models import StockReservation
+
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ('product', 'cart', 'quantity', 'expires_at')
+    list_select_related = ('product', 'cart')
+    ordering = ('expires_at',)
+    search_fields = ('product__name',)
+    raw_id_fields = ('cart', 'product')
+
+    def has_add_permission(self, request: Any) -> bool:
+        """
+        Резервы создаются корзиной.
+        """
+        return False
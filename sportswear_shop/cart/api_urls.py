@@ -0,0 +1,7 @@
+from django.urls import path
+
+from .api_views import CartBatchAPIView
+
+urlpatterns = [
+    path('cart/batch/', CartBatchAPIView.as_view(), name='api_cart_batch'),
+]
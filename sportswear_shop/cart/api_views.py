@@ -0,0 +1,60 @@
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from . import reservations
+from .backends import get_cart_backend
+from .pricing import SESSION_DISCOUNT_KEY, CartSummary, get_cart_summary
+from .serializers import CartBatchSerializer
+
+
+def summary_data(summary: CartSummary) -> dict:
+    """
+    Представление итогов корзины для JSON-ответа; суммы — строками, без потери точности.
+    """
+    return {
+        'lines': [
+            {'product_id': line.product.pk, 'quantity': line.quantity,
+             'subtotal': str(line.subtotal), 'total': str(line.total)}
+            for line in summary.lines
+        ],
+        'subtotal': str(summary.subtotal),
+        'discount_amount': str(summary.discount_amount),
+        'total': str(summary.total),
+    }
+
+
+class CartBatchAPIView(APIView):
+    """
+    API endpoint для пачки изменений корзины.
+
+    Принимает {"operations": [{"op": "add"|"set"|"remove", "product_id": ..., "quantity": ...}]},
+    применяет операции одной транзакцией и один раз возвращает новые итоги.
+    Интерфейс может копить быстрые клики и отправлять их одним запросом.
+    Доступно и анонимным покупателям (корзина сессии).
+    """
+    def post(self, request: Request) -> Response:
+        """
+        Применяет операции к корзине.
+
+        :param request: запрос с телом {"operations": [...]}
+        :return: строки и итоги корзины; 409, если товара не хватает
+        """
+        serializer = CartBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        operations = serializer.validated_data['operations']
+        backend = get_cart_backend(request)
+        try:
+            backend.apply(
+                [(operation['op'], operation['product_id'], operation['quantity']) for operation in operations],
+                {operation['product_id']: operation['product'] for operation in operations},
+            )
+        except reservations.InsufficientStock as error:
+            return Response({
+                'error': 'Недостаточно товара на складе',
+                'product_id': error.product_id,
+                'available': error.available,
+            }, status=status.HTTP_409_CONFLICT)
+        summary = get_cart_summary(backend, request.session.get(SESSION_DISCOUNT_KEY))
+        return Response(summary_data(summary))
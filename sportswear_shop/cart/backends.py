@@ -0,0 +1,500 @@
+import logging
+import secrets
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+from typing import Any, Iterable, Iterator, Mapping, Optional
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, BaseCache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.http import HttpRequest
+from django.utils.module_loading import import_string
+
+from shop.models import Product
+
+from . import reservations
+from .models import Cart, CartItem
+
+logger = logging.getLogger(__name__)
+
+SESSION_TOKEN_KEY = 'cart_token'
+DEFAULT_BACKEND = 'cart.backends.DatabaseCartBackend'
+DEFAULT_FLUSH_EVERY = 10
+CACHE_TIMEOUT = 60 * 60 * 24 * 7
+# Блокировка кеш-корзины на время чтения-изменения-записи
+LOCK_TIMEOUT = 10
+LOCK_WAIT = 5.0
+LOCK_POLL_INTERVAL = 0.01
+
+
+def cart_cache() -> BaseCache:
+    """
+    Возвращает кеш кеш-корзины (псевдоним из настройки CART_CACHE).
+    """
+    return caches[getattr(settings, 'CART_CACHE', DEFAULT_CACHE_ALIAS)]
+
+
+def sync_items(cart: Cart, lines: Mapping[int, int], partial: bool = False) -> None:
+    """
+    Приводит строки CartItem корзины к заданным количествам пачкой.
+
+    Выполняет не больше одного удаления, одного bulk_update и одного
+    bulk_create независимо от числа строк.
+
+    :param cart: Корзина.
+    :param lines: Словарь {ID товара: количество}; 0 удаляет строку.
+    :param partial: Менять только товары из lines (иначе лишние строки удаляются).
+    """
+    with transaction.atomic():
+        items = {item.product_id: item for item in cart.items.all()}
+        stale = [item.pk for product_id, item in items.items()
+                 if not lines.get(product_id) and (product_id in lines or not partial)]
+        changed = [item for product_id, item in items.items()
+                   if lines.get(product_id) and item.quantity != lines[product_id]]
+        for item in changed:
+            item.quantity = lines[item.product_id]
+        if stale:
+            CartItem.objects.filter(pk__in=stale).delete()
+        CartItem.objects.bulk_update(changed, ['quantity'])
+        CartItem.objects.bulk_create([
+            CartItem(cart=cart, product_id=product_id, quantity=quantity)
+            for product_id, quantity in lines.items() if quantity and product_id not in items
+        ])
+
+
+class BaseCartBackend:
+    """
+    Хранилище корзины: строки {ID товара: количество} и текущая сумма.
+
+    Корзина принадлежит пользователю или анонимному покупателю (токен в
+    сессии). Запись в БД (Cart) создаётся лениво — при первом резерве
+    товара или при сохранении строк. Увеличение количества резервирует
+    товар (см. cart.reservations).
+    """
+
+    def __init__(self, user: Any = None, token: Optional[str] = None) -> None:
+        """
+        :param user: Вошедший пользователь или None.
+        :param token: Токен анонимной корзины из сессии.
+        """
+        self.user = user if user is not None and user.is_authenticated else None
+        self.token = token
+        self._cart: Optional[Cart] = None
+        # Номер изменения в рамках запроса: по нему сбрасываются запомненные итоги
+        self.revision = 0
+
+    def get_cart(self, create: bool = True) -> Optional[Cart]:
+        """
+        Возвращает запись корзины в БД, при необходимости создавая её.
+
+        :param create: Создать запись, если её ещё нет.
+        :return: Корзина или None.
+        """
+        if self._cart is None:
+            owner = {'user': self.user} if self.user else {'token': self.token}
+            self._cart = Cart.objects.filter(**owner).order_by('pk').first()
+            if self._cart is None and create:
+                self._cart = Cart.objects.create(**owner)
+        return self._cart
+
+    @property
+    def lines(self) -> dict[int, int]:
+        raise NotImplementedError
+
+    @property
+    def total(self) -> Decimal:
+        raise NotImplementedError
+
+    def quantity(self, product_id: int) -> int:
+        return self.lines.get(product_id, 0)
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """
+        Защищает чтение-изменение-запись строк от параллельных запросов
+        той же корзины; бэкенду БД отдельная блокировка не нужна.
+        """
+        yield
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+    def add(self, product: Product, quantity: int = 1) -> int:
+        """
+        Увеличивает количество товара в корзине.
+
+        :return: Новое количество.
+        :raises reservations.InsufficientStock: Если товара не хватает.
+        """
+        with self._locked():
+            return self.set(product, self.quantity(product.pk) + quantity)
+
+    def set(self, product: Product, quantity: int) -> int:
+        """
+        Устанавливает количество товара; 0 удаляет строку.
+
+        Резерв обновляется до записи строки, так что при нехватке товара
+        корзина не меняется. Уменьшение количества не может упасть: если
+        резерв уже истёк и остаток разобран, количество проверится при
+        оформлении заказа.
+
+        :return: Новое количество.
+        :raises reservations.InsufficientStock: Если товара не хватает для увеличения.
+        """
+        if quantity <= 0:
+            self.remove(product.pk)
+            return 0
+        with self._locked():
+            try:
+                reservations.reserve(self.get_cart(), product, quantity)
+            except reservations.InsufficientStock:
+                if quantity > self.quantity(product.pk):
+                    raise
+            self._store(product, quantity)
+        self.revision += 1
+        return quantity
+
+    def remove(self, product_id: int) -> None:
+        """
+        Удаляет товар из корзины и снимает его резерв.
+        """
+        cart = self.get_cart(create=False)
+        if cart is not None:
+            reservations.release(cart, [product_id])
+        with self._locked():
+            self._delete(product_id)
+        self.revision += 1
+
+    def clear(self) -> None:
+        """
+        Очищает корзину (например, после оформления заказа).
+        """
+        cart = self.get_cart(create=False)
+        if cart is not None:
+            reservations.release(cart)
+        with self._locked():
+            for product_id in list(self.lines):
+                self._delete(product_id)
+        self.revision += 1
+
+    def apply(self, operations: Iterable[tuple[str, int, int]], products: Mapping[int, Product],
+              reserve_available: bool = False) -> dict[int, int]:
+        """
+        Применяет пачку операций одной транзакцией.
+
+        Операции сворачиваются в итоговые количества, резервы меняются одним
+        вызовом reserve_many, строки записываются пачкой. Если какого-либо
+        товара не хватает, корзина не меняется.
+
+        :param operations: Кортежи (операция, ID товара, количество): 'add', 'set' или 'remove'.
+        :param products: Товары операций по ID.
+        :param reserve_available: При нехватке резервировать доступный остаток, а не отклонять
+            пачку; количество проверится при оформлении заказа.
+        :return: Строки корзины после изменений.
+        :raises reservations.InsufficientStock: Если товара не хватает для увеличения.
+        """
+        with self._locked():
+            current = self.lines
+            final = dict(current)
+            for operation, product_id, quantity in operations:
+                if operation == 'add':
+                    final[product_id] = final.get(product_id, 0) + quantity
+                elif operation == 'set':
+                    final[product_id] = quantity
+                else:
+                    final[product_id] = 0
+            changes = {product_id: quantity for product_id, quantity in final.items()
+                       if quantity != current.get(product_id, 0)}
+            if changes:
+                with transaction.atomic():
+                    reservations.reserve_many(self.get_cart(), changes, final if reserve_available else current)
+                    self._store_many({product_id: (products[product_id], quantity)
+                                      for product_id, quantity in changes.items()})
+                self.revision += 1
+        return {product_id: quantity for product_id, quantity in final.items() if quantity}
+
+    def flush(self) -> None:
+        """
+        Сохраняет строки в БД; для бэкенда БД ничего не делает.
+        """
+
+    def discard(self) -> None:
+        """
+        Удаляет корзину целиком вместе со строками и резервами.
+        """
+        cart = self.get_cart(create=False)
+        if cart is not None:
+            cart.delete()
+        self._cart = None
+
+    def _store(self, product: Product, quantity: int) -> None:
+        raise NotImplementedError
+
+    def _delete(self, product_id: int) -> None:
+        raise NotImplementedError
+
+    def _store_many(self, changes: Mapping[int, tuple[Product, int]]) -> None:
+        raise NotImplementedError
+
+
+class DatabaseCartBackend(BaseCartBackend):
+    """
+    Корзина в таблицах Cart/CartItem: каждое изменение сразу пишется в БД.
+    """
+
+    def _items(self) -> list[CartItem]:
+        cart = self.get_cart(create=False)
+        if cart is None:
+            return []
+        return list(cart.items.select_related('product').order_by('pk'))
+
+    @property
+    def lines(self) -> dict[int, int]:
+        lines: dict[int, int] = {}
+        for item in self._items():
+            lines[item.product_id] = lines.get(item.product_id, 0) + item.quantity
+        return lines
+
+    @property
+    def total(self) -> Decimal:
+        return sum((item.product.price * item.quantity for item in self._items()), Decimal('0'))
+
+    def _store(self, product: Product, quantity: int) -> None:
+        cart = self.get_cart()
+        updated = CartItem.objects.filter(cart=cart, product=product).update(quantity=quantity)
+        if not updated:
+            CartItem.objects.create(cart=cart, product=product, quantity=quantity)
+
+    def _delete(self, product_id: int) -> None:
+        cart = self.get_cart(create=False)
+        if cart is not None:
+            CartItem.objects.filter(cart=cart, product_id=product_id).delete()
+
+    def _store_many(self, changes: Mapping[int, tuple[Product, int]]) -> None:
+        sync_items(self.get_cart(), {product_id: quantity for product_id, (_, quantity) in changes.items()},
+                   partial=True)
+
+
+class CacheCartBackend(BaseCartBackend):
+    """
+    Корзина в кеше: строки, цены и сумма хранятся одним значением.
+
+    Клик «+/−» меняет только значение в кеше (и резерв товара), без
+    чтения строк и пересчёта суммы по БД. Строки переносятся в
+    Cart/CartItem пачкой: каждые CART_FLUSH_EVERY изменений, при слиянии
+    корзин и при оформлении заказа. Если кеш потерян, корзина читается из
+    БД — теряются только изменения после последнего сохранения, а резервы
+    потерянных строк снимаются.
+
+    Требует общего для всех процессов кеша (CART_CACHE: БД, Redis,
+    Memcached): с локальным кешем процесса backend_class выбирает
+    DatabaseCartBackend. Изменения строк выполняются под блокировкой
+    (cache.add), так что параллельные запросы одной корзины не теряют
+    изменений друг друга.
+    """
+
+    def __init__(self, user: Any = None, token: Optional[str] = None) -> None:
+        super().__init__(user, token)
+        self.cache = cart_cache()
+        self._state: Optional[dict[str, Any]] = None
+        self._lock_depth = 0
+
+    @property
+    def cache_key(self) -> str:
+        return f'cart:user:{self.user.pk}' if self.user else f'cart:token:{self.token}'
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """
+        Берёт блокировку корзины через cache.add и перечитывает состояние.
+
+        Блокировка повторно входима в рамках экземпляра (add вызывает set).
+        Если владелец не отпускает её дольше LOCK_WAIT (упал или завис),
+        изменение выполняется без неё — блокировка сама истечёт через
+        LOCK_TIMEOUT.
+        """
+        lock_key = f'{self.cache_key}:lock'
+        owner = not self._lock_depth
+        if owner:
+            deadline = time.monotonic() + LOCK_WAIT
+            while not self.cache.add(lock_key, 1, LOCK_TIMEOUT):
+                if time.monotonic() >= deadline:
+                    logger.warning('Корзина %s заблокирована дольше %s с', self.cache_key, LOCK_WAIT)
+                    owner = False
+                    break
+                time.sleep(LOCK_POLL_INTERVAL)
+            self._state = None
+        self._lock_depth += 1
+        try:
+            yield
+        except BaseException:
+            # Состояние могло измениться только в памяти: следующий доступ перечитает кеш
+            self._state = None
+            raise
+        finally:
+            self._lock_depth -= 1
+            if owner:
+                self.cache.delete(lock_key)
+
+    def _load(self) -> dict[str, Any]:
+        if self._state is None:
+            self._state = self.cache.get(self.cache_key)
+        if self._state is None:
+            self._state = self._read_database()
+            # add, а не set: не затирать состояние, записанное параллельным изменением
+            self.cache.add(self.cache_key, self._state, CACHE_TIMEOUT)
+        return self._state
+
+    def _read_database(self) -> dict[str, Any]:
+        lines: dict[int, int] = {}
+        prices: dict[int, Decimal] = {}
+        cart = self.get_cart(create=False)
+        if cart is not None:
+            for product_id, quantity, price in cart.items.values_list('product_id', 'quantity', 'product__price'):
+                lines[product_id] = lines.get(product_id, 0) + quantity
+                prices[product_id] = price
+            # Строки, не дошедшие до БД до потери кеша, не должны держать товар до конца TTL
+            reservations.release_except(cart, lines)
+        return {
+            'lines': lines,
+            'prices': prices,
+            'total': sum((prices[pk] * quantity for pk, quantity in lines.items()), Decimal('0')),
+            'dirty': 0,
+        }
+
+    @property
+    def lines(self) -> dict[int, int]:
+        return dict(self._load()['lines'])
+
+    @property
+    def total(self) -> Decimal:
+        return self._load()['total']
+
+    def _change(self, product_id: int, quantity: int, price: Optional[Decimal]) -> None:
+        state = self._load()
+        previous = state['lines'].pop(product_id, 0)
+        previous_price = state['prices'].pop(product_id, Decimal('0'))
+        state['total'] -= previous_price * previous
+        if quantity:
+            state['lines'][product_id] = quantity
+            state['prices'][product_id] = price
+            state['total'] += price * quantity
+        state['dirty'] += 1
+
+    def _save(self) -> None:
+        if self._load()['dirty'] >= getattr(settings, 'CART_FLUSH_EVERY', DEFAULT_FLUSH_EVERY):
+            self.flush()
+        else:
+            self.cache.set(self.cache_key, self._state, CACHE_TIMEOUT)
+
+    def _store(self, product: Product, quantity: int) -> None:
+        self._change(product.pk, quantity, product.price)
+        self._save()
+
+    def _delete(self, product_id: int) -> None:
+        self._change(product_id, 0, None)
+        self._save()
+
+    def _store_many(self, changes: Mapping[int, tuple[Product, int]]) -> None:
+        # Пачка — естественная единица записи: сохраняем её в БД сразу
+        for product_id, (product, quantity) in changes.items():
+            self._change(product_id, quantity, product.price)
+        self.flush()
+
+    def discard(self) -> None:
+        super().discard()
+        self.cache.delete(self.cache_key)
+        self._state = None
+
+    def flush(self) -> None:
+        """
+        Переносит строки из кеша в CartItem (см. sync_items).
+        """
+        with self._locked():
+            state = self._load()
+            if not state['dirty']:
+                return
+            cart = self.get_cart(create=bool(state['lines']))
+            if cart is not None:
+                sync_items(cart, state['lines'])
+            state['dirty'] = 0
+            self.cache.set(self.cache_key, state, CACHE_TIMEOUT)
+
+
+def shared_cache() -> bool:
+    """
+    Проверяет, что кеш корзин общий для всех процессов (не локальный кеш процесса).
+    """
+    return not isinstance(cart_cache(), (LocMemCache, DummyCache))
+
+
+def backend_class() -> type[BaseCartBackend]:
+    """
+    Возвращает класс хранилища корзины из настройки CART_BACKEND.
+
+    Кеш-корзина с локальным кешем процесса теряла бы изменения при
+    вытеснении, перезапуске или запросе в другой процесс, поэтому в этом
+    случае используется DatabaseCartBackend.
+    """
+    cls = import_string(getattr(settings, 'CART_BACKEND', DEFAULT_BACKEND))
+    if issubclass(cls, CacheCartBackend) and not shared_cache():
+        logger.warning('%s требует общего кеша; корзина хранится в БД', cls.__name__)
+        return DatabaseCartBackend
+    return cls
+
+
+def get_cart_backend(request: HttpRequest) -> BaseCartBackend:
+    """
+    Возвращает корзину текущего покупателя (пользователя или сессии).
+
+    Хранилище запоминается на запросе, так что все обращения в рамках
+    запроса работают с одним состоянием.
+
+    :param request: HTTP-запрос.
+    :return: Хранилище корзины.
+    """
+    backend = getattr(request, '_cart_backend', None)
+    if backend is None:
+        token: Optional[str] = None
+        if not request.user.is_authenticated:
+            token = request.session.get(SESSION_TOKEN_KEY)
+            if token is None:
+                token = request.session[SESSION_TOKEN_KEY] = secrets.token_hex(16)
+        backend = request._cart_backend = backend_class()(request.user, token)
+    return backend
+
+
+def merge_anonymous_cart(request: HttpRequest, user: Any) -> None:
+    """
+    Переносит анонимную корзину сессии в корзину вошедшего пользователя.
+
+    Количества одинаковых товаров складываются. Резервы анонимной корзины
+    снимаются и создаются заново для корзины пользователя одним вызовом
+    apply (reserve_many); если товара уже не хватает, резервируется доступный
+    остаток, а количество проверится при оформлении. Слияние выполняется
+    одной транзакцией: при ошибке обе корзины остаются как были.
+
+    :param request: HTTP-запрос входа.
+    :param user: Вошедший пользователь.
+    """
+    token = request.session.pop(SESSION_TOKEN_KEY, None)
+    if token is None:
+        return
+    cls = backend_class()
+    anonymous = cls(None, token)
+    lines = anonymous.lines
+    with transaction.atomic():
+        anonymous_cart = anonymous.get_cart(create=False)
+        if anonymous_cart is not None:
+            # Иначе резервы анонимной корзины мешали бы зарезервировать те же товары
+            reservations.release(anonymous_cart)
+        if lines:
+            target = cls(user)
+            products = Product.objects.in_bulk(list(lines))
+            target.apply([('add', product_id, quantity) for product_id, quantity in lines.items()
+                          if product_id in products], products, reserve_available=True)
+            target.flush()
+        anonymous.discard()
@@ -0,0 +1,21 @@
+import time
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from cart import reservations
+
+
+class Command(BaseCommand):
+    help = 'Удаляет истёкшие резервы товаров в корзинах (запускать по расписанию, например раз в минуту)'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--batch-size', type=int, default=reservations.EXPIRE_BATCH_SIZE,
+                            help='Количество резервов в пачке удаления')
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        started = time.monotonic()
+        deleted = reservations.expire_stale(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено истёкших резервов: {deleted} за {time.monotonic() - started:.1f} с'
+        ))
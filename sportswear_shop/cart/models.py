@@ -3,10 +3,11 @@ from django.conf import settings
 from shop.models import Product
 
 class Cart(models.Model):
-    """Модель корзины, связанная с пользователем."""
+    """Модель корзины, связанная с пользователем или с сессией анонимного покупателя."""
     user: models.ForeignKey = models.ForeignKey(
-        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='carts'
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='carts', null=True, blank=True
     )
+    token: models.CharField = models.CharField(max_length=32, unique=True, null=True, blank=True)
     created_at: models.DateTimeField = models.DateTimeField(auto_now_add=True)
 
 class CartItem(models.Model):
@@ -22,3 +23,29 @@ class CartItem(models.Model):
         :return: Общая стоимость товара (цена * количество).
         """
         return self.product.price * self.quantity
+
+
+class StockReservation(models.Model):
+    """
+    Временное резервирование товара корзиной.
+
+    Доступный остаток товара — stock минус активные (неистёкшие) резервы.
+    Резерв продлевается при изменении корзины и снимается при оформлении
+    заказа или по истечении срока (см. cart.reservations).
+    """
+    cart: models.ForeignKey = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='reservations')
+    product: models.ForeignKey = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    quantity: models.PositiveIntegerField = models.PositiveIntegerField(default=1)
+    expires_at: models.DateTimeField = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'product'], name='cart_reservation_unique'),
+        ]
+        indexes = [
+            # Сумма активных резервов товара: product_id = ? AND expires_at > now
+            models.Index(fields=['product', 'expires_at'], name='cart_reservation_active_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.product_id} x {self.quantity} до {self.expires_at:%H:%M}"
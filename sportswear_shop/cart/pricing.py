@@ -0,0 +1,135 @@
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Mapping, Optional
+
+from django.db.models import QuerySet
+
+from discounts.resolver import DiscountOffer, offers_for
+from shop.models import Product
+from shop.pricing import LinePrice, price_line, price_totals
+
+from .backends import BaseCartBackend
+
+SESSION_DISCOUNT_KEY = 'cart_discount_id'
+
+
+@dataclass
+class PricedLine:
+    """
+    Строка корзины с ценами на момент расчёта.
+    """
+    product: Product
+    quantity: int
+    offers: list[DiscountOffer] = field(default_factory=list)
+    discount: Optional[DiscountOffer] = None
+
+    @property
+    def unit_price(self) -> Decimal:
+        return self.product.price
+
+    @property
+    def percent(self) -> int:
+        return self.discount.discount_percent if self.discount is not None else 0
+
+    @property
+    def price(self) -> LinePrice:
+        return price_line(self.unit_price, self.quantity, self.percent)
+
+    @property
+    def subtotal(self) -> Decimal:
+        return self.price.subtotal
+
+    @property
+    def discount_amount(self) -> Decimal:
+        return self.price.discount
+
+    @property
+    def total(self) -> Decimal:
+        return self.price.total
+
+
+@dataclass
+class CartSummary:
+    """
+    Итоги корзины: строки, сумма, скидка и сумма к оплате в Decimal.
+    """
+    lines: list[PricedLine]
+    offers: list[DiscountOffer]
+    selected_discount: Optional[DiscountOffer] = None
+
+    @property
+    def totals(self) -> LinePrice:
+        return price_totals((line.unit_price, line.quantity, line.percent) for line in self.lines)
+
+    @property
+    def subtotal(self) -> Decimal:
+        return self.totals.subtotal
+
+    @property
+    def discount_amount(self) -> Decimal:
+        return self.totals.discount
+
+    @property
+    def total(self) -> Decimal:
+        return self.totals.total
+
+    @property
+    def quantity(self) -> int:
+        return sum(line.quantity for line in self.lines)
+
+    def line(self, product_id: int) -> Optional[PricedLine]:
+        for line in self.lines:
+            if line.product.pk == product_id:
+                return line
+        return None
+
+
+def price_lines(lines: Mapping[int, int], discount_id: Optional[int] = None,
+                queryset: Optional[QuerySet] = None) -> CartSummary:
+    """
+    Рассчитывает корзину одним запросом к БД.
+
+    Действующие скидки товаров берутся из индекса скидок (discounts.resolver).
+    Выбранная покупателем скидка применяется к строкам с товарами, на
+    которые она действует; если она не действует ни на один товар
+    корзины, расчёт ведётся без скидки.
+
+    :param lines: Словарь {ID товара: количество}.
+    :param discount_id: Выбранная скидка.
+    :param queryset: Базовый queryset товаров (например, с prefetch изображений).
+    :return: Итоги корзины.
+    """
+    queryset = Product.objects.all() if queryset is None else queryset
+    products = queryset.in_bulk(list(lines))
+    priced = [
+        PricedLine(products[product_id], quantity, sorted(offers_for(product_id), key=lambda offer: offer.id))
+        for product_id, quantity in lines.items() if product_id in products
+    ]
+    available = sorted({offer for line in priced for offer in line.offers},
+                       key=lambda offer: (-offer.discount_percent, offer.id))
+    selected = next((offer for offer in available if offer.id == discount_id), None)
+    if selected is not None:
+        for line in priced:
+            if selected in line.offers:
+                line.discount = selected
+    return CartSummary(priced, available, selected)
+
+
+def get_cart_summary(backend: BaseCartBackend, discount_id: Optional[int] = None,
+                     queryset: Optional[QuerySet] = None) -> CartSummary:
+    """
+    Возвращает итоги корзины, запоминая их до следующего изменения корзины.
+
+    Повторные вызовы в рамках запроса (страница корзины, ответ на клик,
+    оформление заказа) не выполняют запросов.
+
+    :param backend: Хранилище корзины.
+    :param discount_id: Выбранная скидка.
+    :param queryset: Базовый queryset товаров.
+    :return: Итоги корзины.
+    """
+    key = (backend.revision, discount_id)
+    memo = getattr(backend, '_summary', None)
+    if memo is None or memo[0] != key:
+        memo = backend._summary = (key, price_lines(backend.lines, discount_id, queryset))
+    return memo[1]
@@ -0,0 +1,197 @@
+from datetime import datetime, timedelta
+from typing import Iterable, Mapping, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, Now
+from django.utils import timezone
+
+from shop import cache as shop_cache
+from shop.models import Product
+
+from .models import Cart, StockReservation
+
+DEFAULT_TTL = 900
+EXPIRE_BATCH_SIZE = 1000
+
+
+class InsufficientStock(Exception):
+    """
+    Товара не хватает с учётом резервов других корзин.
+    """
+
+    def __init__(self, product_id: int, requested: int, available: int) -> None:
+        super().__init__(f'Товар {product_id}: запрошено {requested}, доступно {available}')
+        self.product_id = product_id
+        self.requested = requested
+        self.available = available
+
+
+def reservation_ttl() -> timedelta:
+    """
+    Возвращает срок жизни резерва (настройка CART_RESERVATION_TTL, секунды).
+    """
+    return timedelta(seconds=getattr(settings, 'CART_RESERVATION_TTL', DEFAULT_TTL))
+
+
+def _held_elsewhere(cart: Optional[Cart], now: datetime) -> Q:
+    condition = Q(reservations__expires_at__gt=now)
+    if cart is not None:
+        condition &= ~Q(reservations__cart=cart)
+    return condition
+
+
+def available_stock(product_ids: Iterable[int], cart: Optional[Cart] = None) -> dict[int, int]:
+    """
+    Возвращает доступный остаток товаров одним запросом.
+
+    Доступно = stock − сумма активных резервов; резервы самой корзины cart
+    не вычитаются (она может держать то, что уже зарезервировала).
+
+    :param product_ids: ID товаров.
+    :param cart: Корзина, для которой считается остаток.
+    :return: Словарь {ID товара: доступное количество}.
+    """
+    rows = (Product.objects.filter(pk__in=list(product_ids))
+            .annotate(held=Coalesce(Sum('reservations__quantity',
+                                        filter=_held_elsewhere(cart, timezone.now())), 0))
+            .values_list('pk', 'stock', 'held'))
+    return {pk: max(stock - held, 0) for pk, stock, held in rows}
+
+
+def reserve(cart: Cart, product: Product, quantity: int) -> None:
+    """
+    Устанавливает резерв корзины на товар равным quantity и продлевает его срок.
+
+    :param cart: Корзина.
+    :param product: Товар.
+    :param quantity: Требуемое количество в корзине.
+    :raises InsufficientStock: Если с учётом чужих резервов товара не хватает.
+    """
+    reserve_many(cart, {product.pk: quantity})
+
+
+def reserve_many(cart: Cart, quantities: Mapping[int, int], current: Optional[Mapping[int, int]] = None) -> None:
+    """
+    Устанавливает резервы корзины на несколько товаров одной транзакцией.
+
+    Строки товаров блокируются (select_for_update) в порядке ID, так что две
+    корзины не могут одновременно занять последний остаток. Количество 0
+    снимает резерв. Уменьшение относительно current не проверяется: если
+    резерв истёк и остаток разобран, резервируется то, что доступно.
+
+    :param cart: Корзина.
+    :param quantities: Словарь {ID товара: требуемое количество}.
+    :param current: Текущие количества в корзине.
+    :raises InsufficientStock: Если товара не хватает для увеличения.
+    """
+    current = current or {}
+    product_ids = sorted(quantities)
+    with transaction.atomic():
+        list(Product.objects.select_for_update().filter(pk__in=product_ids).order_by('pk').values_list('pk'))
+        available = available_stock(product_ids, cart)
+        for product_id in product_ids:
+            quantity = quantities[product_id]
+            if quantity > available.get(product_id, 0) and quantity > current.get(product_id, 0):
+                raise InsufficientStock(product_id, quantity, available.get(product_id, 0))
+        release(cart, [product_id for product_id in product_ids if not quantities[product_id]])
+        expires_at = timezone.now() + reservation_ttl()
+        StockReservation.objects.bulk_create(
+            [StockReservation(cart=cart, product_id=product_id, expires_at=expires_at,
+                              quantity=min(quantities[product_id], available.get(product_id, 0)))
+             for product_id in product_ids if quantities[product_id] and available.get(product_id, 0)],
+            update_conflicts=True,
+            unique_fields=['cart', 'product'],
+            update_fields=['quantity', 'expires_at'],
+        )
+
+
+def release(cart: Cart, product_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Снимает резервы корзины (все или по указанным товарам).
+
+    :return: Количество снятых резервов.
+    """
+    reservations = StockReservation.objects.filter(cart=cart)
+    if product_ids is not None:
+        reservations = reservations.filter(product_id__in=list(product_ids))
+    deleted, _ = reservations.delete()
+    return deleted
+
+
+def release_except(cart: Cart, product_ids: Iterable[int]) -> int:
+    """
+    Снимает резервы корзины на товары, которых нет среди product_ids.
+
+    :return: Количество снятых резервов.
+    """
+    deleted, _ = StockReservation.objects.filter(cart=cart).exclude(product_id__in=list(product_ids)).delete()
+    return deleted
+
+
+def extend(cart: Cart) -> int:
+    """
+    Продлевает резервы корзины, пока покупатель с ней работает.
+
+    Истёкшие резервы не продлеваются: их остаток мог уже уйти другим.
+
+    :return: Количество продлённых резервов.
+    """
+    now = timezone.now()
+    return StockReservation.objects.filter(cart=cart, expires_at__gt=now).update(
+        expires_at=now + reservation_ttl()
+    )
+
+
+def commit(cart: Cart, lines: Mapping[int, int]) -> None:
+    """
+    Списывает товары со склада при оформлении заказа и снимает резервы корзины.
+
+    Вызывается внутри транзакции оформления: строки товаров блокируются
+    в порядке ID (без взаимных блокировок), остаток проверяется с учётом
+    чужих резервов, а списание выполняется одним UPDATE с
+    F('stock') − n для всех товаров.
+
+    :param cart: Оформляемая корзина.
+    :param lines: Словарь {ID товара: количество}.
+    :raises InsufficientStock: Если какого-либо товара не хватает.
+    """
+    lines = {product_id: quantity for product_id, quantity in lines.items() if quantity > 0}
+    if not lines:
+        release(cart)
+        return
+    with transaction.atomic():
+        list(Product.objects.select_for_update().filter(pk__in=lines).order_by('pk').values_list('pk'))
+        available = available_stock(lines, cart)
+        for product_id, quantity in sorted(lines.items()):
+            if quantity > available.get(product_id, 0):
+                raise InsufficientStock(product_id, quantity, available.get(product_id, 0))
+        Product.objects.filter(pk__in=lines).update(
+            stock=Case(
+                *(When(pk=product_id, then=F('stock') - Value(quantity)) for product_id, quantity in lines.items()),
+                output_field=IntegerField(),
+            ),
+            updated_at=Now(),
+        )
+        release(cart)
+        # update() не отправляет сигналы: остатки видны в каталоге
+        transaction.on_commit(lambda: shop_cache.bump_version(shop_cache.PRODUCTS))
+
+
+def expire_stale(batch_size: int = EXPIRE_BATCH_SIZE) -> int:
+    """
+    Удаляет истёкшие резервы пачками, не блокируя таблицу надолго.
+
+    :param batch_size: Размер пачки удаления.
+    :return: Количество удалённых резервов.
+    """
+    now = timezone.now()
+    total = 0
+    while True:
+        ids = list(StockReservation.objects.filter(expires_at__lte=now)
+                   .order_by('expires_at').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return total
+        deleted, _ = StockReservation.objects.filter(pk__in=ids).delete()
+        total += deleted
@@ -0,0 +1,44 @@
+from typing import Any
+
+from rest_framework import serializers
+
+from shop.models import Product
+
+MAX_CART_OPERATIONS = 100
+MAX_LINE_QUANTITY = 999
+
+
+class CartOperationSerializer(serializers.Serializer):
+    """
+    Одна операция над корзиной: add (прибавить), set (установить) или remove (удалить).
+    """
+    op = serializers.ChoiceField(choices=['add', 'set', 'remove'])
+    product_id = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=0, max_value=MAX_LINE_QUANTITY, default=1)
+
+
+class CartBatchSerializer(serializers.Serializer):
+    """
+    Сериализатор пачки операций над корзиной.
+    """
+    operations = serializers.ListField(
+        child=CartOperationSerializer(),
+        allow_empty=False,
+        max_length=MAX_CART_OPERATIONS,
+    )
+
+    def validate_operations(self, value: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """
+        Проверяет, что все товары существуют, и подставляет их в операции.
+
+        :param value: список операций из запроса
+        :return: операции с товарами (ключ product)
+        :raises serializers.ValidationError: если часть товаров не найдена
+        """
+        products = Product.objects.only('pk', 'price').in_bulk({operation['product_id'] for operation in value})
+        missing = sorted({operation['product_id'] for operation in value} - set(products))
+        if missing:
+            raise serializers.ValidationError(f'Товары не найдены: {", ".join(map(str, missing))}')
+        for operation in value:
+            operation['product'] = products[operation['product_id']]
+        return value
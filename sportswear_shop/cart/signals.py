@@ -0,0 +1,16 @@
+from typing import Any, Optional
+
+from django.contrib.auth.signals import user_logged_in
+from django.dispatch import receiver
+from django.http import HttpRequest
+
+from .backends import merge_anonymous_cart
+
+
+@receiver(user_logged_in)
+def merge_cart_on_login(sender: Any, request: Optional[HttpRequest], user: Any, **kwargs: Any) -> None:
+    """
+    Переносит анонимную корзину в корзину пользователя после входа.
+    """
+    if request is not None and hasattr(request, 'session'):
+        merge_anonymous_cart(request, user)
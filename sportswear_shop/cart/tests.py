@@ -1,3 +1,345 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from shop.models import Brand, Category, Product
+from shop.tests import app_queries
+from .backends import CacheCartBackend, DatabaseCartBackend, backend_class, cart_cache
+from .models import Cart, CartItem, StockReservation
+from . import reservations
+
+User = get_user_model()
+
+class StockReservationTests(TestCase):
+    def setUp(self) -> None:
+        """
+        Создаёт товар с остатком 2 и двух покупателей.
+        """
+        cache.clear()
+        category = Category.objects.create(name='Обувь')
+        brand = Brand.objects.create(name='Nike')
+        self.product = Product.objects.create(
+            name='Кроссовки', description='', price=1000, stock=2, size='M', category=category, brand=brand,
+        )
+        self.buyer = User.objects.create_user(username='buyer', password='pass')
+        self.rival = User.objects.create_user(username='rival', password='pass')
+        self.cart = Cart.objects.create(user=self.buyer)
+        self.rival_cart = Cart.objects.create(user=self.rival)
+
+    def test_holds_reduce_availability_for_other_carts(self):
+        reservations.reserve(self.cart, self.product, 2)
+        self.assertEqual(reservations.available_stock([self.product.pk], self.rival_cart), {self.product.pk: 0})
+        self.assertEqual(reservations.available_stock([self.product.pk], self.cart), {self.product.pk: 2})
+        with self.assertRaises(reservations.InsufficientStock) as raised:
+            reservations.reserve(self.rival_cart, self.product, 1)
+        self.assertEqual(raised.exception.available, 0)
+
+    def test_expired_holds_do_not_count_and_are_reaped(self):
+        reservations.reserve(self.cart, self.product, 2)
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        reservations.reserve(self.rival_cart, self.product, 2)
+        self.assertEqual(reservations.extend(self.cart), 0)
+        call_command('expire_reservations', '--batch-size', '1', stdout=StringIO())
+        self.assertEqual(list(StockReservation.objects.values_list('cart_id', flat=True)), [self.rival_cart.pk])
+
+    def test_commit_decrements_stock_and_releases_holds(self):
+        reservations.reserve(self.cart, self.product, 2)
+        reservations.commit(self.cart, {self.product.pk: 2})
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 0)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_commit_rejects_oversell(self):
+        reservations.reserve(self.rival_cart, self.product, 1)
+        with self.assertRaises(reservations.InsufficientStock):
+            reservations.commit(self.cart, {self.product.pk: 2})
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 2)
+
+    def test_cart_views_reserve_stock(self):
+        self.client.login(username='buyer', password='pass')
+        add_url = reverse('add_to_cart', args=[self.product.pk])
+        self.client.post(add_url)
+        self.client.post(add_url)
+        response = self.client.post(add_url, follow=True)
+        self.assertContains(response, 'доступно 2 шт.')
+        self.assertEqual(StockReservation.objects.get(cart=self.cart).quantity, 2)
+
+        update_url = reverse('update_cart_item', args=[self.product.pk])
+        response = self.client.post(update_url, {'action': 'plus'})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['available'], 2)
+        response = self.client.post(update_url, {'action': 'minus'})
+        self.assertEqual(response.json()['quantity'], 1)
+        self.assertEqual(StockReservation.objects.get(cart=self.cart).quantity, 1)
+
+        self.client.post(reverse('remove_from_cart', args=[self.product.pk]))
+        self.assertFalse(StockReservation.objects.exists())
+
+
+class CartBackendTests(TestCase):
+    def setUp(self) -> None:
+        """
+        Создаёт два товара и покупателя; очищает кеш корзин.
+        """
+        cache.clear()
+        category = Category.objects.create(name='Обувь')
+        brand = Brand.objects.create(name='Nike')
+        self.shoes = Product.objects.create(
+            name='Кроссовки', description='', price=Decimal('1000.50'), stock=5, size='M',
+            category=category, brand=brand,
+        )
+        self.socks = Product.objects.create(
+            name='Носки', description='', price=Decimal('99.90'), stock=5, size='M', category=category, brand=brand,
+        )
+        self.buyer = User.objects.create_user(username='buyer', password='pass')
+
+    def test_cache_backend_keeps_running_total_and_flushes_in_batches(self):
+        backend = CacheCartBackend(self.buyer)
+        backend.add(self.shoes)
+        backend.add(self.shoes)
+        backend.add(self.socks, 3)
+        self.assertEqual(backend.lines, {self.shoes.pk: 2, self.socks.pk: 3})
+        self.assertEqual(backend.total, Decimal('2300.70'))
+        self.assertFalse(CartItem.objects.exists())
+
+        with self.settings(CART_FLUSH_EVERY=4):
+            fresh = CacheCartBackend(self.buyer)
+            fresh.remove(self.socks.pk)
+            self.assertEqual(list(CartItem.objects.values_list('product_id', 'quantity')), [(self.shoes.pk, 2)])
+            fresh.set(self.shoes, 4)
+            self.assertEqual(CartItem.objects.get().quantity, 2)
+        fresh.flush()
+        self.assertEqual(list(CartItem.objects.values_list('product_id', 'quantity')), [(self.shoes.pk, 4)])
+
+        cart_cache().clear()
+        self.assertEqual(CacheCartBackend(self.buyer).lines, {self.shoes.pk: 4})
+
+    def test_click_does_not_touch_cart_items(self):
+        self.client.login(username='buyer', password='pass')
+        self.client.post(reverse('add_to_cart', args=[self.shoes.pk]))
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(reverse('update_cart_item', args=[self.shoes.pk]), {'action': 'plus'})
+        self.assertEqual(response.json(), {
+            'quantity': 2, 'item_sum': '2001.00', 'total': '2001.00', 'discount_amount': '0.00', 'final': '2001.00',
+        })
+        self.assertFalse([query for query in context.captured_queries if 'cart_cartitem' in query['sql']])
+
+    def test_anonymous_cart_merges_on_login(self):
+        self.client.post(reverse('add_to_cart', args=[self.shoes.pk]))
+        self.client.post(reverse('add_to_cart', args=[self.socks.pk]))
+        response = self.client.get(reverse('cart_detail'))
+        self.assertEqual([line.product for line in response.context['lines']], [self.shoes, self.socks])
+        anonymous_cart = Cart.objects.get(user=None)
+        self.assertEqual(StockReservation.objects.filter(cart=anonymous_cart).count(), 2)
+
+        CacheCartBackend(self.buyer).add(self.shoes, 2)
+        self.client.login(username='buyer', password='pass')
+
+        backend = CacheCartBackend(self.buyer)
+        self.assertEqual(backend.lines, {self.shoes.pk: 3, self.socks.pk: 1})
+        self.assertFalse(Cart.objects.filter(pk=anonymous_cart.pk).exists())
+        self.assertEqual(
+            dict(StockReservation.objects.values_list('product_id', 'quantity')), {self.shoes.pk: 3, self.socks.pk: 1},
+        )
+        self.assertEqual(dict(CartItem.objects.values_list('product_id', 'quantity')),
+                         {self.shoes.pk: 3, self.socks.pk: 1})
+
+    def test_cache_backend_requires_shared_cache(self):
+        self.assertIs(backend_class(), CacheCartBackend)
+        with self.settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+                                   'carts': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            with self.assertLogs('cart.backends', 'WARNING'):
+                self.assertIs(backend_class(), DatabaseCartBackend)
+
+    def test_concurrent_changes_are_not_lost(self):
+        first, second = CacheCartBackend(self.buyer), CacheCartBackend(self.buyer)
+        first.add(self.shoes)
+        second.add(self.shoes)
+        first.add(self.shoes)
+        second.set(self.socks, 2)
+        first.remove(self.socks.pk)
+        self.assertEqual(CacheCartBackend(self.buyer).lines, {self.shoes.pk: 3})
+        self.assertEqual(CacheCartBackend(self.buyer).total, Decimal('3001.50'))
+
+    def test_held_lock_is_waited_for_then_ignored(self):
+        from unittest import mock
+        from . import backends
+        backend = CacheCartBackend(self.buyer)
+        cart_cache().add(f'{backend.cache_key}:lock', 1)
+        with mock.patch.object(backends, 'LOCK_WAIT', 0.05), self.assertLogs('cart.backends', 'WARNING'):
+            backend.add(self.shoes)
+        self.assertEqual(CacheCartBackend(self.buyer).lines, {self.shoes.pk: 1})
+        self.assertTrue(cart_cache().get(f'{backend.cache_key}:lock'))
+
+    def test_merge_reserves_in_one_pass_and_keeps_lines_short_of_stock(self):
+        from unittest import mock
+        CacheCartBackend(self.buyer).add(self.shoes, 4)
+        self.client.post(reverse('add_to_cart', args=[self.shoes.pk]))
+        self.client.post(reverse('add_to_cart', args=[self.socks.pk]))
+        Product.objects.filter(pk=self.shoes.pk).update(stock=4)
+        with mock.patch.object(reservations, 'reserve_many', wraps=reservations.reserve_many) as reserve_many:
+            self.client.login(username='buyer', password='pass')
+        self.assertEqual(reserve_many.call_count, 1)
+        self.assertEqual(CacheCartBackend(self.buyer).lines, {self.shoes.pk: 5, self.socks.pk: 1})
+        self.assertEqual(dict(StockReservation.objects.values_list('product_id', 'quantity')),
+                         {self.shoes.pk: 4, self.socks.pk: 1})
+
+    def test_failed_merge_leaves_both_carts_unchanged(self):
+        from unittest import mock
+        from .backends import merge_anonymous_cart
+        CacheCartBackend(self.buyer).add(self.socks)
+        self.client.post(reverse('add_to_cart', args=[self.shoes.pk]))
+        request = mock.Mock(session=self.client.session)
+        token = request.session['cart_token']
+        with mock.patch.object(CacheCartBackend, '_store_many', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                merge_anonymous_cart(request, self.buyer)
+        self.assertEqual(CacheCartBackend(self.buyer).lines, {self.socks.pk: 1})
+        self.assertEqual(CacheCartBackend(None, token).lines, {self.shoes.pk: 1})
+        self.assertEqual(StockReservation.objects.filter(cart__token=token).count(), 1)
+
+    def test_lost_cache_releases_reservations_of_unsaved_lines(self):
+        backend = CacheCartBackend(self.buyer)
+        backend.add(self.shoes)
+        backend.flush()
+        backend.add(self.socks, 2)
+        self.assertEqual(StockReservation.objects.count(), 2)
+        cart_cache().clear()
+        self.assertEqual(CacheCartBackend(self.buyer).lines, {self.shoes.pk: 1})
+        self.assertEqual(list(StockReservation.objects.values_list('product_id', flat=True)), [self.shoes.pk])
+
+    def test_database_backend(self):
+        backend = DatabaseCartBackend(self.buyer)
+        backend.add(self.shoes, 2)
+        backend.add(self.shoes)
+        self.assertEqual(DatabaseCartBackend(self.buyer).lines, {self.shoes.pk: 3})
+        self.assertEqual(backend.total, Decimal('3001.50'))
+        backend.clear()
+        self.assertFalse(CartItem.objects.exists())
+        self.assertFalse(StockReservation.objects.exists())
+
+
+class CartPricingTests(TestCase):
+    def setUp(self) -> None:
+        """
+        Создаёт товары, действующую, выключенную и истёкшую скидки.
+        """
+        from discounts.models import Discount
+        cache.clear()
+        category = Category.objects.create(name='Обувь')
+        brand = Brand.objects.create(name='Nike')
+        self.shoes = Product.objects.create(
+            name='Кроссовки', description='', price=Decimal('999.99'), stock=5, size='M',
+            category=category, brand=brand,
+        )
+        self.socks = Product.objects.create(
+            name='Носки', description='', price=Decimal('33.33'), stock=5, size='M', category=category, brand=brand,
+        )
+        now = timezone.now()
+        self.sale = Discount.objects.create(name='Распродажа', discount_percent=15,
+                                            start_date=now - timedelta(days=1), end_date=now + timedelta(days=1))
+        self.sale.products.add(self.shoes)
+        disabled = Discount.objects.create(name='Выключена', discount_percent=50, active=False,
+                                           start_date=now - timedelta(days=1), end_date=now + timedelta(days=1))
+        expired = Discount.objects.create(name='Прошла', discount_percent=40,
+                                          start_date=now - timedelta(days=3), end_date=now - timedelta(days=1))
+        disabled.products.add(self.shoes, self.socks)
+        expired.products.add(self.socks)
+
+    def test_prices_in_decimal_with_applicable_discounts_in_one_query(self):
+        from discounts import resolver
+        from .pricing import DiscountOffer, price_lines
+        resolver.get_index()
+        with CaptureQueriesContext(connection) as context:
+            summary = price_lines({self.shoes.pk: 1, self.socks.pk: 3}, self.sale.pk)
+        self.assertEqual(len(app_queries(context)), 1)
+        offer = DiscountOffer(self.sale.pk, 'Распродажа', 15)
+        self.assertEqual(summary.offers, [offer])
+        self.assertEqual([line.discount for line in summary.lines], [offer, None])
+        self.assertEqual(summary.subtotal, Decimal('1099.98'))
+        self.assertEqual(summary.discount_amount, Decimal('150.00'))
+        self.assertEqual(summary.total, Decimal('949.98'))
+
+    def test_summary_is_memoized_until_cart_changes(self):
+        from .pricing import get_cart_summary
+        backend = CacheCartBackend(User.objects.create_user(username='buyer', password='pass'))
+        backend.add(self.shoes)
+        first = get_cart_summary(backend)
+        with CaptureQueriesContext(connection) as context:
+            self.assertIs(get_cart_summary(backend), first)
+        self.assertEqual(app_queries(context), [])
+        backend.add(self.socks)
+        self.assertEqual(get_cart_summary(backend).subtotal, Decimal('1033.32'))
+
+    def test_cart_page_lists_only_applicable_discounts(self):
+        self.client.post(reverse('add_to_cart', args=[self.shoes.pk]))
+        response = self.client.post(reverse('cart_detail'), {'discount_id': self.sale.pk})
+        self.assertEqual([offer.id for offer in response.context['discounts']], [self.sale.pk])
+        self.assertEqual(response.context['final_price'], Decimal('849.99'))
+        response = self.client.post(reverse('update_cart_item', args=[self.shoes.pk]), {'action': 'plus'})
+        self.assertEqual(response.json()['final'], '1699.98')
+
+
+class CartBatchAPITests(TestCase):
+    def setUp(self) -> None:
+        """
+        Создаёт товары и покупателя с товаром в корзине.
+        """
+        cache.clear()
+        category = Category.objects.create(name='Обувь')
+        brand = Brand.objects.create(name='Nike')
+        self.shoes, self.socks, self.cap = [
+            Product.objects.create(name=name, description='', price=price, stock=3, size='M',
+                                   category=category, brand=brand)
+            for name, price in (('Кроссовки', Decimal('1000.00')), ('Носки', Decimal('10.50')),
+                                ('Кепка', Decimal('300.00')))
+        ]
+        self.buyer = User.objects.create_user(username='buyer', password='pass')
+        self.client.login(username='buyer', password='pass')
+        self.client.post(reverse('add_to_cart', args=[self.cap.pk]))
+
+    def batch(self, *operations):
+        return self.client.post(reverse('api_cart_batch'), {'operations': list(operations)},
+                                content_type='application/json')
+
+    def test_applies_operations_and_returns_totals_once(self):
+        response = self.batch(
+            {'op': 'add', 'product_id': self.shoes.pk},
+            {'op': 'add', 'product_id': self.shoes.pk},
+            {'op': 'set', 'product_id': self.socks.pk, 'quantity': 3},
+            {'op': 'remove', 'product_id': self.cap.pk},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['total'], '2031.50')
+        self.assertEqual([(line['product_id'], line['quantity']) for line in response.json()['lines']],
+                         [(self.shoes.pk, 2), (self.socks.pk, 3)])
+        self.assertEqual(dict(CartItem.objects.values_list('product_id', 'quantity')),
+                         {self.shoes.pk: 2, self.socks.pk: 3})
+        self.assertEqual(dict(StockReservation.objects.values_list('product_id', 'quantity')),
+                         {self.shoes.pk: 2, self.socks.pk: 3})
+
+    def test_rejects_whole_batch_when_stock_runs_out(self):
+        response = self.batch(
+            {'op': 'set', 'product_id': self.socks.pk, 'quantity': 2},
+            {'op': 'set', 'product_id': self.shoes.pk, 'quantity': 4},
+        )
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['product_id'], self.shoes.pk)
+        self.assertEqual(CacheCartBackend(self.buyer).lines, {self.cap.pk: 1})
+        self.assertEqual(list(StockReservation.objects.values_list('product_id', flat=True)), [self.cap.pk])
+
+    def test_validates_operations(self):
+        self.assertEqual(self.batch({'op': 'drop', 'product_id': self.shoes.pk}).status_code, 400)
+        response = self.batch({'op': 'add', 'product_id': 999})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('999', str(response.json()))
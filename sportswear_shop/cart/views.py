@@ -1,107 +1,116 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.http import JsonResponse, HttpRequest, HttpResponse
-from django.contrib.auth.decorators import login_required
+from django.contrib import messages
 from django.views.decorators.http import require_POST
+from decimal import Decimal
 from typing import Optional
 
-from .models import Cart, CartItem
+from . import reservations
+from .backends import get_cart_backend
+from .pricing import SESSION_DISCOUNT_KEY, CartSummary, get_cart_summary
 from shop.models import Product
-from discounts.models import Discount
 
-@login_required
 def cart_detail(request: HttpRequest) -> HttpResponse:
     """
     Отображает детали корзины с возможностью применения скидки.
 
+    Выбранная скидка запоминается в сессии, чтобы её учитывали и ответы
+    на изменение количества.
+
     :param request: Объект запроса.
     :return: HTML-ответ с деталями корзины.
     """
-    cart, created = Cart.objects.get_or_create(user=request.user)
-    discounts = Discount.objects.all()
-    selected_discount_id: Optional[str] = request.POST.get('discount_id')
-    selected_discount: Optional[Discount] = None
-
-    if selected_discount_id:
-        try:
-            selected_discount = Discount.objects.get(id=selected_discount_id)
-        except Discount.DoesNotExist:
-            selected_discount = None
-
-    for item in cart.items.all():
-        item.total = item.product.price * item.quantity
-
-    total_price: float = sum(item.get_total() for item in cart.items.all())
-
-    discount_amount: float = 0
-    final_price: float = total_price
-    if selected_discount:
-        discount_amount = total_price * selected_discount.discount_percent / 100
-        final_price = total_price - discount_amount
+    backend = get_cart_backend(request)
+    if request.method == 'POST':
+        selected_discount_id: Optional[str] = request.POST.get('discount_id')
+        if selected_discount_id and selected_discount_id.isdigit():
+            request.session[SESSION_DISCOUNT_KEY] = int(selected_discount_id)
+        else:
+            request.session.pop(SESSION_DISCOUNT_KEY, None)
+    summary: CartSummary = get_cart_summary(
+        backend, request.session.get(SESSION_DISCOUNT_KEY), Product.objects.prefetch_related('images'),
+    )
+    cart = backend.get_cart(create=False)
+    if cart is not None:
+        reservations.extend(cart)
 
     return render(request, 'cart/cart_detail.html', {
-        'cart': cart,
-        'discounts': discounts,
-        'selected_discount_id': int(selected_discount_id) if selected_discount_id else None,
-        'total_price': total_price,
-        'discount_amount': discount_amount,
-        'final_price': final_price,
+        'summary': summary,
+        'lines': summary.lines,
+        'discounts': summary.offers,
+        'selected_discount_id': summary.selected_discount.id if summary.selected_discount else None,
+        'total_price': summary.subtotal,
+        'discount_amount': summary.discount_amount,
+        'final_price': summary.total,
     })
 
 @require_POST
-@login_required
 def add_to_cart(request: HttpRequest, product_id: int) -> HttpResponse:
     """
-    Добавляет товар в корзину пользователя.
+    Добавляет товар в корзину покупателя (в том числе анонимного).
 
     :param request: Объект запроса.
     :param product_id: Идентификатор добавляемого товара.
     :return: Редирект на страницу корзины.
     """
-    cart, _ = Cart.objects.get_or_create(user=request.user)
     product: Product = get_object_or_404(Product, id=product_id)
-    item, created = CartItem.objects.get_or_create(cart=cart, product=product)
-    if created:
-        item.quantity = 1
-    else:
-        item.quantity += 1
-    item.save()
+    try:
+        get_cart_backend(request).add(product)
+    except reservations.InsufficientStock as error:
+        messages.error(request, f'Недостаточно товара «{product.name}» на складе: доступно {error.available} шт.')
+        return redirect('product_detail', pk=product.pk)
     return redirect('cart_detail')
 
-@login_required
-def remove_from_cart(request: HttpRequest, item_id: int) -> HttpResponse:
+@require_POST
+def remove_from_cart(request: HttpRequest, product_id: int) -> HttpResponse:
     """
-    Удаляет товар из корзины пользователя.
+    Удаляет товар из корзины покупателя.
 
     :param request: Объект запроса.
-    :param item_id: Идентификатор удаляемого элемента корзины.
+    :param product_id: Идентификатор удаляемого товара.
     :return: Редирект на страницу корзины.
     """
-    item: CartItem = get_object_or_404(CartItem, id=item_id, cart__user=request.user)
-    item.delete()
+    get_cart_backend(request).remove(product_id)
     return redirect('cart_detail')
 
-@login_required
-def update_cart_item(request: HttpRequest, item_id: int) -> JsonResponse:
+@require_POST
+def update_cart_item(request: HttpRequest, product_id: int) -> JsonResponse:
     """
     Обновляет количество товара в корзине (увеличение/уменьшение).
 
+    Количество меняется в хранилище корзины, итоги считает cart.pricing одним запросом.
+
     :param request: Объект запроса.
-    :param item_id: Идентификатор элемента корзины.
+    :param product_id: Идентификатор товара.
     :return: JSON-ответ с обновлённой информацией о товаре и корзине.
     """
-    if request.method == 'POST':
-        item: CartItem = get_object_or_404(CartItem, id=item_id, cart__user=request.user)
-        action: Optional[str] = request.POST.get('action')
-        if action == 'plus':
-            item.quantity += 1
-            item.save()
-        elif action == 'minus' and item.quantity > 1:
-            item.quantity -= 1
-            item.save()
-
-        item_sum: float = item.get_total()
-        cart: Cart = item.cart
-        total: float = sum(i.get_total() for i in cart.items.all())
-        return JsonResponse({'quantity': item.quantity, 'item_sum': item_sum, 'total': total})
-
-    return JsonResponse({'error': 'Invalid request'}, status=400)
+    backend = get_cart_backend(request)
+    quantity: int = backend.quantity(product_id)
+    if not quantity:
+        return JsonResponse({'error': 'Товара нет в корзине'}, status=404)
+    action: Optional[str] = request.POST.get('action')
+    if action not in ('plus', 'minus'):
+        return JsonResponse({'error': 'Invalid request'}, status=400)
+
+    product: Product = get_object_or_404(Product.objects.only('pk', 'price'), pk=product_id)
+    if action == 'plus':
+        try:
+            quantity = backend.set(product, quantity + 1)
+        except reservations.InsufficientStock as error:
+            return JsonResponse({
+                'error': 'Недостаточно товара на складе',
+                'quantity': quantity,
+                'available': error.available,
+            }, status=409)
+    elif quantity > 1:
+        quantity = backend.set(product, quantity - 1)
+
+    summary: CartSummary = get_cart_summary(backend, request.session.get(SESSION_DISCOUNT_KEY))
+    line = summary.line(product_id)
+    return JsonResponse({
+        'quantity': quantity,
+        'item_sum': line.subtotal if line else Decimal('0.00'),
+        'total': summary.subtotal,
+        'discount_amount': summary.discount_amount,
+        'final': summary.total,
+    })
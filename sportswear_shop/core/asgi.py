@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
 application = get_asgi_application()
+
+# Индекс автодополнения строится при старте воркера, а не на первом запросе
+from shop import autocomplete  # noqa: E402
+
+autocomplete.warm()
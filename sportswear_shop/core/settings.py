@@ -70,6 +70,29 @@ ROOT_URLCONF = 'core.urls'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Уменьшенные копии изображений товаров (см. shop.thumbnails)
+PRODUCT_IMAGE_RENDITION_WIDTHS = (320, 640, 1024)
+PRODUCT_IMAGE_WORKERS = 2
+
+# Индекс автодополнения (см. shop.autocomplete): через сколько секунд пересчитывать популярность
+AUTOCOMPLETE_MAX_AGE = 600
+
+# Резервирование товаров в корзине (см. cart.reservations): срок жизни резерва, секунды
+CART_RESERVATION_TTL = 900
+
+# Хранилище корзины (см. cart.backends) и через сколько изменений сохранять строки кеш-корзины в БД.
+# Кеш-корзине нужен общий для всех процессов кеш CART_CACHE (см. CACHES['carts'])
+CART_BACKEND = 'cart.backends.CacheCartBackend'
+CART_CACHE = 'carts'
+CART_FLUSH_EVERY = 10
+
+# Фоновая выгрузка заказов в PDF (см. orders.exports): процессы отрисовки и заказов в одной части
+ORDER_EXPORT_WORKERS = 2
+ORDER_EXPORT_PART_SIZE = 500
+
+# Списки админки больших таблиц (см. shop.pagination.EstimatedCountPaginator): с какого размера число строк оценивается
+ADMIN_ESTIMATED_COUNT_THRESHOLD = 10000
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -100,6 +123,25 @@ DATABASES = {
 }
 
 
+# Cache
+# Блоки главной страницы, фасеты и версии каталога хранятся в кеше.
+# В продакшене с несколькими воркерами нужен общий бэкенд (Redis/Memcached),
+# иначе инвалидация и объединение промахов работают только внутри процесса.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'sportswear-shop',
+    },
+    # Корзины: общий для всех процессов кеш в БД (таблица создаётся миграцией cart);
+    # на нескольких серверах лучше Redis или Memcached
+    'carts': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'cart_cache',
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -35,6 +35,9 @@ urlpatterns = [
     path('register/', user_views.register, name='register'),
     path('api/', include('shop.api_urls')),       # API-эндпоинты (см. ниже)
     path('api/', include('reviews.api_urls')),
+    path('api/', include('users.api_urls')),
+    path('api/', include('orders.api_urls')),
+    path('api/', include('cart.api_urls')),
     path('silk/', include('silk.urls', namespace='silk'))
 ]
 
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
 application = get_wsgi_application()
+
+# Индекс автодополнения строится при старте воркера, а не на первом запросе
+from shop import autocomplete  # noqa: E402
+
+autocomplete.warm()
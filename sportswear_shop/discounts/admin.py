@@ -1,4 +1,6 @@
 from django.contrib import admin
+from django.db.models import Count, Q, QuerySet
+from django.http import HttpRequest
 from django.utils import timezone
 from .models import Discount
 
@@ -19,6 +21,18 @@ class DiscountAdmin(admin.ModelAdmin):
     readonly_fields = ("created_at",) if hasattr(Discount, 'created_at') else ()
     search_fields = ("name", "products__name")
 
+    def get_queryset(self, request: HttpRequest) -> QuerySet:
+        """
+        Добавляет к скидкам количество товаров и товаров в наличии.
+
+        :param request: HTTP-запрос.
+        :return: QuerySet с аннотациями product_count и active_product_count.
+        """
+        return super().get_queryset(request).annotate(
+            product_count=Count('products', distinct=True),
+            active_product_count=Count('products', filter=Q(products__stock__gt=0), distinct=True),
+        )
+
     @admin.display(description="Статус скидки", ordering="start_date")
     def status(self, obj: Discount) -> str:
         """
@@ -44,7 +58,7 @@ class DiscountAdmin(admin.ModelAdmin):
         """
         return (obj.end_date - obj.start_date).days
 
-    @admin.display(description="Товаров со скидкой")
+    @admin.display(description="Товаров со скидкой", ordering="product_count")
     def product_count(self, obj: Discount) -> int:
         """
         Возвращает количество товаров, участвующих в скидке.
@@ -52,9 +66,9 @@ class DiscountAdmin(admin.ModelAdmin):
         :param obj: Объект скидки.
         :return: Количество товаров.
         """
-        return obj.products.count()
+        return obj.product_count
 
-    @admin.display(description="Доступных товаров")
+    @admin.display(description="Доступных товаров", ordering="active_product_count")
     def active_products(self, obj: Discount) -> int:
         """
         Возвращает количество товаров со скидкой, которые есть в наличии.
@@ -62,4 +76,4 @@ class DiscountAdmin(admin.ModelAdmin):
         :param obj: Объект скидки.
         :return: Количество доступных товаров.
         """
-        return obj.products.filter(stock__gt=0).count()
+        return obj.active_product_count
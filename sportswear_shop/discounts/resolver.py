@@ -0,0 +1,199 @@
+import threading
+from bisect import bisect_right
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+
+from django.utils import timezone
+
+from shop import cache as shop_cache
+
+# Конец скидки включительный: интервал хранится как [start, end + 1 мкс)
+_END_STEP = timedelta(microseconds=1)
+
+
+@dataclass(frozen=True)
+class DiscountOffer:
+    """
+    Скидка, действующая на товар.
+    """
+    id: int
+    name: str
+    discount_percent: int
+
+
+def _rank(offer: DiscountOffer) -> tuple[int, int]:
+    # Лучшая скидка — с наибольшим процентом, при равенстве — более ранняя
+    return -offer.discount_percent, offer.id
+
+
+class DiscountIndex:
+    """
+    Интервальный индекс скидок по товарам.
+
+    Для каждого товара все даты начала и окончания его скидок делят время на
+    отрезки; на каждом отрезке заранее известен список действующих скидок,
+    отсортированный от лучшей. Запрос «скидки товара в момент t» — один
+    bisect по границам отрезков.
+    """
+
+    def __init__(self) -> None:
+        self._points: dict[int, list[datetime]] = {}
+        self._segments: dict[int, list[tuple[DiscountOffer, ...]]] = {}
+        # Все границы всех товаров: момент, с которого действует текущий набор скидок
+        self._bounds: list[datetime] = []
+        self.synced_version: int = 0
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def load(self, rows: Iterable[tuple[int, DiscountOffer, datetime, datetime]]) -> None:
+        """
+        Строит индекс из строк (ID товара, скидка, начало, окончание).
+        """
+        intervals: dict[int, list[tuple[datetime, datetime, DiscountOffer]]] = defaultdict(list)
+        for product_id, offer, start, end in rows:
+            if start <= end:
+                intervals[product_id].append((start, end + _END_STEP, offer))
+        points: dict[int, list[datetime]] = {}
+        segments: dict[int, list[tuple[DiscountOffer, ...]]] = {}
+        for product_id, product_intervals in intervals.items():
+            bounds = sorted({bound for start, end, _ in product_intervals for bound in (start, end)})
+            points[product_id] = bounds
+            segments[product_id] = [
+                tuple(sorted((offer for start, end, offer in product_intervals if start <= bound < end), key=_rank))
+                for bound in bounds
+            ]
+        self._points, self._segments = points, segments
+        self._bounds = sorted({bound for bounds in points.values() for bound in bounds})
+
+    def offers(self, product_id: int, at: datetime) -> tuple[DiscountOffer, ...]:
+        """
+        Возвращает скидки, действующие на товар в момент at, от лучшей к худшей.
+        """
+        points = self._points.get(product_id)
+        if not points:
+            return ()
+        position = bisect_right(points, at) - 1
+        if position < 0:
+            return ()
+        return self._segments[product_id][position]
+
+    def best(self, product_id: int, at: datetime) -> Optional[DiscountOffer]:
+        offers = self.offers(product_id, at)
+        return offers[0] if offers else None
+
+    def segment_start(self, at: datetime, product_id: Optional[int] = None) -> Optional[datetime]:
+        """
+        Возвращает последнюю границу (начало или окончание скидки) не позже at.
+
+        Скидки меняются только на границах, поэтому пара (версия скидок,
+        граница) однозначно определяет действующие скидки товара (или всех
+        товаров, если product_id не указан). None — границ до at нет.
+        """
+        bounds = self._bounds if product_id is None else self._points.get(product_id, [])
+        position = bisect_right(bounds, at) - 1
+        return bounds[position] if position >= 0 else None
+
+
+def load_rows() -> list[tuple[int, DiscountOffer, datetime, datetime]]:
+    """
+    Читает включённые скидки с товарами одним запросом.
+    """
+    from .models import Discount
+
+    rows = Discount.products.through.objects.filter(discount__active=True).values_list(
+        'product_id', 'discount_id', 'discount__name', 'discount__discount_percent',
+        'discount__start_date', 'discount__end_date',
+    )
+    return [
+        (product_id, DiscountOffer(discount_id, name, percent), start, end)
+        for product_id, discount_id, name, percent, start, end in rows
+    ]
+
+
+_index: Optional[DiscountIndex] = None
+_lock = threading.Lock()
+
+
+def get_index() -> DiscountIndex:
+    """
+    Возвращает индекс процесса, перестраивая его после изменения скидок.
+
+    Изменения Discount и его товаров повышают версию пространства кеша
+    discounts (см. shop.signals), поэтому индекс каждого процесса узнаёт
+    о них одним обращением к кешу.
+    """
+    global _index
+    version = shop_cache.get_version(shop_cache.DISCOUNTS)
+    index = _index
+    if index is None or index.synced_version != version:
+        with _lock:
+            index = _index
+            if index is None or index.synced_version != version:
+                index = DiscountIndex()
+                index.load(load_rows())
+                index.synced_version = version
+                _index = index
+    return index
+
+
+def best_discounts(product_ids: Iterable[int], at: Optional[datetime] = None) -> dict[int, DiscountOffer]:
+    """
+    Возвращает лучшую действующую скидку для каждого товара, у которого она есть.
+
+    Args:
+        product_ids (Iterable[int]): ID товаров.
+        at (Optional[datetime]): момент времени (по умолчанию — сейчас).
+
+    Returns:
+        dict[int, DiscountOffer]: скидки по ID товара.
+    """
+    index = get_index()
+    at = at or timezone.now()
+    result = {}
+    for product_id in product_ids:
+        offer = index.best(product_id, at)
+        if offer is not None:
+            result[product_id] = offer
+    return result
+
+
+def best_discount(product_id: int, at: Optional[datetime] = None) -> Optional[DiscountOffer]:
+    """
+    Возвращает лучшую действующую скидку товара или None.
+    """
+    return get_index().best(product_id, at or timezone.now())
+
+
+def offers_for(product_id: int, at: Optional[datetime] = None) -> tuple[DiscountOffer, ...]:
+    """
+    Возвращает все скидки, действующие на товар, от лучшей к худшей.
+    """
+    return get_index().offers(product_id, at or timezone.now())
+
+
+def applies(discount_id: int, product_id: int, at: Optional[datetime] = None) -> bool:
+    """
+    Проверяет, действует ли скидка на товар в момент at.
+    """
+    return any(offer.id == discount_id for offer in offers_for(product_id, at))
+
+
+def segment_start(product_id: Optional[int] = None, at: Optional[datetime] = None) -> Optional[datetime]:
+    """
+    Возвращает момент последнего начала или окончания скидки (см. DiscountIndex.segment_start).
+
+    Используется в валидаторах условных запросов: скидка, начавшаяся или
+    закончившаяся по времени без правок, меняет ETag и Last-Modified.
+    """
+    return get_index().segment_start(at or timezone.now(), product_id)
+
+
+def reset() -> None:
+    """
+    Сбрасывает индекс процесса (используется в тестах).
+    """
+    global _index
+    _index = None
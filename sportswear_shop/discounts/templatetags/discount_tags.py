@@ -1,10 +1,28 @@
+from decimal import Decimal, InvalidOperation
+
 from django import template
 
+from discounts import resolver
+from shop.models import Product
+from shop.pricing import discounted_unit_price
+
 register = template.Library()
 
 @register.filter
-def discount_price(price, percent):
+def discount_price(value, percent=None):
+    """
+    Возвращает цену со скидкой строкой с копейками.
+
+    {{ product|discount_price }} — цена товара с лучшей действующей скидкой
+    из индекса скидок; {{ price|discount_price:percent }} — цена с указанной
+    скидкой.
+    """
+    if isinstance(value, Product):
+        if percent is None:
+            offer = resolver.best_discount(value.pk)
+            percent = offer.discount_percent if offer is not None else 0
+        value = value.price
     try:
-        return "%.2f" % (float(price) * (1 - float(percent) / 100))
-    except Exception:
-        return price
\ No newline at end of file
+        return f'{discounted_unit_price(Decimal(str(value)), int(percent or 0)):.2f}'
+    except (InvalidOperation, TypeError, ValueError):
+        return value
@@ -1,3 +1,155 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+from typing import Any
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.template import Context, Template
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from orders.admin import OrderItemForm
+from orders.models import Order
+from shop.models import Brand, Category, Product
+from shop.tests import app_queries
+from . import resolver
+from .models import Discount
+from .resolver import DiscountIndex, DiscountOffer
+
+User = get_user_model()
+
+
+class DiscountIndexTests(SimpleTestCase):
+    def test_best_offer_follows_overlapping_intervals(self):
+        now = timezone.now()
+        small = DiscountOffer(1, 'Малая', 10)
+        big = DiscountOffer(2, 'Большая', 30)
+        index = DiscountIndex()
+        index.load([
+            (7, small, now, now + timedelta(days=10)),
+            (7, big, now + timedelta(days=2), now + timedelta(days=4)),
+        ])
+        self.assertIsNone(index.best(7, now - timedelta(seconds=1)))
+        self.assertEqual(index.best(7, now), small)
+        self.assertEqual(index.offers(7, now + timedelta(days=3)), (big, small))
+        # Окончание скидки включительно
+        self.assertEqual(index.best(7, now + timedelta(days=4)), big)
+        self.assertEqual(index.best(7, now + timedelta(days=5)), small)
+        self.assertIsNone(index.best(7, now + timedelta(days=11)))
+        self.assertIsNone(index.best(8, now))
+
+    def test_equal_percent_prefers_earlier_discount(self):
+        now = timezone.now()
+        index = DiscountIndex()
+        index.load([
+            (1, DiscountOffer(5, 'Вторая', 20), now, now + timedelta(days=1)),
+            (1, DiscountOffer(3, 'Первая', 20), now, now + timedelta(days=1)),
+        ])
+        self.assertEqual(index.best(1, now).id, 3)
+
+
+class DiscountResolverTests(TestCase):
+    def setUp(self) -> None:
+        """
+        Создаёт два товара и действующую скидку на первый.
+        """
+        cache.clear()
+        category = Category.objects.create(name='Обувь')
+        brand = Brand.objects.create(name='Nike')
+        self.shoes = Product.objects.create(
+            name='Кроссовки', description='', price=Decimal('999.99'), stock=5, size='M',
+            category=category, brand=brand,
+        )
+        self.socks = Product.objects.create(
+            name='Носки', description='', price=Decimal('100.00'), stock=5, size='M', category=category, brand=brand,
+        )
+        now = timezone.now()
+        self.sale = Discount.objects.create(name='Распродажа', discount_percent=15,
+                                            start_date=now - timedelta(days=1), end_date=now + timedelta(days=1))
+        self.sale.products.add(self.shoes)
+
+    def test_batch_lookup_uses_warm_index_without_queries(self):
+        resolver.get_index()
+        with CaptureQueriesContext(connection) as context:
+            offers = resolver.best_discounts([self.shoes.pk, self.socks.pk])
+        self.assertEqual(app_queries(context), [])
+        self.assertEqual(offers, {self.shoes.pk: DiscountOffer(self.sale.pk, 'Распродажа', 15)})
+
+    def test_index_is_rebuilt_on_discount_and_m2m_changes(self):
+        self.assertIsNone(resolver.best_discount(self.socks.pk))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sale.products.add(self.socks)
+        self.assertEqual(resolver.best_discount(self.socks.pk).id, self.sale.pk)
+        self.sale.discount_percent = 25
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sale.save()
+        self.assertEqual(resolver.best_discount(self.socks.pk).discount_percent, 25)
+        self.sale.active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sale.save()
+        self.assertEqual(resolver.best_discounts([self.shoes.pk, self.socks.pk]), {})
+
+    def test_future_discount_applies_only_from_its_start(self):
+        now = timezone.now()
+        later = Discount.objects.create(name='Скоро', discount_percent=50,
+                                        start_date=now + timedelta(days=2), end_date=now + timedelta(days=3))
+        later.products.add(self.shoes)
+        self.assertEqual(resolver.best_discount(self.shoes.pk).id, self.sale.pk)
+        self.assertEqual(resolver.best_discount(self.shoes.pk, now + timedelta(days=2)).id, later.pk)
+
+    def test_discount_price_filter(self):
+        template = Template('{% load discount_tags %}{{ product|discount_price }} {{ price|discount_price:10 }}')
+        rendered = template.render(Context({'product': self.shoes, 'price': Decimal('33.35')}))
+        # Скидка 3.335 округляется до 3.34, как в корзине и при оформлении
+        self.assertEqual(rendered, '849.99 30.01')
+
+    def test_product_api_reports_best_discount(self):
+        response = self.client.get(reverse('api_product_detail', args=[self.shoes.pk]))
+        self.assertEqual(response.json()['discount'],
+                         {'id': self.sale.pk, 'name': 'Распродажа', 'discount_percent': 15})
+        self.assertEqual(response.json()['discounted_price'], '849.99')
+
+    def test_order_item_form_accepts_only_discounts_active_for_product(self):
+        order = Order.objects.create(user=User.objects.create_user(username='buyer', password='pass'))
+        data = {'order': order.pk, 'product': self.socks.pk, 'quantity': 1, 'price': '100.00',
+                'discount': self.sale.pk}
+        self.assertFalse(OrderItemForm(data=data).is_valid())
+        data['product'] = self.shoes.pk
+        self.assertTrue(OrderItemForm(data=data).is_valid())
+
+
+class DiscountAdminTests(TestCase):
+    def setUp(self) -> None:
+        """
+        Создаёт администратора и четыре товара, два из них в наличии.
+        """
+        category = Category.objects.create(name='Обувь')
+        brand = Brand.objects.create(name='Nike')
+        self.products = [
+            Product.objects.create(name=f'Товар {i}', price=100, stock=i % 2, size='M', category=category, brand=brand)
+            for i in range(4)
+        ]
+        self.client.force_login(User.objects.create_superuser(username='admin', password='pass'))
+
+    def add_discounts(self, count: int) -> None:
+        now = timezone.now()
+        for _ in range(count):
+            discount = Discount.objects.create(name='Скидка', discount_percent=10,
+                                               start_date=now, end_date=now + timedelta(days=1))
+            discount.products.add(*self.products)
+
+    def changelist(self) -> tuple[Any, int]:
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('admin:discounts_discount_changelist'))
+        return response, len(app_queries(context))
+
+    def test_changelist_annotates_product_counts(self):
+        self.add_discounts(2)
+        response, before = self.changelist()
+        self.assertEqual({(d.product_count, d.active_product_count) for d in response.context['cl'].result_list},
+                         {(4, 2)})
+        self.add_discounts(3)
+        self.assertEqual(self.changelist()[1], before)
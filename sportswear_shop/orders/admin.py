@@ -1,18 +1,18 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django import forms
-from decimal import Decimal
-from django.http import HttpRequest, HttpResponse
-from reportlab.pdfgen.canvas import Canvas
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.units import mm
-from reportlab.lib import colors
-from reportlab.platypus import Table, TableStyle
-from .models import Order, OrderItem
+from datetime import datetime
+from django.http import FileResponse, Http404, HttpRequest, HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404, redirect
+from django.urls import path, reverse
+from django.utils.html import format_html
+from django.db.models import Count, QuerySet
+from shop.pagination import EstimatedCountPaginator
+from shop.pricing import discounted_unit_price, price_line, price_totals
+from .exports import start_export
+from .models import Order, OrderExport, OrderItem
 from discounts.models import Discount
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
+from discounts import resolver
 from typing import Any, Optional
-import os
 
 class OrderItemForm(forms.ModelForm):
     """Форма для позиции заказа с валидацией скидок."""
@@ -26,22 +26,29 @@ class OrderItemForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
         if 'product' in self.fields and self.instance.product_id:
             self.fields['price'].initial = self.instance.product.price
-            self.fields['discount'].queryset = Discount.objects.filter(
-                product=self.instance.product,
-                active=True
-            )
+            offers = resolver.offers_for(self.instance.product_id, self._discount_moment())
+            self.fields['discount'].queryset = Discount.objects.filter(pk__in=[offer.id for offer in offers])
+
+    def _discount_moment(self) -> Optional[datetime]:
+        """Момент, на который проверяются скидки: создание заказа или текущее время."""
+        order = getattr(self.instance, 'order', None) if self.instance.order_id else None
+        return order.created_at if order is not None else None
 
     def clean(self) -> dict[str, Any]:
-        """Проверка, что скидка соответствует выбранному товару."""
+        """Проверка, что скидка действует на выбранный товар."""
         cleaned_data = super().clean()
         product = cleaned_data.get('product')
         discount = cleaned_data.get('discount')
-        
+
         if product and discount:
-            if discount not in product.discounts.all():
+            if not resolver.applies(discount.pk, product.pk, self._discount_moment()):
                 raise forms.ValidationError("Эта скидка не может быть применена к выбранному товару")
         return cleaned_data
 
+def item_percent(item: OrderItem) -> int:
+    """Процент скидки позиции (0 — без скидки)."""
+    return item.discount.discount_percent if item.discount_id else 0
+
 class OrderItemInline(admin.TabularInline):
     """Инлайн-форма для позиции заказа в админке."""
     model = OrderItem
@@ -51,99 +58,27 @@ class OrderItemInline(admin.TabularInline):
     readonly_fields = ("final_price", "total_cost")
     raw_id_fields = ("product",)
 
+    def get_queryset(self, request: HttpRequest) -> QuerySet:
+        """Загружает позиции вместе со скидками для расчёта цен."""
+        return super().get_queryset(request).select_related('discount')
+
     @admin.display(description="Цена со скидкой")
     def final_price(self, obj: OrderItem) -> str:
         """Возвращает цену с учетом скидки."""
-        if obj.price is None:
-            return "0.00 руб."
-        if obj.discount:
-            discount_percent = Decimal(str(obj.discount.discount_percent))
-            discount_amount = obj.price * discount_percent / Decimal('100')
-            return f"{obj.price - discount_amount:.2f} руб."
-        return f"{obj.price:.2f} руб."
+        return f"{discounted_unit_price(obj.price or 0, item_percent(obj)):.2f} руб."
 
     @admin.display(description="Сумма")
     def total_cost(self, obj: OrderItem) -> str:
         """Возвращает общую сумму по позиции."""
-        final_price_str = self.final_price(obj)
-        try:
-            price = Decimal(final_price_str.split()[0])
-            quantity = Decimal(str(obj.quantity)) if obj.quantity else Decimal('0')
-            return f"{price * quantity:.2f} руб."
-        except Exception:
-            return "0.00 руб."
+        return f"{price_line(obj.price or 0, obj.quantity or 0, item_percent(obj)).total:.2f} руб."
 
 def export_order_pdf(modeladmin: admin.ModelAdmin, request: HttpRequest, queryset: Any) -> HttpResponse:
-    """Экспорт заказов в PDF с табличным представлением."""
-    font_path = os.path.join(os.path.dirname(__file__), 'fonts', 'DejaVuSans.ttf')
-    pdfmetrics.registerFont(TTFont('DejaVuSans', font_path))
-
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = 'attachment; filename="orders.pdf"'
-    
-    p: Canvas = Canvas(response, pagesize=A4)
-    p.setFont("DejaVuSans", 14)
-    width, height = A4
-    margin = 20 * mm
-    y_position = height - margin
-    
-    for order in queryset:
-        p.setFont("DejaVuSans", 14)
-        p.drawString(margin, y_position, f"Заказ #{order.id}")
-        y_position -= 6 * mm
-        
-        p.setFont("DejaVuSans", 12)
-        info_lines = [
-            f"Клиент: {order.user.username}",
-            f"Дата: {order.created_at.strftime('%d.%m.%Y %H:%M')}",
-            f"Статус: {order.get_status_display()}"
-        ]
-        for line in info_lines:
-            p.drawString(margin, y_position, line)
-            y_position -= 5 * mm
-        
-        y_position -= 5 * mm
-        
-        data = [['Товар', 'Кол-во', 'Цена', 'Скидка', 'Сумма']]
-        
-        for item in order.items.all():
-            discount = f"{item.discount.discount_percent}%" if item.discount else "-"
-            row = [
-                item.product.name,
-                str(item.quantity),
-                f"{item.price:.2f} руб.",
-                discount,
-                f"{item.price * item.quantity:.2f} руб."
-            ]
-            data.append(row)
-
-        data.append(["ИТОГО:", "", "", "", f"{order.total_price:.2f} руб."])
-        data.append(["Со скидкой:", "", "", "", f"{order.discounted_total:.2f} руб."])
-        
-        table = Table(data, colWidths=[80*mm, 20*mm, 30*mm, 20*mm, 30*mm])
-        table.setStyle(TableStyle([
-            ('FONTNAME', (0, 0), (-1, -1), 'DejaVuSans'),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 6),
-            ('BOTTOMPADDING', (0, 1), (-1, -1), 4),
-            ('LINEBELOW', (0, 0), (-1, 0), 1, colors.black),
-            ('LINEBELOW', (0, -3), (-1, -3), 1, colors.black),
-        ]))
-        
-        table.wrapOn(p, width - 2*margin, height)
-        table.drawOn(p, margin, y_position - table._height)
-        y_position -= table._height + 15 * mm
-        
-        if y_position < margin:
-            p.showPage()
-            y_position = height - margin
-    
-    p.save()
-    return response
-
-export_order_pdf.short_description = "Экспорт заказов в PDF (таблица)"
+    """Запускает фоновую выгрузку заказов в PDF и открывает страницу её прогресса."""
+    export = start_export(queryset.values_list('pk', flat=True), request.user)
+    modeladmin.message_user(request, f"Выгрузка {export.pk} запущена: {export.total} заказов", messages.INFO)
+    return redirect('admin:orders_orderexport_change', export.pk)
+
+export_order_pdf.short_description = "Экспорт заказов в PDF (в фоне)"
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
@@ -154,36 +89,32 @@ class OrderAdmin(admin.ModelAdmin):
     raw_id_fields = ("user",)
     readonly_fields = ("created_at", "updated_at", "discounted_total", 'invoice')
     actions = [export_order_pdf]
+    list_select_related = ("user",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request: HttpRequest) -> QuerySet:
+        """Добавляет к заказам количество позиций."""
+        return super().get_queryset(request).annotate(item_count=Count('items'))
 
     def save_formset(self, request: HttpRequest, form: forms.ModelForm, formset: forms.BaseInlineFormSet, change: bool) -> None:
         """Сохраняет позиции заказа с пересчётом итоговых сумм."""
         instances = formset.save(commit=False)
         order: Order = form.instance
-        total = Decimal('0')
-        discounted_total = Decimal('0')
-        
         for instance in instances:
             if not instance.price and instance.product:
                 instance.price = instance.product.price
-            
-            if instance.price and instance.quantity:
-                price = instance.price
-                quantity = Decimal(str(instance.quantity))
-                final_price = price
-                if instance.discount:
-                    discount_percent = Decimal(str(instance.discount.discount_percent))
-                    discount_amount = price * discount_percent / Decimal('100')
-                    final_price = price - discount_amount
-                
-                total += price * quantity
-                discounted_total += final_price * quantity
             instance.save()
-        
-        order.total_price = total
-        order.discounted_total = discounted_total
-        order.save()
+        for instance in formset.deleted_objects:
+            instance.delete()
         formset.save_m2m()
 
+        # Итоги считаются по всем позициям заказа, а не только по изменённым
+        totals = price_totals(order.items.values_list('price', 'quantity', 'discount__discount_percent'))
+        order.total_price = totals.subtotal
+        order.discounted_total = totals.total
+        order.save(update_fields=['total_price', 'discounted_total', 'updated_at'])
+
     @admin.display(description="Дата")
     def created_date(self, obj: Order) -> str:
         """Форматированная дата создания."""
@@ -197,24 +128,12 @@ class OrderAdmin(admin.ModelAdmin):
     @admin.display(description="Итого со скидкой")
     def discounted_total(self, obj: Order) -> str:
         """Сумма заказа с учетом скидок."""
-        if hasattr(obj, 'discounted_total'):
-            return f"{obj.discounted_total:.2f} руб."
-        
-        total = Decimal('0')
-        for item in obj.items.all():
-            if item.price and item.quantity:
-                price = Decimal(str(item.price))
-                quantity = Decimal(str(item.quantity))
-                if item.discount:
-                    discount_percent = Decimal(str(item.discount.discount_percent))
-                    price -= price * discount_percent / Decimal('100')
-                total += price * quantity
-        return f"{total:.2f} руб."
-
-    @admin.display(description="Товаров")
+        return f"{obj.discounted_total or 0:.2f} руб."
+
+    @admin.display(description="Товаров", ordering="item_count")
     def item_count(self, obj: Order) -> int:
-        """Количество товаров в заказе."""
-        return obj.items.count()
+        """Количество позиций в заказе (аннотация get_queryset)."""
+        return obj.item_count
 
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
@@ -222,6 +141,9 @@ class OrderItemAdmin(admin.ModelAdmin):
     list_display = ("id", "order", "product", "quantity", "price_display", "discount_info", "final_price_display", "total_cost_display")
     raw_id_fields = ("order", "product")
     list_filter = ("discount",)
+    list_select_related = ("order__user", "product", "discount")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     @admin.display(description="Цена")
     def price_display(self, obj: OrderItem) -> str:
@@ -238,20 +160,74 @@ class OrderItemAdmin(admin.ModelAdmin):
     @admin.display(description="Цена со скидкой")
     def final_price_display(self, obj: OrderItem) -> str:
         """Цена товара с учетом скидки."""
-        if obj.price is None:
-            return "0.00 руб."
-        if obj.discount:
-            discount_percent = Decimal(str(obj.discount.discount_percent))
-            return f"{obj.price * (Decimal('1') - discount_percent/Decimal('100')):.2f} руб."
-        return f"{obj.price:.2f} руб."
+        return f"{discounted_unit_price(obj.price or 0, item_percent(obj)):.2f} руб."
 
     @admin.display(description="Сумма")
     def total_cost_display(self, obj: OrderItem) -> str:
         """Общая сумма за позицию."""
-        final_price_str = self.final_price_display(obj)
-        try:
-            price = Decimal(final_price_str.split()[0])
-            quantity = Decimal(str(obj.quantity)) if obj.quantity else Decimal('0')
-            return f"{price * quantity:.2f} руб."
-        except Exception:
-            return "0.00 руб."
+        return f"{price_line(obj.price or 0, obj.quantity or 0, item_percent(obj)).total:.2f} руб."
+
+@admin.register(OrderExport)
+class OrderExportAdmin(admin.ModelAdmin):
+    """Админка фоновых выгрузок заказов: прогресс и скачивание результата."""
+    list_display = ("id", "status", "progress_display", "created_by", "created_at", "finished_at", "download_link")
+    list_filter = ("status",)
+    list_select_related = ("created_by",)
+    fields = ("status", "progress_display", "total", "processed", "created_by", "created_at", "finished_at",
+              "download_link", "error")
+    readonly_fields = fields
+
+    def has_add_permission(self, request: HttpRequest) -> bool:
+        """Выгрузки создаются действием в списке заказов."""
+        return False
+
+    def has_change_permission(self, request: HttpRequest, obj: Optional[OrderExport] = None) -> bool:
+        return False
+
+    def get_urls(self) -> list:
+        """Добавляет адреса опроса прогресса и скачивания."""
+        info = self.model._meta.app_label, self.model._meta.model_name
+        return [
+            path('<int:pk>/progress/', self.admin_site.admin_view(self.progress_view), name='%s_%s_progress' % info),
+            path('<int:pk>/download/', self.admin_site.admin_view(self.download_view), name='%s_%s_download' % info),
+        ] + super().get_urls()
+
+    def progress_view(self, request: HttpRequest, pk: int) -> JsonResponse:
+        """Состояние выгрузки для опроса со страницы выгрузки."""
+        if not self.has_view_permission(request):
+            raise Http404
+        export = get_object_or_404(OrderExport, pk=pk)
+        return JsonResponse({
+            'status': export.status,
+            'status_display': export.get_status_display(),
+            'processed': export.processed,
+            'total': export.total,
+            'progress': export.progress,
+            'download_url': self._download_url(export),
+            'error': export.error,
+        })
+
+    def download_view(self, request: HttpRequest, pk: int) -> FileResponse:
+        """Отдаёт готовый файл выгрузки."""
+        if not self.has_view_permission(request):
+            raise Http404
+        export = get_object_or_404(OrderExport, pk=pk, status='done')
+        if not export.file:
+            raise Http404
+        return FileResponse(export.file.open('rb'), as_attachment=True, filename=export.file.name.rsplit('/', 1)[-1])
+
+    def _download_url(self, export: OrderExport) -> Optional[str]:
+        if export.status != 'done' or not export.file:
+            return None
+        return reverse('admin:orders_orderexport_download', args=[export.pk])
+
+    @admin.display(description="Готовность")
+    def progress_display(self, obj: OrderExport) -> str:
+        """Процент готовности выгрузки."""
+        return f"{obj.progress}% ({obj.processed} из {obj.total})"
+
+    @admin.display(description="Файл")
+    def download_link(self, obj: OrderExport) -> str:
+        """Ссылка на скачивание готового файла."""
+        url = self._download_url(obj)
+        return format_html('<a href="{}">Скачать</a>', url) if url else "-"
@@ -0,0 +1,8 @@
+from django.urls import path
+from .views import CheckoutAPIView, OrderHistoryView, OrderListView
+
+urlpatterns = [
+    path('orders/', OrderListView.as_view(), name='api_order_list'),
+    path('orders/history/', OrderHistoryView.as_view(), name='api_order_history'),
+    path('orders/checkout/', CheckoutAPIView.as_view(), name='api_checkout'),
+]
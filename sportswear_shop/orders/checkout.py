@@ -0,0 +1,89 @@
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from django.db import IntegrityError, transaction
+
+from cart import reservations
+from cart.backends import BaseCartBackend
+from cart.pricing import price_lines
+from shop import cache as shop_cache
+from shop import product_stats
+
+from .models import Order, OrderItem
+
+MAX_IDEMPOTENCY_KEY_LENGTH = 64
+
+
+class EmptyCart(Exception):
+    """
+    Оформление пустой корзины.
+    """
+
+
+@dataclass
+class CheckoutResult:
+    """
+    Результат оформления: заказ и признак того, что он создан этим вызовом.
+    """
+    order: Order
+    created: bool
+
+
+def _existing(user: Any, idempotency_key: Optional[str]) -> Optional[Order]:
+    if not idempotency_key:
+        return None
+    return Order.objects.filter(user=user, idempotency_key=idempotency_key).first()
+
+
+def checkout(backend: BaseCartBackend, user: Any, idempotency_key: Optional[str] = None,
+             discount_id: Optional[int] = None) -> CheckoutResult:
+    """
+    Превращает корзину в заказ одной транзакцией.
+
+    Строки товаров блокируются и списываются со склада одним UPDATE
+    (cart.reservations.commit), цены и скидки фиксируются на момент
+    оформления, позиции заказа создаются одним bulk_create, корзина
+    удаляется вместе с резервами. Повтор запроса с тем же ключом
+    идемпотентности возвращает уже созданный заказ, в том числе если два
+    повтора пришли одновременно (их разводит уникальный индекс).
+
+    :param backend: Хранилище корзины покупателя.
+    :param user: Покупатель.
+    :param idempotency_key: Ключ запроса от клиента.
+    :param discount_id: Выбранная покупателем скидка (см. cart.pricing).
+    :return: Заказ и признак создания.
+    :raises EmptyCart: Если корзина пуста.
+    :raises reservations.InsufficientStock: Если какого-либо товара не хватает.
+    """
+    existing = _existing(user, idempotency_key)
+    if existing is not None:
+        return CheckoutResult(existing, False)
+    lines = backend.lines
+    if not lines:
+        raise EmptyCart('Корзина пуста')
+    try:
+        with transaction.atomic():
+            reservations.commit(backend.get_cart(), lines)
+            # Строки товаров заблокированы до конца транзакции: цены не изменятся
+            summary = price_lines(lines, discount_id)
+            order = Order.objects.create(
+                user=user,
+                idempotency_key=idempotency_key or None,
+                total_price=summary.subtotal,
+                discounted_total=summary.total,
+            )
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=line.product, quantity=line.quantity, price=line.unit_price,
+                          discount_id=line.discount.id if line.discount else None)
+                for line in summary.lines
+            ])
+            # bulk_create не отправляет сигналы: статистику продаж обновляем сами
+            product_stats.apply_sales_batch({line.product.pk: line.quantity for line in summary.lines})
+            transaction.on_commit(lambda: shop_cache.bump_version(shop_cache.SALES))
+            backend.discard()
+    except IntegrityError:
+        existing = _existing(user, idempotency_key)
+        if existing is None:
+            raise
+        return CheckoutResult(existing, False)
+    return CheckoutResult(order, True)
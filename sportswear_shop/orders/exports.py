@@ -0,0 +1,328 @@
+import logging
+import os
+import tempfile
+import threading
+import zipfile
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Iterable, Iterator, Optional
+
+from django.conf import settings
+from django.core.files import File
+from django.db import close_old_connections, transaction
+from django.db.models import F, Prefetch
+from django.utils import timezone
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import mm
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen.canvas import Canvas
+from reportlab.platypus import Table, TableStyle
+
+from shop.pricing import price_many
+
+logger = logging.getLogger(__name__)
+
+FONT_NAME = 'DejaVuSans'
+FONT_PATH = os.path.join(os.path.dirname(__file__), 'fonts', 'DejaVuSans.ttf')
+DEFAULT_WORKERS = 2
+DEFAULT_PART_SIZE = 500
+CHUNK_SIZE = 200
+
+TABLE_STYLE = TableStyle([
+    ('FONTNAME', (0, 0), (-1, -1), FONT_NAME),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 6),
+    ('BOTTOMPADDING', (0, 1), (-1, -1), 4),
+    ('LINEBELOW', (0, 0), (-1, 0), 1, colors.black),
+    ('LINEBELOW', (0, -3), (-1, -3), 1, colors.black),
+])
+COLUMN_WIDTHS = [80 * mm, 20 * mm, 30 * mm, 20 * mm, 30 * mm]
+
+_font_lock = threading.Lock()
+_font_registered = False
+_runner: Optional[ThreadPoolExecutor] = None
+_pool: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+@dataclass
+class ExportOrder:
+    """
+    Заказ, подготовленный к печати: только строки, без обращений к БД.
+
+    Передаётся в дочерние процессы пула, поэтому не содержит моделей.
+    """
+    id: int
+    customer: str
+    created_at: str
+    status: str
+    rows: list[list[str]]
+    total_price: str
+    discounted_total: str
+
+
+def worker_count() -> int:
+    """
+    Количество процессов для отрисовки частей; 0 — выгрузка в текущем процессе.
+    """
+    return getattr(settings, 'ORDER_EXPORT_WORKERS', DEFAULT_WORKERS)
+
+
+def part_size() -> int:
+    """
+    Количество заказов в одной части выгрузки (отдельный PDF, рисуется одним процессом).
+    """
+    return getattr(settings, 'ORDER_EXPORT_PART_SIZE', DEFAULT_PART_SIZE)
+
+
+def register_font() -> str:
+    """
+    Регистрирует шрифт DejaVuSans один раз на процесс.
+
+    :return: Имя шрифта.
+    """
+    global _font_registered
+    if not _font_registered:
+        with _font_lock:
+            if not _font_registered:
+                pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_PATH))
+                _font_registered = True
+    return FONT_NAME
+
+
+def load_orders(order_ids: Iterable[int], chunk_size: int = CHUNK_SIZE) -> Iterator[ExportOrder]:
+    """
+    Загружает заказы пачками: на пачку два запроса (заказы с покупателями,
+    позиции с товарами и скидками).
+
+    :param order_ids: ID заказов.
+    :param chunk_size: Размер пачки.
+    :return: Итератор заказов, подготовленных к печати.
+    """
+    from .models import Order, OrderItem
+
+    order_ids = list(order_ids)
+    items = OrderItem.objects.select_related('product', 'discount').only(
+        'order_id', 'quantity', 'price', 'product__name', 'discount__discount_percent',
+    ).order_by('pk')
+    for start in range(0, len(order_ids), chunk_size):
+        chunk = (Order.objects.filter(pk__in=order_ids[start:start + chunk_size])
+                 .select_related('user').prefetch_related(Prefetch('items', queryset=items))
+                 .order_by('pk'))
+        for order in chunk:
+            order_items = order.items.all()
+            prices = price_many((item.price, item.quantity, 0) for item in order_items)
+            yield ExportOrder(
+                id=order.pk,
+                customer=order.user.username,
+                created_at=timezone.localtime(order.created_at).strftime('%d.%m.%Y %H:%M'),
+                status=order.get_status_display(),
+                rows=[
+                    [item.product.name, str(item.quantity), f"{item.price:.2f} руб.",
+                     f"{item.discount.discount_percent}%" if item.discount else "-",
+                     f"{line.subtotal:.2f} руб."]
+                    for item, line in zip(order_items, prices)
+                ],
+                total_price=f"{order.total_price:.2f} руб.",
+                discounted_total=f"{order.discounted_total:.2f} руб.",
+            )
+
+
+class OrderPdfWriter:
+    """
+    Рисует заказы на холсте по одному, перенося таблицы на следующую страницу.
+    """
+
+    def __init__(self, canvas: Canvas) -> None:
+        self.canvas = canvas
+        self.width, self.height = A4
+        self.margin = 20 * mm
+        self.top = self.height - self.margin
+        self.y = self.top
+
+    def new_page(self) -> None:
+        self.canvas.showPage()
+        self.y = self.top
+
+    def write(self, order: ExportOrder) -> None:
+        """
+        Добавляет заказ: заголовок, сведения о покупателе и таблицу позиций.
+        """
+        # Заголовок не отрываем от начала таблицы
+        if self.y - 40 * mm < self.margin:
+            self.new_page()
+        self.canvas.setFont(FONT_NAME, 14)
+        self.canvas.drawString(self.margin, self.y, f"Заказ #{order.id}")
+        self.y -= 6 * mm
+        self.canvas.setFont(FONT_NAME, 12)
+        for line in (f"Клиент: {order.customer}", f"Дата: {order.created_at}", f"Статус: {order.status}"):
+            self.canvas.drawString(self.margin, self.y, line)
+            self.y -= 5 * mm
+        self.y -= 5 * mm
+
+        data = [['Товар', 'Кол-во', 'Цена', 'Скидка', 'Сумма'], *order.rows,
+                ["ИТОГО:", "", "", "", order.total_price],
+                ["Со скидкой:", "", "", "", order.discounted_total]]
+        table = Table(data, colWidths=COLUMN_WIDTHS, repeatRows=1)
+        table.setStyle(TABLE_STYLE)
+        self.draw_table(table)
+        self.y -= 15 * mm
+
+    def draw_table(self, table: Table) -> None:
+        """
+        Рисует таблицу, разбивая её по страницам, если она не помещается.
+        """
+        available_width = self.width - 2 * self.margin
+        while True:
+            available = self.y - self.margin
+            _, height = table.wrapOn(self.canvas, available_width, available)
+            if height <= available:
+                table.drawOn(self.canvas, self.margin, self.y - height)
+                self.y -= height
+                return
+            pieces = table.split(available_width, available) if available > 0 else []
+            if len(pieces) < 2:
+                if self.y == self.top:
+                    # Даже на пустой странице не делится: рисуем как есть
+                    table.drawOn(self.canvas, self.margin, self.y - height)
+                    self.y -= height
+                    return
+                self.new_page()
+                continue
+            first, table = pieces
+            _, height = first.wrapOn(self.canvas, available_width, available)
+            first.drawOn(self.canvas, self.margin, self.y - height)
+            self.new_page()
+
+
+def render_part(orders: list[ExportOrder], path: str) -> int:
+    """
+    Рисует часть выгрузки в PDF-файл.
+
+    Функция не обращается к Django и выполняется в дочернем процессе пула;
+    шрифт регистрируется один раз на процесс.
+
+    :param orders: Заказы части.
+    :param path: Путь к создаваемому файлу.
+    :return: Количество заказов в части.
+    """
+    register_font()
+    canvas = Canvas(path, pagesize=A4)
+    writer = OrderPdfWriter(canvas)
+    for order in orders:
+        writer.write(order)
+    canvas.save()
+    return len(orders)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _executor_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=worker_count())
+        return _pool
+
+
+def _get_runner() -> ThreadPoolExecutor:
+    global _runner
+    with _executor_lock:
+        if _runner is None:
+            _runner = ThreadPoolExecutor(max_workers=1, thread_name_prefix='order-export')
+        return _runner
+
+
+def _advance(export_id: int, count: int) -> None:
+    from .models import OrderExport
+
+    OrderExport.objects.filter(pk=export_id).update(processed=F('processed') + count)
+
+
+def run_export(export_id: int) -> None:
+    """
+    Выполняет выгрузку: заказы делятся на части по ORDER_EXPORT_PART_SIZE,
+    каждая часть загружается пачками и рисуется в свой PDF (параллельно в
+    пуле процессов, если ORDER_EXPORT_WORKERS > 0; следующая часть
+    загружается, только когда в работе меньше частей, чем процессов). Прогресс сохраняется
+    после каждой части. Одна часть сохраняется как PDF, несколько — ZIP-архивом.
+
+    :param export_id: ID OrderExport.
+    """
+    from .models import OrderExport
+
+    export = OrderExport.objects.filter(pk=export_id, status='pending').first()
+    if export is None:
+        return
+    OrderExport.objects.filter(pk=export_id).update(status='running', processed=0)
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            order_ids = list(export.order_ids)
+            size = part_size()
+            paths = []
+            futures: deque[Future] = deque()
+            workers = worker_count()
+            for start in range(0, len(order_ids), size) or [0]:
+                path = os.path.join(directory, f'orders-{len(paths) + 1}.pdf')
+                paths.append(path)
+                # В памяти держится не больше workers загруженных частей
+                while workers > 0 and len(futures) >= workers:
+                    _advance(export_id, futures.popleft().result())
+                orders = list(load_orders(order_ids[start:start + size]))
+                if workers > 0:
+                    futures.append(_get_pool().submit(render_part, orders, path))
+                else:
+                    _advance(export_id, render_part(orders, path))
+            while futures:
+                _advance(export_id, futures.popleft().result())
+
+            stamp = timezone.now().strftime('%Y%m%d-%H%M%S')
+            if len(paths) == 1:
+                with open(paths[0], 'rb') as result:
+                    export.file.save(f'orders-{export_id}-{stamp}.pdf', File(result), save=False)
+            else:
+                archive_path = os.path.join(directory, 'orders.zip')
+                with zipfile.ZipFile(archive_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+                    for path in paths:
+                        archive.write(path, os.path.basename(path))
+                with open(archive_path, 'rb') as result:
+                    export.file.save(f'orders-{export_id}-{stamp}.zip', File(result), save=False)
+        OrderExport.objects.filter(pk=export_id).update(
+            status='done', file=export.file.name, processed=len(order_ids), finished_at=timezone.now(),
+        )
+    except Exception as exc:
+        logger.exception('Не удалось выгрузить заказы (выгрузка %s)', export_id)
+        OrderExport.objects.filter(pk=export_id).update(status='failed', error=str(exc), finished_at=timezone.now())
+
+
+def _run_in_background(export_id: int) -> None:
+    close_old_connections()
+    try:
+        run_export(export_id)
+    finally:
+        close_old_connections()
+
+
+def start_export(order_ids: Iterable[int], user: Any = None) -> Any:
+    """
+    Создаёт выгрузку и после фиксации транзакции запускает её в фоновом
+    потоке, не блокируя запрос. При ORDER_EXPORT_WORKERS = 0 выгрузка
+    выполняется синхронно.
+
+    :param order_ids: ID выгружаемых заказов.
+    :param user: Автор выгрузки.
+    :return: Созданная выгрузка (OrderExport).
+    """
+    from .models import OrderExport
+
+    order_ids = sorted(order_ids)
+    export = OrderExport.objects.create(created_by=user, order_ids=order_ids, total=len(order_ids))
+    if worker_count() <= 0:
+        run_export(export.pk)
+        export.refresh_from_db()
+    else:
+        transaction.on_commit(lambda: _get_runner().submit(_run_in_background, export.pk))
+    return export
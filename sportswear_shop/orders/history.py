@@ -0,0 +1,103 @@
+from datetime import timedelta
+from typing import Any, Iterable
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework import serializers
+
+from shop import cache as shop_cache
+
+from .models import Order, OrderItem
+
+DEFAULT_DETAIL_DAYS = 30
+SUMMARY_TIMEOUT = 60 * 60 * 24
+# Колонки заказа, нужные странице истории и краткой сводке
+ORDER_FIELDS = ('id', 'user_id', 'status', 'total_price', 'discounted_total', 'created_at')
+
+
+def detail_age() -> timedelta:
+    """
+    Возвращает возраст, начиная с которого заказ отдаётся краткой сводкой
+    (настройка ORDER_HISTORY_DETAIL_DAYS, дни).
+    """
+    return timedelta(days=getattr(settings, 'ORDER_HISTORY_DETAIL_DAYS', DEFAULT_DETAIL_DAYS))
+
+
+def split_page(orders: Iterable[Order]) -> tuple[list[Order], list[Order]]:
+    """
+    Делит страницу истории на свежие заказы (полное представление) и старые (краткая сводка).
+    """
+    boundary = timezone.now() - detail_age()
+    recent: list[Order] = []
+    old: list[Order] = []
+    for order in orders:
+        (recent if order.created_at >= boundary else old).append(order)
+    return recent, old
+
+
+def _summary_key(order: Order, version: int) -> str:
+    return f'orders:summary:{order.pk}:{version}'
+
+
+def build_summaries(orders: Iterable[Order]) -> dict[int, dict[str, Any]]:
+    """
+    Строит краткие сводки заказов одним запросом к позициям.
+
+    :param orders: Заказы (достаточно колонок ORDER_FIELDS).
+    :return: Словарь {ID заказа: сводка}.
+    """
+    orders = list(orders)
+    date_field = serializers.DateTimeField()
+    summaries = {
+        order.pk: {
+            'id': order.pk,
+            'status': order.status,
+            'total_price': str(order.total_price),
+            'discounted_total': str(order.discounted_total),
+            'created_at': date_field.to_representation(order.created_at),
+            'item_count': 0,
+            'items': [],
+            'compact': True,
+        }
+        for order in orders
+    }
+    items = (OrderItem.objects.filter(order_id__in=list(summaries))
+             .select_related('product').only('order_id', 'quantity', 'price', 'discount_id', 'product__name')
+             .order_by('pk'))
+    for item in items:
+        summary = summaries[item.order_id]
+        summary['items'].append({
+            'product_id': item.product_id,
+            'name': item.product.name,
+            'quantity': item.quantity,
+            'price': str(item.price),
+            'discount_id': item.discount_id,
+        })
+        summary['item_count'] += item.quantity
+    return summaries
+
+
+def get_summaries(orders: Iterable[Order]) -> dict[int, dict[str, Any]]:
+    """
+    Возвращает краткие сводки заказов из кеша, достраивая недостающие.
+
+    Сводки старых заказов почти не меняются, поэтому страница истории
+    читает их одним get_many. Ключи построены на версии заказов
+    пользователя, которую поднимают сигналы Order и OrderItem.
+
+    :param orders: Заказы одного или нескольких пользователей.
+    :return: Словарь {ID заказа: сводка}.
+    """
+    orders = list(orders)
+    versions = {user_id: shop_cache.get_version(shop_cache.orders_namespace(user_id))
+                for user_id in {order.user_id for order in orders}}
+    keys = {order.pk: _summary_key(order, versions[order.user_id]) for order in orders}
+    found = cache.get_many(list(keys.values()))
+    result = {pk: found[key] for pk, key in keys.items() if key in found}
+    missing = [order for order in orders if order.pk not in result]
+    if missing:
+        built = build_summaries(missing)
+        cache.set_many({keys[pk]: summary for pk, summary in built.items()}, SUMMARY_TIMEOUT)
+        result.update(built)
+    return result
@@ -54,10 +54,25 @@ class Order(models.Model):
         verbose_name="Счёт-фактура",
         help_text="Загрузите PDF или изображение счёта"
     )
+    idempotency_key: models.CharField = models.CharField(
+        max_length=64,
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="Ключ идемпотентности",
+        help_text="Ключ запроса оформления: повтор с тем же ключом возвращает этот заказ"
+    )
 
     class Meta:
         verbose_name = "Заказ"
         verbose_name_plural = "Заказы"
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'idempotency_key'], name='orders_order_idempotency_unique'),
+        ]
+        indexes = [
+            # История заказов: user_id = ? ORDER BY created_at DESC, id DESC
+            models.Index(fields=['user', '-created_at', '-id'], name='orders_order_history_idx'),
+        ]
 
     def __str__(self) -> str:
         """
@@ -116,3 +131,82 @@ class OrderItem(models.Model):
         Возвращает строковое представление позиции заказа.
         """
         return f"{self.product.name} x {self.quantity}"
+
+
+class OrderExport(models.Model):
+    """
+    Фоновая выгрузка заказов в PDF (см. orders.exports).
+    """
+
+    STATUS_CHOICES = [
+        ('pending', 'В очереди'),
+        ('running', 'Выполняется'),
+        ('done', 'Готово'),
+        ('failed', 'Ошибка'),
+    ]
+
+    created_by: models.ForeignKey = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        verbose_name="Автор",
+        related_name="order_exports"
+    )
+    order_ids: models.JSONField = models.JSONField(
+        default=list,
+        verbose_name="Заказы"
+    )
+    status: models.CharField = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default='pending',
+        verbose_name="Статус"
+    )
+    total: models.PositiveIntegerField = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Всего заказов"
+    )
+    processed: models.PositiveIntegerField = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Обработано заказов"
+    )
+    file: models.FileField = models.FileField(
+        upload_to='orders/exports/%Y/%m/%d/',
+        blank=True,
+        null=True,
+        verbose_name="Файл"
+    )
+    error: models.TextField = models.TextField(
+        blank=True,
+        verbose_name="Ошибка"
+    )
+    created_at: models.DateTimeField = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Создана"
+    )
+    finished_at: models.DateTimeField = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Завершена"
+    )
+
+    class Meta:
+        verbose_name = "Выгрузка заказов"
+        verbose_name_plural = "Выгрузки заказов"
+        ordering = ['-created_at']
+
+    def __str__(self) -> str:
+        """
+        Возвращает строковое представление выгрузки.
+        """
+        return f"Выгрузка {self.id} ({self.get_status_display()})"
+
+    @property
+    def progress(self) -> int:
+        """
+        Возвращает готовность выгрузки в процентах.
+        """
+        if self.status == 'done':
+            return 100
+        return self.processed * 100 // self.total if self.total else 0
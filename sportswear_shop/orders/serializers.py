@@ -1,19 +1,32 @@
 from typing import Any
 from rest_framework import serializers
 from .models import Order, OrderItem
+from shop.fieldsets import DynamicFieldsMixin
 from shop.serializers import ProductSerializer
+from discounts.models import Discount
 
 
-class OrderItemSerializer(serializers.ModelSerializer):
+class OrderDiscountSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """
+    Сериализатор скидки, применённой к позиции заказа.
+    """
+    class Meta:
+        model = Discount
+        fields = ['id', 'name', 'discount_percent']
+
+
+class OrderItemSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """
     Сериализатор для отображения одного товара в заказе.
     """
     product = ProductSerializer(read_only=True)
+    discount = OrderDiscountSerializer(read_only=True)
     total_cost = serializers.SerializerMethodField()
 
     class Meta:
         model = OrderItem
-        fields = ['id', 'product', 'quantity', 'price', 'total_cost']
+        fields = ['id', 'product', 'quantity', 'price', 'discount', 'total_cost']
+        field_dependencies = {'total_cost': ['price', 'quantity']}
 
     def get_total_cost(self, obj: OrderItem) -> float:
         """
@@ -25,9 +38,11 @@ class OrderItemSerializer(serializers.ModelSerializer):
         return obj.total_cost
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """
     Сериализатор для отображения заказа.
+
+    Поддерживает ?fields= (например, id,status,items.product.name).
     """
     items = OrderItemSerializer(many=True, read_only=True)
     can_cancel = serializers.SerializerMethodField()
@@ -35,6 +50,7 @@ class OrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
         fields = ['id', 'user', 'status', 'total_price', 'discounted_total', 'created_at', 'items', 'can_cancel']
+        field_dependencies = {'can_cancel': ['user', 'status']}
 
     def get_can_cancel(self, obj: Order) -> bool:
         """
@@ -44,4 +60,4 @@ class OrderSerializer(serializers.ModelSerializer):
         :return: True, если можно отменить заказ, иначе False
         """
         user: Any = self.context.get('user')
-        return bool(user and obj.user == user and obj.status == 'pending')
+        return bool(user and obj.user_id == user.pk and obj.status == 'pending')
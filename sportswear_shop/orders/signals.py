@@ -0,0 +1,35 @@
+from typing import Any
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from shop import cache as shop_cache
+
+from .models import Order, OrderItem
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def bump_order_version(sender: type, instance: Order, **kwargs: Any) -> None:
+    """
+    Инвалидирует кешированные сводки заказов покупателя.
+    """
+    shop_cache.bump_version(shop_cache.orders_namespace(instance.user_id))
+
+
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def bump_order_item_version(sender: type, instance: OrderItem, **kwargs: Any) -> None:
+    """
+    Инвалидирует сводки заказов покупателя при изменении позиции.
+
+    Покупатель берётся из уже загруженного заказа (админка, формы), и
+    только без него — отдельным запросом. При каскадном удалении заказа
+    его строки уже нет: версию поднимет сигнал самого заказа.
+    """
+    if OrderItem.order.is_cached(instance):
+        user_id = instance.order.user_id
+    else:
+        user_id = Order.objects.filter(pk=instance.order_id).values_list('user_id', flat=True).first()
+    if user_id is not None:
+        shop_cache.bump_version(shop_cache.orders_namespace(user_id))
@@ -1,3 +1,358 @@
+from datetime import timedelta
+from decimal import Decimal
+from typing import Any, Optional
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from cart import reservations
+from cart.backends import DatabaseCartBackend
+from cart.models import Cart, StockReservation
+from discounts.models import Discount
+from shop.models import Brand, Category, Product, ProductStats
+from shop.tests import app_queries
+from .checkout import EmptyCart, checkout
+from .models import Order, OrderExport, OrderItem
+
+User = get_user_model()
+
+
+class CheckoutTests(TestCase):
+    def setUp(self) -> None:
+        """
+        Создаёт покупателя, два товара и скидку на первый.
+        """
+        cache.clear()
+        category = Category.objects.create(name='Обувь')
+        brand = Brand.objects.create(name='Nike')
+        self.shoes = Product.objects.create(
+            name='Кроссовки', description='', price=Decimal('999.99'), stock=5, size='M',
+            category=category, brand=brand,
+        )
+        self.socks = Product.objects.create(
+            name='Носки', description='', price=Decimal('33.33'), stock=5, size='M', category=category, brand=brand,
+        )
+        now = timezone.now()
+        self.sale = Discount.objects.create(name='Распродажа', discount_percent=15,
+                                            start_date=now - timedelta(days=1), end_date=now + timedelta(days=1))
+        self.sale.products.add(self.shoes)
+        self.user = User.objects.create_user(username='buyer', password='pass')
+        self.client.force_login(self.user)
+
+    def fill_cart(self) -> DatabaseCartBackend:
+        backend = DatabaseCartBackend(self.user)
+        backend.add(self.shoes, 1)
+        backend.add(self.socks, 3)
+        return backend
+
+    def test_checkout_snapshots_prices_and_clears_cart(self):
+        result = checkout(self.fill_cart(), self.user, discount_id=self.sale.pk)
+        self.assertTrue(result.created)
+        order = result.order
+        self.assertEqual(order.total_price, Decimal('1099.98'))
+        self.assertEqual(order.discounted_total, Decimal('949.98'))
+        items = {item.product_id: item for item in OrderItem.objects.filter(order=order)}
+        self.assertEqual((items[self.shoes.pk].price, items[self.shoes.pk].discount_id), (Decimal('999.99'), self.sale.pk))
+        self.assertEqual((items[self.socks.pk].quantity, items[self.socks.pk].discount_id), (3, None))
+        self.shoes.refresh_from_db()
+        self.socks.refresh_from_db()
+        self.assertEqual((self.shoes.stock, self.socks.stock), (4, 2))
+        self.assertFalse(Cart.objects.exists())
+        self.assertFalse(StockReservation.objects.exists())
+        stats = dict(ProductStats.objects.values_list('product_id', 'units_sold'))
+        self.assertEqual(stats, {self.shoes.pk: 1, self.socks.pk: 3})
+
+    def test_insufficient_stock_rolls_back_everything(self):
+        backend = self.fill_cart()
+        Product.objects.filter(pk=self.socks.pk).update(stock=1)
+        with self.assertRaises(reservations.InsufficientStock):
+            checkout(backend, self.user)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(backend.lines, {self.shoes.pk: 1, self.socks.pk: 3})
+        self.shoes.refresh_from_db()
+        self.assertEqual(self.shoes.stock, 5)
+
+    def test_empty_cart_is_rejected(self):
+        with self.assertRaises(EmptyCart):
+            checkout(DatabaseCartBackend(self.user), self.user)
+
+    def test_endpoint_replays_order_for_same_idempotency_key(self):
+        self.fill_cart()
+        url = reverse('api_checkout')
+        first = self.client.post(url, HTTP_IDEMPOTENCY_KEY='order-1')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(first.json()['total_price'], '1099.98')
+        self.assertEqual(len(first.json()['items']), 2)
+        retry = self.client.post(url, HTTP_IDEMPOTENCY_KEY='order-1')
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry.json()['id'], first.json()['id'])
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(self.client.post(url, HTTP_IDEMPOTENCY_KEY='order-2').status_code, 400)
+
+    def test_endpoint_reports_missing_stock(self):
+        self.fill_cart()
+        Product.objects.filter(pk=self.shoes.pk).update(stock=0)
+        response = self.client.post(reverse('api_checkout'))
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['product_id'], self.shoes.pk)
+
+
+class OrderHistoryTests(TestCase):
+    def setUp(self) -> None:
+        """
+        Создаёт покупателя, товары со скидкой и заказы: свежий и старый.
+        """
+        cache.clear()
+        category = Category.objects.create(name='Обувь')
+        brand = Brand.objects.create(name='Nike')
+        self.products = [
+            Product.objects.create(name=f'Товар {i}', description='', price=100 + i, stock=5, size='M',
+                                   category=category, brand=brand)
+            for i in range(3)
+        ]
+        now = timezone.now()
+        self.sale = Discount.objects.create(name='Распродажа', discount_percent=10,
+                                            start_date=now - timedelta(days=1), end_date=now + timedelta(days=1))
+        self.user = User.objects.create_user(username='buyer', password='pass')
+        self.old = self.create_order()
+        Order.objects.filter(pk=self.old.pk).update(created_at=now - timedelta(days=90))
+        self.recent = self.create_order()
+        self.client.force_login(self.user)
+
+    def create_order(self) -> Order:
+        order = Order.objects.create(user=self.user, total_price=303, discounted_total=293)
+        for product in self.products:
+            OrderItem.objects.create(order=order, product=product, quantity=1, price=product.price,
+                                     discount=self.sale if product is self.products[0] else None)
+        return order
+
+    def get(self, params: Optional[dict] = None) -> tuple[dict, list[str]]:
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('api_order_history'), params or {})
+        self.assertEqual(response.status_code, 200)
+        return response.json(), [query['sql'] for query in app_queries(context)]
+
+    def test_recent_orders_are_full_and_old_orders_compact(self):
+        data, _ = self.get()
+        recent, old = data['results']
+        self.assertEqual((recent['id'], recent['compact']), (self.recent.pk, False))
+        self.assertEqual(recent['items'][0]['discount'],
+                         {'id': self.sale.pk, 'name': 'Распродажа', 'discount_percent': 10})
+        self.assertIn('images', recent['items'][0]['product'])
+        self.assertEqual((old['id'], old['compact'], old['item_count']), (self.old.pk, True, 3))
+        self.assertEqual(old['items'][0], {'product_id': self.products[0].pk, 'name': 'Товар 0', 'quantity': 1,
+                                           'price': '100.00', 'discount_id': self.sale.pk})
+
+    def test_query_count_does_not_grow_with_orders(self):
+        self.get()
+        _, queries = self.get()
+        for _ in range(3):
+            self.create_order()
+        # Новые заказы поднимают версию сводок: старая сводка строится заново
+        _, more_queries = self.get()
+        self.assertEqual(len(more_queries), len(queries) + 1)
+
+    def test_old_summaries_are_cached_until_order_changes(self):
+        self.get()
+        _, queries = self.get()
+        self.assertEqual(len([sql for sql in queries if 'orders_orderitem' in sql]), 1)
+        OrderItem.objects.filter(order=self.old).first().delete()
+        data, queries = self.get()
+        self.assertEqual(len([sql for sql in queries if 'orders_orderitem' in sql]), 2)
+        self.assertEqual(data['results'][1]['item_count'], 2)
+
+    def test_item_signal_reuses_loaded_order(self):
+        from shop import cache as shop_cache
+        namespace = shop_cache.orders_namespace(self.user.pk)
+        version = shop_cache.get_version(namespace)
+        item = OrderItem(order=self.recent, product=self.products[0], quantity=2, price=100)
+        with CaptureQueriesContext(connection) as context:
+            item.save()
+        self.assertFalse([query for query in app_queries(context) if 'FROM "orders_order"' in query['sql']])
+        self.assertNotEqual(shop_cache.get_version(namespace), version)
+
+    def test_cursor_pagination(self):
+        data, _ = self.get({'page_size': 1})
+        self.assertEqual([order['id'] for order in data['results']], [self.recent.pk])
+        response = self.client.get(data['next'])
+        self.assertEqual([order['id'] for order in response.json()['results']], [self.old.pk])
+
+
+class OrderExportTests(TestCase):
+    def setUp(self) -> None:
+        """
+        Создаёт заказы (один — на несколько страниц) и временный каталог для файлов.
+        """
+        import shutil
+        import tempfile
+        from django.test import override_settings
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root, ORDER_EXPORT_WORKERS=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        category = Category.objects.create(name='Обувь')
+        brand = Brand.objects.create(name='Nike')
+        product = Product.objects.create(name='Кроссовки', description='', price=100, stock=5, size='M',
+                                         category=category, brand=brand)
+        now = timezone.now()
+        sale = Discount.objects.create(name='Распродажа', discount_percent=10,
+                                       start_date=now - timedelta(days=1), end_date=now + timedelta(days=1))
+        self.admin = User.objects.create_superuser(username='admin', password='pass')
+        self.orders = []
+        for size in (1, 2, 80):
+            order = Order.objects.create(user=self.admin, total_price=100 * size, discounted_total=90 * size)
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=product, quantity=1, price=100, discount=sale) for _ in range(size)
+            ])
+            self.orders.append(order)
+
+    def test_export_renders_pdf_and_tracks_progress(self):
+        from .exports import start_export
+        export = start_export([order.pk for order in self.orders], self.admin)
+        self.assertEqual((export.status, export.processed, export.total, export.progress), ('done', 3, 3, 100))
+        with export.file.open('rb') as result:
+            self.assertTrue(result.read().startswith(b'%PDF'))
+
+    def test_large_selection_is_split_into_parts(self):
+        import zipfile
+        from django.test import override_settings
+        from .exports import start_export
+        with override_settings(ORDER_EXPORT_PART_SIZE=2):
+            export = start_export([order.pk for order in self.orders])
+        self.assertTrue(export.file.name.endswith('.zip'))
+        with export.file.open('rb') as result, zipfile.ZipFile(result) as archive:
+            self.assertEqual(archive.namelist(), ['orders-1.pdf', 'orders-2.pdf'])
+
+    def test_parts_in_flight_are_limited_by_worker_count(self):
+        from concurrent.futures import Future
+        from unittest import mock
+        from django.test import override_settings
+        from . import exports
+        events = []
+
+        class LazyFuture(Future):
+            def __init__(self, fn, *args):
+                super().__init__()
+                self.call = (fn, args)
+
+            def result(self, timeout=None):
+                fn, args = self.call
+                events.append('render')
+                return fn(*args)
+
+        pool = mock.Mock(submit=lambda fn, *args: LazyFuture(fn, *args))
+        load_orders = exports.load_orders
+
+        def recording_load(order_ids):
+            events.append('load')
+            return load_orders(order_ids)
+
+        export = OrderExport.objects.create(order_ids=[order.pk for order in self.orders], total=3)
+        with override_settings(ORDER_EXPORT_WORKERS=1, ORDER_EXPORT_PART_SIZE=1), \
+                mock.patch.object(exports, '_get_pool', return_value=pool), \
+                mock.patch.object(exports, 'load_orders', recording_load):
+            exports.run_export(export.pk)
+        export.refresh_from_db()
+        self.assertEqual((export.status, export.processed), ('done', 3))
+        self.assertEqual(events, ['load', 'render', 'load', 'render', 'load', 'render'])
+
+    def test_orders_are_loaded_in_chunks_with_constant_queries(self):
+        from .exports import load_orders
+        with CaptureQueriesContext(connection) as context:
+            orders = list(load_orders([order.pk for order in self.orders], chunk_size=2))
+        self.assertEqual(len(app_queries(context)), 4)
+        self.assertEqual(orders[0].rows[0], ['Кроссовки', '1', '100.00 руб.', '10%', '100.00 руб.'])
+
+    def test_font_is_registered_once_per_process(self):
+        from unittest import mock
+        from . import exports
+        with mock.patch.object(exports, '_font_registered', False), \
+                mock.patch.object(exports.pdfmetrics, 'registerFont') as register:
+            exports.register_font()
+            exports.register_font()
+        self.assertEqual(register.call_count, 1)
+
+    def test_admin_action_progress_and_download(self):
+        self.client.force_login(self.admin)
+        response = self.client.post(reverse('admin:orders_order_changelist'), {
+            'action': 'export_order_pdf', '_selected_action': [order.pk for order in self.orders],
+        })
+        export = OrderExport.objects.get()
+        self.assertRedirects(response, reverse('admin:orders_orderexport_change', args=[export.pk]))
+        progress = self.client.get(reverse('admin:orders_orderexport_progress', args=[export.pk])).json()
+        self.assertEqual((progress['status'], progress['progress']), ('done', 100))
+        download = self.client.get(progress['download_url'])
+        self.assertEqual(download.status_code, 200)
+        self.assertTrue(b''.join(download.streaming_content).startswith(b'%PDF'))
+
+
+class OrderAdminChangelistTests(TestCase):
+    def setUp(self) -> None:
+        """
+        Создаёт администратора и заказы с позициями.
+        """
+        self.admin = User.objects.create_superuser(username='admin', password='pass')
+        self.client.force_login(self.admin)
+        self.product = Product.objects.create(
+            name='Кроссовки', description='', price=100, stock=5, size='M',
+            category=Category.objects.create(name='Обувь'), brand=Brand.objects.create(name='Nike'),
+        )
+        self.add_orders(2)
+
+    def add_orders(self, count: int) -> None:
+        for _ in range(count):
+            buyer = User.objects.create_user(username=f'buyer{User.objects.count()}', password='pass')
+            order = Order.objects.create(user=buyer, total_price=200, discounted_total=200)
+            OrderItem.objects.bulk_create([OrderItem(order=order, product=self.product, price=100)] * 2)
+
+    def changelist_queries(self, name: str) -> tuple[Any, int]:
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse(name))
+        self.assertEqual(response.status_code, 200)
+        return response, len(app_queries(context))
+
+    def test_order_and_item_changelists_run_constant_number_of_queries(self):
+        for name in ('admin:orders_order_changelist', 'admin:orders_orderitem_changelist'):
+            with self.subTest(name=name):
+                _, before = self.changelist_queries(name)
+                self.add_orders(3)
+                _, after = self.changelist_queries(name)
+                self.assertEqual(after, before)
+
+    def test_item_count_is_annotated(self):
+        response, _ = self.changelist_queries('admin:orders_order_changelist')
+        self.assertEqual({order.item_count for order in response.context['cl'].result_list}, {2})
+
+    def test_saving_order_recalculates_totals_from_all_items(self):
+        order = Order.objects.create(user=self.admin, total_price=200, discounted_total=200)
+        # Через create, а не bulk_create: удаление позиции уменьшает статистику продаж
+        first, second = (OrderItem.objects.create(order=order, product=self.product, price=100) for _ in range(2))
+        discount = Discount.objects.create(name='Весна', discount_percent=15, start_date=timezone.now() - timedelta(days=1),
+                                           end_date=timezone.now() + timedelta(days=1))
+        discount.products.add(self.product)
+        data = {
+            'user': order.user_id, 'status': order.status, 'total_price': '0',
+            'items-TOTAL_FORMS': '2', 'items-INITIAL_FORMS': '2', 'items-MIN_NUM_FORMS': '0',
+            'items-MAX_NUM_FORMS': '1000',
+            # Первая позиция не меняется, но должна попасть в итог
+            'items-0-id': first.pk, 'items-0-order': order.pk, 'items-0-product': self.product.pk,
+            'items-0-quantity': '1', 'items-0-price': '100',
+            'items-1-id': second.pk, 'items-1-order': order.pk, 'items-1-product': self.product.pk,
+            'items-1-quantity': '3', 'items-1-price': '33.35', 'items-1-discount': discount.pk,
+        }
+        response = self.client.post(reverse('admin:orders_order_change', args=[order.pk]), data)
+        self.assertEqual(response.status_code, 302)
+        order.refresh_from_db()
+        self.assertEqual(order.total_price, Decimal('200.05'))
+        self.assertEqual(order.discounted_total, Decimal('185.04'))
 
-# Create your tests here.
+        data.update({'items-1-DELETE': 'on'})
+        self.client.post(reverse('admin:orders_order_change', args=[order.pk]), data)
+        order.refresh_from_db()
+        self.assertEqual((order.total_price, order.discounted_total), (Decimal('100.00'), Decimal('100.00')))
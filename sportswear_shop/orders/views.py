@@ -1,16 +1,26 @@
 from typing import Any
 from django.shortcuts import render
-from rest_framework import generics, permissions
+from rest_framework import generics, permissions, status
 from rest_framework.request import Request
+from rest_framework.response import Response
 from rest_framework.serializers import Serializer
+from rest_framework.views import APIView
+from cart import reservations
+from cart.backends import get_cart_backend
+from cart.pricing import SESSION_DISCOUNT_KEY
+from shop.fieldsets import SparseFieldsMixin, apply_plan
+from shop.pagination import ProductCursorPagination
+from . import history
+from .checkout import MAX_IDEMPOTENCY_KEY_LENGTH, EmptyCart, checkout
 from .models import Order
 from .serializers import OrderSerializer
 
 
-class OrderListView(generics.ListAPIView):
+class OrderListView(SparseFieldsMixin, generics.ListAPIView):
     """
     Представление для получения списка заказов текущего пользователя.
     Доступно только для аутентифицированных пользователей.
+    Поддерживает ?fields= и ?expand=.
     """
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
@@ -20,9 +30,51 @@ class OrderListView(generics.ListAPIView):
         """
         Возвращает QuerySet с заказами, принадлежащими текущему пользователю.
 
+        Связи для вложенных позиций, товаров и изображений подбирает
+        SparseFieldsMixin под запрошенные поля.
+
+        :return: QuerySet с заказами пользователя
+        """
+        return super().get_queryset().filter(user=self.request.user)
+
+    def get_serializer_context(self) -> dict[str, Any]:
+        """
+        Добавляет текущего пользователя в контекст сериализатора.
+
+        :return: Словарь контекста
+        """
+        context: dict[str, Any] = super().get_serializer_context()
+        context['user'] = self.request.user
+        return context
+
+
+class OrderHistoryPagination(ProductCursorPagination):
+    """
+    Курсорная пагинация истории заказов по (created_at, id), от новых к старым.
+    """
+    page_size: int = 20
+
+
+class OrderHistoryView(generics.ListAPIView):
+    """
+    Постраничная история заказов текущего пользователя.
+
+    Свежие заказы отдаются полным представлением (позиции, товары,
+    изображения, скидки загружаются фиксированным числом запросов),
+    заказы старше ORDER_HISTORY_DETAIL_DAYS — краткой кешированной
+    сводкой (см. orders.history).
+    """
+    serializer_class = OrderSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = OrderHistoryPagination
+
+    def get_queryset(self) -> Any:
+        """
+        Возвращает заказы пользователя с колонками, нужными странице.
+
         :return: QuerySet с заказами пользователя
         """
-        return Order.objects.filter(user=self.request.user)
+        return Order.objects.filter(user=self.request.user).only(*history.ORDER_FIELDS)
 
     def get_serializer_context(self) -> dict[str, Any]:
         """
@@ -33,3 +85,59 @@ class OrderListView(generics.ListAPIView):
         context: dict[str, Any] = super().get_serializer_context()
         context['user'] = self.request.user
         return context
+
+    def list(self, request: Request, *args: Any, **kwargs: Any) -> Response:
+        """
+        Возвращает страницу истории: полные заказы и краткие сводки в порядке страницы.
+
+        :param request: запрос с необязательными ?cursor= и ?page_size=
+        :return: {'next', 'previous', 'results'}; у каждого заказа поле compact
+        """
+        page = self.paginate_queryset(self.get_queryset())
+        recent, old = history.split_page(page)
+        results = history.get_summaries(old)
+        if recent:
+            orders = list(apply_plan(Order.objects.filter(pk__in=[order.pk for order in recent]),
+                                     self.get_serializer(many=True)))
+            for data in self.get_serializer(orders, many=True).data:
+                results[data['id']] = {**data, 'compact': False}
+        return self.get_paginated_response([results[order.pk] for order in page])
+
+
+class CheckoutAPIView(APIView):
+    """
+    API endpoint оформления заказа из корзины текущего пользователя.
+
+    Клиент передаёт заголовок Idempotency-Key: повтор запроса с тем же
+    ключом (например, после таймаута) возвращает уже созданный заказ
+    вместо нового.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request: Request) -> Response:
+        """
+        Оформляет заказ.
+
+        :param request: запрос с необязательным заголовком Idempotency-Key
+        :return: заказ (201 — создан, 200 — повтор); 400 — пустая корзина
+                 или неверный ключ; 409 — товара не хватает
+        """
+        key = request.headers.get('Idempotency-Key') or None
+        if key is not None and len(key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+            return Response({'error': f'Ключ длиннее {MAX_IDEMPOTENCY_KEY_LENGTH} символов'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            result = checkout(get_cart_backend(request), request.user, key,
+                              request.session.get(SESSION_DISCOUNT_KEY))
+        except EmptyCart as error:
+            return Response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        except reservations.InsufficientStock as error:
+            return Response({
+                'error': 'Недостаточно товара на складе',
+                'product_id': error.product_id,
+                'available': error.available,
+            }, status=status.HTTP_409_CONFLICT)
+        request.session.pop(SESSION_DISCOUNT_KEY, None)
+        order = Order.objects.prefetch_related('items__product__images__renditions').get(pk=result.order.pk)
+        return Response(OrderSerializer(order, context={'request': request, 'user': request.user}).data,
+                        status=status.HTTP_201_CREATED if result.created else status.HTTP_200_OK)
@@ -1,9 +1,10 @@
 from typing import Any
 from rest_framework import generics, permissions
+from shop.fieldsets import SparseFieldsMixin
 from .models import Review
 from .serializers import ReviewSerializer
 
-class ReviewListCreateAPIView(generics.ListCreateAPIView):
+class ReviewListCreateAPIView(SparseFieldsMixin, generics.ListCreateAPIView):
     """
     API endpoint для просмотра списка отзывов и создания нового отзыва.
     Разрешения: аутентификация не обязательна для чтения, обязательна для создания.
@@ -18,7 +19,7 @@ class ReviewListCreateAPIView(generics.ListCreateAPIView):
         """
         serializer.save(user=self.request.user)
 
-class ReviewRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
+class ReviewRetrieveUpdateDestroyAPIView(SparseFieldsMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     API endpoint для получения, обновления и удаления конкретного отзыва.
     Разрешения: аутентификация не обязательна для чтения, обязательна для изменения.
@@ -1,8 +1,18 @@
 from rest_framework import serializers
+from shop.fieldsets import DynamicFieldsMixin
+from shop.serializers import ProductSerializer
+from users.serializers import UserSummarySerializer
 from .models import Review
 
-class ReviewSerializer(serializers.ModelSerializer):
+class ReviewSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """
+    Сериализатор отзыва; поддерживает ?fields= и ?expand=product,user.
+    """
     class Meta:
         model = Review
         fields = ['id', 'product', 'user', 'rating', 'comment', 'created_at']
-        read_only_fields = ['user', 'created_at']
\ No newline at end of file
+        read_only_fields = ['user', 'created_at']
+        expandable_fields = {
+            'product': lambda: ProductSerializer(read_only=True),
+            'user': lambda: UserSummarySerializer(read_only=True),
+        }
@@ -1,37 +1,61 @@
-from django.contrib import admin
-from .models import Category, Brand, Product, ProductImage
+from django.contrib import admin, messages
+from django.http import HttpRequest, HttpResponse, HttpResponseRedirect
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from .forms import ProductImportForm
+from .importer import ImportFormatError, detect_format, format_errors, import_products
+from .models import Category, Brand, Product, ProductImage, ProductImageRendition, ProductStats, RecommendationRun
+from .pagination import EstimatedCountPaginator
+from django.db.models import Count, QuerySet
+from django.core.exceptions import PermissionDenied
 from django.utils.html import format_html
 from typing import Any
 
 class ProductImageInline(admin.TabularInline):
     model = ProductImage
     extra = 1
-    fields = ('image', 'uploaded_at')
-    readonly_fields = ('uploaded_at',)
+    fields = ('image', 'width', 'height', 'rendition_count', 'uploaded_at')
+    readonly_fields = ('width', 'height', 'rendition_count', 'uploaded_at')
+
+    @admin.display(description='Копий')
+    def rendition_count(self, obj: ProductImage) -> int:
+        """
+        Возвращает количество созданных уменьшенных копий.
+        """
+        return len(obj.renditions.all()) if obj.pk else 0
+
+    def get_queryset(self, request: Any) -> Any:
+        return super().get_queryset(request).prefetch_related('renditions')
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ('id', 'name', 'product_count')
     search_fields = ('name',)
     
-    @admin.display(description='Товаров')
+    def get_queryset(self, request: HttpRequest) -> QuerySet:
+        return super().get_queryset(request).annotate(product_count=Count('products'))
+
+    @admin.display(description='Товаров', ordering='product_count')
     def product_count(self, obj: Category) -> int:
         """
-        Возвращает количество товаров в категории.
+        Возвращает количество товаров в категории (аннотация get_queryset).
         """
-        return obj.products.count()
+        return obj.product_count
 
 @admin.register(Brand)
 class BrandAdmin(admin.ModelAdmin):
     list_display = ('id', 'name', 'product_count')
     search_fields = ('name',)
     
-    @admin.display(description='Товаров')
+    def get_queryset(self, request: HttpRequest) -> QuerySet:
+        return super().get_queryset(request).annotate(product_count=Count('products'))
+
+    @admin.display(description='Товаров', ordering='product_count')
     def product_count(self, obj: Brand) -> int:
         """
-        Возвращает количество товаров у бренда.
+        Возвращает количество товаров у бренда (аннотация get_queryset).
         """
-        return obj.products.count()
+        return obj.product_count
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
@@ -39,8 +63,51 @@ class ProductAdmin(admin.ModelAdmin):
     list_filter = ('brand', 'category')
     search_fields = ('name', 'brand__name', 'category__name')
     raw_id_fields = ('brand', 'category')
-    readonly_fields = ('created_at',)
+    readonly_fields = ('created_at', 'updated_at')
     inlines = [ProductImageInline]
+    list_select_related = ('brand', 'category')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    change_list_template = 'admin/shop/product/change_list.html'
+
+    def get_urls(self) -> list:
+        """
+        Добавляет страницу массового импорта товаров.
+        """
+        urls = [
+            path('import/', self.admin_site.admin_view(self.import_view), name='shop_product_import'),
+        ]
+        return urls + super().get_urls()
+
+    def import_view(self, request: HttpRequest) -> HttpResponse:
+        """
+        Загружает CSV/XLSX-файл и импортирует товары пачками.
+        """
+        if not self.has_add_permission(request) or not self.has_change_permission(request):
+            raise PermissionDenied
+        form = ProductImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            upload = form.cleaned_data['file']
+            try:
+                result = import_products(upload.file, detect_format(upload.name), form.cleaned_data['batch_size'])
+            except ImportFormatError as exc:
+                form.add_error('file', str(exc))
+            else:
+                level = messages.WARNING if result.errors else messages.SUCCESS
+                self.message_user(request, (
+                    f'Строк: {result.rows}, создано: {result.created}, обновлено: {result.updated}, '
+                    f'ошибок: {len(result.errors)} ({result.rows_per_second:.0f} строк/с)'
+                ), level)
+                for line in format_errors(result.errors, 20):
+                    self.message_user(request, line, messages.ERROR)
+                return HttpResponseRedirect(reverse('admin:shop_product_changelist'))
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Импорт товаров',
+            'form': form,
+        }
+        return TemplateResponse(request, 'admin/shop/product/import.html', context)
 
     @admin.display(description='Цена')
     def price_display(self, obj: Product) -> str:
@@ -70,3 +137,30 @@ class ProductImageAdmin(admin.ModelAdmin):
         if obj.image:
             return format_html('<img src="{}" style="max-height: 60px; max-width: 60px;" />', obj.image.url)
         return "—"
+
+@admin.register(ProductStats)
+class ProductStatsAdmin(admin.ModelAdmin):
+    list_display = ('product', 'units_sold', 'order_count', 'review_count', 'average_rating', 'updated_at')
+    list_select_related = ('product',)
+    ordering = ('-order_count',)
+    search_fields = ('product__name',)
+    readonly_fields = [field.name for field in ProductStats._meta.fields]
+
+    def has_add_permission(self, request: Any) -> bool:
+        """
+        Статистика создаётся автоматически.
+        """
+        return False
+
+
+@admin.register(RecommendationRun)
+class RecommendationRunAdmin(admin.ModelAdmin):
+    list_display = ('started_at', 'finished_at', 'full', 'orders_processed', 'products_updated', 'last_order_id')
+    list_filter = ('full',)
+    readonly_fields = [field.name for field in RecommendationRun._meta.fields]
+
+    def has_add_permission(self, request: Any) -> bool:
+        """
+        Запуски создаются командой build_recommendations.
+        """
+        return False
@@ -1,7 +1,13 @@
 from django.urls import path
-from .views import ProductListAPIView, ProductDetailAPIView
+from .views import (
+    ProductListAPIView, ProductDetailAPIView, ProductRecommendationsAPIView, product_autocomplete, product_export,
+)
 
 urlpatterns = [
     path('products/', ProductListAPIView.as_view(), name='api_product_list'),
     path('products/<int:pk>/', ProductDetailAPIView.as_view(), name='api_product_detail'),
+    path('products/<int:pk>/recommendations/', ProductRecommendationsAPIView.as_view(),
+         name='api_product_recommendations'),
+    path('autocomplete/', product_autocomplete, name='api_autocomplete'),
+    path('products/export.<str:file_format>', product_export, name='api_product_export'),
 ]
\ No newline at end of file
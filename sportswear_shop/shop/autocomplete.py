@@ -0,0 +1,427 @@
+import heapq
+import logging
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import Any, Iterable, Optional
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce
+from django.urls import reverse
+from django.utils.http import urlencode
+
+from . import cache as shop_cache
+
+logger = logging.getLogger(__name__)
+
+PRODUCT = 'product'
+BRAND = 'brand'
+CATEGORY = 'category'
+TAG = 'tag'
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+MAX_QUERY_LENGTH = 100
+MAX_WORDS = 8
+RESULT_CACHE_SIZE = 2048
+# Для префиксов до этой длины top-MAX_LIMIT хранится готовым: их диапазон — почти весь каталог
+SHORT_PREFIX_LENGTH = 2
+DEFAULT_MAX_AGE = 600
+# Версии, по которым видно изменения каталога в других процессах
+SYNC_NAMESPACES = (shop_cache.PRODUCTS, shop_cache.TAXONOMY)
+
+_NON_WORD = re.compile(r'[\W_]+')
+# Раскладки клавиатуры: запрос, набранный не в той раскладке («ybrt» → «нике»)
+_LATIN = "`qwertyuiop[]asdfghjkl;'zxcvbnm,."
+_CYRILLIC = 'ёйцукенгшщзхъфывапролджэячсмитьбю'
+_TO_CYRILLIC = str.maketrans(_LATIN, _CYRILLIC)
+_TO_LATIN = str.maketrans(_CYRILLIC, _LATIN)
+
+
+def normalize(text: str) -> str:
+    """
+    Приводит строку к виду для сравнения префиксов.
+
+    Регистр сворачивается (casefold), «ё» заменяется на «е», знаки препинания
+    и дефисы — на пробелы, повторные пробелы схлопываются.
+
+    Args:
+        text (str): исходная строка.
+
+    Returns:
+        str: нормализованная строка.
+    """
+    text = unicodedata.normalize('NFKC', text).casefold().replace('ё', 'е')
+    return ' '.join(_NON_WORD.sub(' ', text).split())
+
+
+def switch_layout(text: str) -> str:
+    """
+    Переводит строку, набранную в другой раскладке (QWERTY ↔ ЙЦУКЕН).
+    """
+    if any('a' <= char <= 'z' for char in text):
+        return text.translate(_TO_CYRILLIC)
+    return text.translate(_TO_LATIN)
+
+
+def terms_for(label: str) -> set[str]:
+    """
+    Возвращает ключи индекса для названия: всю строку и хвосты с начала каждого слова.
+
+    Так «Кроссовки беговые» находится и по «крос», и по «бег».
+    """
+    words = normalize(label).split()[:MAX_WORDS]
+    return {' '.join(words[start:]) for start in range(len(words))}
+
+
+@dataclass
+class Suggestion:
+    kind: str
+    object_id: int
+    label: str
+    popularity: int = 0
+
+    @property
+    def key(self) -> tuple[str, int]:
+        return self.kind, self.object_id
+
+    @property
+    def url(self) -> str:
+        if self.kind == PRODUCT:
+            return reverse('product_detail', args=[self.object_id])
+        if self.kind == CATEGORY:
+            return reverse('product_list_by_category', args=[self.object_id])
+        return f"{reverse('product_list')}?{urlencode({'search': self.label})}"
+
+    def as_dict(self) -> dict[str, Any]:
+        return {'type': self.kind, 'id': self.object_id, 'label': self.label, 'url': self.url}
+
+
+def _rank(entry: Suggestion) -> tuple:
+    return -entry.popularity, entry.label.casefold(), entry.kind, entry.object_id
+
+
+def _short_prefixes(terms: Iterable[str]) -> set[str]:
+    return {term[:length] for term in terms for length in range(1, SHORT_PREFIX_LENGTH + 1) if len(term) >= length}
+
+
+class PrefixIndex:
+    """
+    Префиксный индекс на отсортированном массиве.
+
+    Ключи (нормализованный термин, тип, ID) хранятся в отсортированном списке:
+    все термины с префиксом p лежат в одном непрерывном диапазоне, который
+    находится двумя bisect. Из диапазона выбираются top-N записей по
+    популярности; готовые ответы кешируются до следующего изменения индекса.
+    Для коротких префиксов (до SHORT_PREFIX_LENGTH символов) диапазон
+    охватывает большую часть каталога, поэтому их top-MAX_LIMIT хранится
+    готовым и пересчитывается только для префиксов изменённой записи.
+
+    Все операции защищены блокировкой: индекс общий для потоков процесса.
+    """
+
+    def __init__(self) -> None:
+        self._keys: list[tuple[str, str, int]] = []
+        self._entries: dict[tuple[str, int], Suggestion] = {}
+        self._terms: dict[tuple[str, int], set[str]] = {}
+        self._results: dict[tuple[str, int], list[Suggestion]] = {}
+        self._short: dict[str, list[Suggestion]] = {}
+        self._lock = threading.RLock()
+        self.built_at: float = 0.0
+        self.synced_versions: tuple[int, ...] = ()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def load(self, entries: Iterable[Suggestion]) -> None:
+        """
+        Заполняет индекс целиком (один sort вместо вставок по одной).
+        """
+        keys: list[tuple[str, str, int]] = []
+        records: dict[tuple[str, int], Suggestion] = {}
+        terms: dict[tuple[str, int], set[str]] = {}
+        for entry in entries:
+            entry_terms = terms_for(entry.label)
+            records[entry.key] = entry
+            terms[entry.key] = entry_terms
+            keys.extend((term, entry.kind, entry.object_id) for term in entry_terms)
+        keys.sort()
+        groups: dict[str, list[Suggestion]] = {}
+        for entry_key, entry_terms in terms.items():
+            for prefix in _short_prefixes(entry_terms):
+                groups.setdefault(prefix, []).append(records[entry_key])
+        short = {prefix: heapq.nsmallest(MAX_LIMIT, group, key=_rank) for prefix, group in groups.items()}
+        with self._lock:
+            self._keys, self._entries, self._terms, self._short = keys, records, terms, short
+            self._results.clear()
+            self.built_at = time.monotonic()
+
+    def add(self, entry: Suggestion) -> None:
+        """
+        Добавляет или обновляет запись; популярность прежней записи сохраняется,
+        если у новой она не задана.
+        """
+        with self._lock:
+            previous = self._entries.get(entry.key)
+            if previous is not None and not entry.popularity:
+                entry.popularity = previous.popularity
+            affected = _short_prefixes(self._remove_terms(entry.key))
+            entry_terms = terms_for(entry.label)
+            for term in entry_terms:
+                key = (term, entry.kind, entry.object_id)
+                self._keys.insert(bisect_left(self._keys, key), key)
+            self._entries[entry.key] = entry
+            self._terms[entry.key] = entry_terms
+            self._refresh_short(affected | _short_prefixes(entry_terms))
+            self._results.clear()
+
+    def remove(self, kind: str, object_id: int) -> None:
+        """
+        Удаляет запись из индекса.
+        """
+        with self._lock:
+            affected = _short_prefixes(self._remove_terms((kind, object_id)))
+            self._entries.pop((kind, object_id), None)
+            self._refresh_short(affected)
+            self._results.clear()
+
+    def _remove_terms(self, entry_key: tuple[str, int]) -> set[str]:
+        terms = self._terms.pop(entry_key, set())
+        for term in terms:
+            key = (term, *entry_key)
+            position = bisect_left(self._keys, key)
+            if position < len(self._keys) and self._keys[position] == key:
+                del self._keys[position]
+        return terms
+
+    def _scan(self, prefix: str, limit: int) -> list[Suggestion]:
+        start = bisect_left(self._keys, (prefix,))
+        end = bisect_left(self._keys, (prefix + '\U0010ffff',), start)
+        matches = {(kind, object_id) for _, kind, object_id in self._keys[start:end]}
+        return heapq.nsmallest(limit, (self._entries[key] for key in matches), key=_rank)
+
+    def _refresh_short(self, prefixes: Iterable[str]) -> None:
+        for prefix in prefixes:
+            top = self._scan(prefix, MAX_LIMIT)
+            if top:
+                self._short[prefix] = top
+            else:
+                self._short.pop(prefix, None)
+
+    def search(self, prefix: str, limit: int = DEFAULT_LIMIT) -> list[Suggestion]:
+        """
+        Возвращает до limit самых популярных записей, термины которых начинаются с prefix.
+
+        Args:
+            prefix (str): нормализованный префикс.
+            limit (int): количество результатов.
+
+        Returns:
+            list[Suggestion]: записи по убыванию популярности.
+        """
+        if not prefix:
+            return []
+        with self._lock:
+            if len(prefix) <= SHORT_PREFIX_LENGTH and limit <= MAX_LIMIT:
+                return self._short.get(prefix, [])[:limit]
+            cached = self._results.get((prefix, limit))
+            if cached is not None:
+                return cached
+            results = self._scan(prefix, limit)
+            if len(self._results) >= RESULT_CACHE_SIZE:
+                self._results.clear()
+            self._results[(prefix, limit)] = results
+            return results
+
+
+def load_entries() -> list[Suggestion]:
+    """
+    Читает из БД все записи для индекса с популярностью.
+
+    Популярность товара — число проданных единиц; бренда, категории и тега —
+    продажи их товаров плюс число товаров.
+    """
+    from .models import Brand, Category, Product, Tag
+
+    entries = [
+        Suggestion(PRODUCT, pk, name, units or 0)
+        for pk, name, units in Product.objects.values_list('pk', 'name', 'stats__units_sold')
+    ]
+    for kind, queryset in (
+        (BRAND, Brand.objects.annotate(
+            sold=Coalesce(Sum('products__stats__units_sold'), 0), total=Count('products'))),
+        (CATEGORY, Category.objects.annotate(
+            sold=Coalesce(Sum('products__stats__units_sold'), 0), total=Count('products'))),
+        (TAG, Tag.objects.annotate(
+            sold=Coalesce(Sum('producttag__product__stats__units_sold'), 0), total=Count('producttag'))),
+    ):
+        entries.extend(
+            Suggestion(kind, pk, name, sold + total)
+            for pk, name, sold, total in queryset.values_list('pk', 'name', 'sold', 'total')
+        )
+    return entries
+
+
+_index: Optional[PrefixIndex] = None
+_build_lock = threading.Lock()
+_rebuilding = threading.Event()
+# Версии пространств до текущего изменения (запоминаются в pre_save/pre_delete)
+_pending = threading.local()
+
+
+def max_age() -> float:
+    return getattr(settings, 'AUTOCOMPLETE_MAX_AGE', DEFAULT_MAX_AGE)
+
+
+def build() -> PrefixIndex:
+    """
+    Строит индекс заново из БД и делает его текущим.
+    """
+    global _index
+    started = time.monotonic()
+    versions = shop_cache.get_versions(*SYNC_NAMESPACES)
+    index = PrefixIndex()
+    index.load(load_entries())
+    index.synced_versions = versions
+    _index = index
+    logger.info('Индекс автодополнения построен: %d записей за %.3f с', len(index), time.monotonic() - started)
+    return index
+
+
+def warm() -> None:
+    """
+    Строит индекс при старте воркера; ошибки БД (например, до миграций) только логируются.
+    """
+    try:
+        get_index()
+    except DatabaseError:
+        logger.exception('Не удалось построить индекс автодополнения')
+
+
+def get_index() -> PrefixIndex:
+    """
+    Возвращает индекс процесса, при первом обращении строя его.
+    """
+    if _index is None:
+        with _build_lock:
+            if _index is None:
+                build()
+    return _index
+
+
+def _rebuild_in_background() -> None:
+    if _rebuilding.is_set():
+        return
+    _rebuilding.set()
+
+    def run() -> None:
+        from django.db import close_old_connections
+        try:
+            build()
+        except DatabaseError:
+            logger.exception('Не удалось перестроить индекс автодополнения')
+        finally:
+            close_old_connections()
+            _rebuilding.clear()
+
+    threading.Thread(target=run, name='autocomplete-rebuild', daemon=True).start()
+
+
+def suggest(query: str, limit: int = DEFAULT_LIMIT) -> list[Suggestion]:
+    """
+    Возвращает подсказки для строки поиска.
+
+    Если каталог менялся в другом процессе или индекс устарел (популярность),
+    индекс перестраивается в фоне, а ответ даётся по текущему. Если по
+    запросу ничего не найдено, пробуется запрос в другой раскладке.
+
+    Args:
+        query (str): строка, введённая пользователем.
+        limit (int): количество подсказок.
+
+    Returns:
+        list[Suggestion]: подсказки по убыванию популярности.
+    """
+    index = get_index()
+    if (shop_cache.get_versions(*SYNC_NAMESPACES) != index.synced_versions
+            or time.monotonic() - index.built_at > max_age()):
+        _rebuild_in_background()
+    prefix = normalize(query[:MAX_QUERY_LENGTH])
+    results = index.search(prefix, limit)
+    if not results and prefix:
+        results = index.search(normalize(switch_layout(prefix)), limit)
+    return results
+
+
+def remember_versions() -> None:
+    """
+    Запоминает версии пространств до изменения записи (вызывается из сигналов).
+
+    Версии сдвигаются после фиксации транзакции, поэтому и читаются они
+    после фиксации — перед сдвигом от этого изменения: pre_save и pre_delete
+    регистрируют обработчик раньше, чем post_save и post_delete.
+    """
+    before: dict[str, tuple[int, ...]] = {}
+
+    def read() -> None:
+        if _index is not None:
+            before['versions'] = shop_cache.get_versions(*SYNC_NAMESPACES)
+
+    transaction.on_commit(read)
+    _pending.before = before
+
+
+def _schedule(change: Any) -> None:
+    """
+    Применяет изменение к индексу после фиксации транзакции.
+
+    Отменённое переименование или удаление не должно оставлять в индексе
+    лишних или пропавших подсказок.
+    """
+    before, _pending.before = getattr(_pending, 'before', None), None
+    transaction.on_commit(lambda: _apply(change, before.get('versions') if before is not None else None))
+
+
+def _apply(change: Any, before: Optional[tuple[int, ...]]) -> None:
+    """
+    Применяет изменение к индексу, если он уже построен в этом процессе.
+
+    Индекс считается синхронным, только если до изменения он уже был
+    синхронным: иначе изменения других процессов были бы отмечены как
+    учтённые и не попали бы в индекс. В этом случае версии не сдвигаются,
+    и следующий запрос перестроит индекс.
+    """
+    index = _index
+    if index is None:
+        return
+    synced = index.synced_versions
+    change(index)
+    if before is not None and before == synced:
+        index.synced_versions = shop_cache.get_versions(*SYNC_NAMESPACES)
+
+
+def update_entry(kind: str, object_id: int, label: str) -> None:
+    """
+    Добавляет или переименовывает запись после фиксации (вызывается из сигналов).
+    """
+    _schedule(lambda index: index.add(Suggestion(kind, object_id, label)))
+
+
+def remove_entry(kind: str, object_id: int) -> None:
+    """
+    Удаляет запись после фиксации (вызывается из сигналов).
+    """
+    _schedule(lambda index: index.remove(kind, object_id))
+
+
+def reset() -> None:
+    """
+    Сбрасывает индекс процесса (используется в тестах).
+    """
+    global _index
+    _index = None
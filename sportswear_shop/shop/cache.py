@@ -0,0 +1,167 @@
+import hashlib
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, TypeVar
+
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_KEY_PREFIX = 'shop:version'
+
+# Пространства имён версий: сигналы моделей поднимают версию своего пространства,
+# и все ключи, построенные на старой версии, перестают читаться.
+PRODUCTS = 'products'
+TAXONOMY = 'taxonomy'
+IMAGES = 'images'
+SALES = 'sales'
+DISCOUNTS = 'discounts'
+RECOMMENDATIONS = 'recommendations'
+
+# Пространства, от которых зависит выдача каталога (списки и карточки товаров)
+CATALOG_NAMESPACES = (PRODUCTS, TAXONOMY, IMAGES, DISCOUNTS)
+
+LOCK_TIMEOUT = 30
+LOCK_WAIT = 5.0
+LOCK_POLL_INTERVAL = 0.05
+
+T = TypeVar('T')
+_MISSING = object()
+
+
+def get_version(namespace: str) -> int:
+    """
+    Возвращает текущую версию пространства имён.
+
+    Версия — время последнего изменения в наносекундах, поэтому её можно
+    использовать и как отметку времени.
+
+    Args:
+        namespace (str): имя пространства.
+
+    Returns:
+        int: версия.
+    """
+    key = f'{VERSION_KEY_PREFIX}:{namespace}'
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def get_versions(*namespaces: str) -> tuple[int, ...]:
+    """
+    Возвращает версии нескольких пространств одним запросом к кешу.
+    """
+    keys = [f'{VERSION_KEY_PREFIX}:{namespace}' for namespace in namespaces]
+    found = cache.get_many(keys)
+    return tuple(found[key] if key in found else get_version(namespace)
+                 for key, namespace in zip(keys, namespaces))
+
+
+def bump_version(*namespaces: str) -> None:
+    """
+    Инвалидирует все ключи указанных пространств имён.
+    """
+    now = time.time_ns()
+    cache.set_many({f'{VERSION_KEY_PREFIX}:{namespace}': now for namespace in namespaces}, None)
+
+
+def bump_version_on_commit(*namespaces: str) -> None:
+    """
+    Инвалидирует пространства после фиксации текущей транзакции (вне транзакции — сразу).
+
+    Если поднять версию до фиксации, промах кеша в этот момент построит
+    значение по старым данным и сохранит его под новой версией; при откате
+    версия поднялась бы зря.
+    """
+    namespaces = tuple(namespaces)
+    transaction.on_commit(lambda: bump_version(*namespaces))
+
+
+def catalog_version() -> int:
+    """
+    Возвращает версию каталога — самую свежую из версий его пространств.
+    """
+    return max(get_versions(*CATALOG_NAMESPACES))
+
+
+def favorites_namespace(user_id: int) -> str:
+    """
+    Возвращает пространство версий избранного конкретного пользователя.
+    """
+    return f'favorites:{user_id}'
+
+
+def orders_namespace(user_id: int) -> str:
+    """
+    Возвращает пространство версий заказов конкретного пользователя.
+    """
+    return f'orders:{user_id}'
+
+
+def version_to_datetime(version: int) -> datetime:
+    """
+    Переводит версию (время в наносекундах) в aware datetime в UTC.
+    """
+    return datetime.fromtimestamp(version / 1_000_000_000, tz=timezone.utc)
+
+
+def make_key(prefix: str, versions: tuple[int, ...], *parts: Any) -> str:
+    """
+    Строит ключ кеша из префикса, версий зависимостей и произвольных частей.
+
+    Args:
+        prefix (str): префикс ключа.
+        versions (tuple[int, ...]): версии пространств, от которых зависит значение.
+        *parts (Any): части ключа (например, нормализованные параметры фильтра).
+
+    Returns:
+        str: ключ кеша.
+    """
+    version_part = '.'.join(str(version) for version in versions)
+    if not parts:
+        return f'shop:{prefix}:{version_part}'
+    digest = hashlib.md5(repr(parts).encode('utf-8')).hexdigest()
+    return f'shop:{prefix}:{version_part}:{digest}'
+
+
+def get_or_set_coalesced(key: str, builder: Callable[[], T], timeout: int,
+                         wait: float = LOCK_WAIT) -> T:
+    """
+    Возвращает значение из кеша, при промахе вычисляя его ровно одним воркером.
+
+    Первый промахнувшийся воркер берёт блокировку через cache.add и считает
+    значение; остальные ждут, пока оно появится в кеше. Если за время ожидания
+    значение так и не появилось (владелец блокировки упал или завис), воркер
+    считает его сам, не записывая в кеш.
+
+    Args:
+        key (str): ключ кеша.
+        builder (Callable): функция, вычисляющая значение.
+        timeout (int): время жизни значения в секундах.
+        wait (float): сколько секунд ждать чужого вычисления.
+
+    Returns:
+        значение из кеша или вычисленное builder.
+    """
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        return value
+
+    lock_key = f'{key}:lock'
+    if cache.add(lock_key, 1, LOCK_TIMEOUT):
+        try:
+            value = builder()
+            cache.set(key, value, timeout)
+        finally:
+            cache.delete(lock_key)
+        return value
+
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        value = cache.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+    return builder()
@@ -0,0 +1,100 @@
+from decimal import Decimal
+from functools import cached_property
+from typing import Any, Optional
+
+from django.db.models import Count, Q, QuerySet, Sum
+
+from . import cache as shop_cache
+
+CATALOG_STATS_CACHE_TIMEOUT = 300
+EXPENSIVE_PRICE = Decimal('5000')
+
+
+class CatalogStatistics:
+    """
+    Статистика по отфильтрованному набору товаров для страницы каталога.
+
+    Все числа считаются одним сгруппированным по категориям запросом с условной
+    агрегацией: общие итоги складываются из строк групп в Python. Подвыборки
+    (дорогие, доступные, отсортированные по цене) — ленивые queryset и
+    выполняются, только если шаблон к ним обращается.
+
+    Атрибуты:
+        queryset (QuerySet): отфильтрованные товары.
+        filter_key (tuple): нормализованные параметры фильтра для ключа кеша.
+    """
+
+    def __init__(self, queryset: QuerySet, filter_key: tuple) -> None:
+        self.queryset = queryset
+        self.filter_key = filter_key
+
+    def _compute(self) -> dict[str, Any]:
+        rows = list(
+            self.queryset.order_by()
+            .values('category__name')
+            .annotate(
+                count=Count('id'),
+                price_sum=Sum('price'),
+                stock_sum=Sum('stock'),
+                expensive=Count('id', filter=Q(price__gt=EXPENSIVE_PRICE)),
+                available=Count('id', filter=~Q(stock=0)),
+            )
+            .order_by('category__name')
+        )
+        count = sum(row['count'] for row in rows)
+        price_sum = sum((row['price_sum'] or Decimal('0') for row in rows), Decimal('0'))
+        return {
+            'count': count,
+            'avg_price': (price_sum / count).quantize(Decimal('0.01')) if count else None,
+            'total_stock': sum(row['stock_sum'] or 0 for row in rows),
+            'expensive_count': sum(row['expensive'] for row in rows),
+            'available_count': sum(row['available'] for row in rows),
+            'category_counts': [
+                {'category__name': row['category__name'], 'count': row['count']} for row in rows
+            ],
+        }
+
+    @cached_property
+    def summary(self) -> dict[str, Any]:
+        """
+        Возвращает сводку из кеша или считает её одним запросом.
+        """
+        versions = shop_cache.get_versions(shop_cache.PRODUCTS, shop_cache.TAXONOMY)
+        key = shop_cache.make_key('catalog_stats', versions, self.filter_key)
+        return shop_cache.get_or_set_coalesced(key, self._compute, CATALOG_STATS_CACHE_TIMEOUT)
+
+    @property
+    def count(self) -> int:
+        return self.summary['count']
+
+    @property
+    def avg_price(self) -> Optional[Decimal]:
+        return self.summary['avg_price']
+
+    @property
+    def total_stock(self) -> int:
+        return self.summary['total_stock']
+
+    @property
+    def expensive_count(self) -> int:
+        return self.summary['expensive_count']
+
+    @property
+    def available_count(self) -> int:
+        return self.summary['available_count']
+
+    @property
+    def category_counts(self) -> list[dict[str, Any]]:
+        return self.summary['category_counts']
+
+    @cached_property
+    def expensive_products(self) -> QuerySet:
+        return self.queryset.filter(price__gt=EXPENSIVE_PRICE)
+
+    @cached_property
+    def available_products(self) -> QuerySet:
+        return self.queryset.exclude(stock=0)
+
+    @cached_property
+    def sorted_products(self) -> QuerySet:
+        return self.queryset.order_by('-price')
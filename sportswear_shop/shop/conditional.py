@@ -0,0 +1,139 @@
+import hashlib
+from datetime import datetime
+from functools import wraps
+from typing import Any, Callable, Optional
+
+from django.http import HttpRequest, HttpResponse
+from django.views.decorators.http import condition
+
+from discounts import resolver
+
+from . import cache as shop_cache
+from .models import Product
+
+# Пространства, от которых зависит карточка товара помимо самого товара
+DETAIL_NAMESPACES = (shop_cache.TAXONOMY, shop_cache.IMAGES, shop_cache.DISCOUNTS, shop_cache.RECOMMENDATIONS)
+
+
+def _user_versions(request: HttpRequest) -> tuple:
+    """
+    Возвращает часть валидатора, зависящую от пользователя (избранное в API).
+    """
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return ()
+    return (user.pk, shop_cache.get_version(shop_cache.favorites_namespace(user.pk)))
+
+
+def _make_etag(*parts: Any) -> str:
+    return hashlib.md5(repr(parts).encode('utf-8')).hexdigest()
+
+
+def _representation(request: HttpRequest) -> tuple[str, str]:
+    """
+    Возвращает URL с параметрами и Accept: разные страницы и форматы — разные ETag.
+    """
+    return request.get_full_path(), request.META.get('HTTP_ACCEPT', '')
+
+
+def _discount_boundary(request: HttpRequest, pk: Optional[int] = None) -> Optional[datetime]:
+    """
+    Возвращает момент последнего начала или окончания скидки (товара pk или любой).
+
+    Цены в ответах зависят от текущего времени, а не только от версий кеша:
+    скидка начинается и заканчивается без правок. Результат запоминается на
+    запросе: его используют и ETag, и Last-Modified.
+    """
+    boundaries = request.__dict__.setdefault('_discount_boundaries', {})
+    if pk not in boundaries:
+        boundaries[pk] = resolver.segment_start(pk)
+    return boundaries[pk]
+
+
+def catalog_etag(request: HttpRequest, *args: Any, **kwargs: Any) -> str:
+    """
+    ETag списка товаров: версия каталога, действующие скидки, параметры запроса и пользователь.
+    """
+    return _make_etag(shop_cache.catalog_version(), _discount_boundary(request), _representation(request),
+                      _user_versions(request))
+
+
+def catalog_last_modified(request: HttpRequest, *args: Any, **kwargs: Any) -> datetime:
+    """
+    Время последнего изменения каталога, смены скидок (и избранного пользователя).
+    """
+    versions = [shop_cache.catalog_version()]
+    user_versions = _user_versions(request)
+    if user_versions:
+        versions.append(user_versions[1])
+    modified = shop_cache.version_to_datetime(max(versions))
+    boundary = _discount_boundary(request)
+    return max(modified, boundary) if boundary is not None else modified
+
+
+def _product_marker(request: HttpRequest, pk: int) -> Optional[tuple[datetime, Optional[datetime]]]:
+    """
+    Возвращает (updated_at товара, updated_at статистики) одним лёгким запросом.
+
+    Результат запоминается на запросе: его используют и ETag, и Last-Modified.
+    """
+    markers = request.__dict__.setdefault('_product_markers', {})
+    if pk not in markers:
+        markers[pk] = Product.objects.filter(pk=pk).values_list('updated_at', 'stats__updated_at').first()
+    return markers[pk]
+
+
+def product_etag(request: HttpRequest, pk: int, *args: Any, **kwargs: Any) -> Optional[str]:
+    """
+    ETag карточки товара; None для несуществующего товара (view вернёт 404).
+    """
+    marker = _product_marker(request, pk)
+    if marker is None:
+        return None
+    return _make_etag(
+        pk, marker, shop_cache.get_versions(*DETAIL_NAMESPACES), _discount_boundary(request, pk),
+        _representation(request), _user_versions(request),
+    )
+
+
+def product_last_modified(request: HttpRequest, pk: int, *args: Any, **kwargs: Any) -> Optional[datetime]:
+    """
+    Время последнего изменения карточки товара.
+    """
+    marker = _product_marker(request, pk)
+    if marker is None:
+        return None
+    versions = list(shop_cache.get_versions(*DETAIL_NAMESPACES))
+    user_versions = _user_versions(request)
+    if user_versions:
+        versions.append(user_versions[1])
+    return max(
+        [timestamp for timestamp in (*marker, _discount_boundary(request, pk)) if timestamp is not None]
+        + [shop_cache.version_to_datetime(version) for version in versions]
+    )
+
+
+def anonymous_condition(etag_func: Callable, last_modified_func: Callable) -> Callable:
+    """
+    Как django.views.decorators.http.condition, но только для анонимных пользователей.
+
+    HTML-страницы для вошедших пользователей содержат CSRF-токены и
+    персональные элементы, поэтому для них условные ответы не используются.
+
+    Args:
+        etag_func (Callable): функция вычисления ETag.
+        last_modified_func (Callable): функция вычисления Last-Modified.
+
+    Returns:
+        Callable: декоратор view.
+    """
+    def decorator(view: Callable) -> Callable:
+        conditional_view = condition(etag_func=etag_func, last_modified_func=last_modified_func)(view)
+
+        @wraps(view)
+        def inner(request: HttpRequest, *args: Any, **kwargs: Any) -> HttpResponse:
+            if request.user.is_authenticated:
+                return view(request, *args, **kwargs)
+            return conditional_view(request, *args, **kwargs)
+        return inner
+    return decorator
@@ -0,0 +1,178 @@
+import csv
+import json
+import zlib
+from collections import defaultdict
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Product, ProductImage, ProductTag
+
+DEFAULT_CHUNK_SIZE = 2000
+EXPORT_FORMATS = ('ndjson', 'csv')
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+}
+# Поля товара в порядке колонок CSV; category/brand — названия, а не ID
+PRODUCT_FIELDS = {
+    'id': 'id',
+    'sku': 'sku',
+    'name': 'name',
+    'description': 'description',
+    'price': 'price',
+    'stock': 'stock',
+    'size': 'size',
+    'category': 'category__name',
+    'brand': 'brand__name',
+    'external_page': 'external_page',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+}
+CSV_COLUMNS = [*PRODUCT_FIELDS, 'tags', 'images']
+GZIP_LEVEL = 6
+
+
+def iter_product_records(chunk_size: int = DEFAULT_CHUNK_SIZE,
+                         build_url: Optional[Callable[[str], str]] = None) -> Iterator[dict[str, Any]]:
+    """
+    Перебирает товары каталога в виде словарей, не загружая каталог в память.
+
+    Товары читаются через values().iterator(chunk_size) без создания моделей;
+    изображения и теги подгружаются двумя запросами на каждую пачку.
+
+    Args:
+        chunk_size (int): количество товаров в пачке.
+        build_url (Optional[Callable]): превращает относительный URL файла в абсолютный.
+
+    Yields:
+        dict: поля товара, список тегов и URL изображений.
+    """
+    rows = (Product.objects.order_by('pk')
+            .values(*PRODUCT_FIELDS.values())
+            .iterator(chunk_size=chunk_size))
+    chunk: list[dict[str, Any]] = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield from _with_relations(chunk, build_url)
+            chunk = []
+    if chunk:
+        yield from _with_relations(chunk, build_url)
+
+
+def _with_relations(chunk: list[dict[str, Any]],
+                    build_url: Optional[Callable[[str], str]]) -> Iterator[dict[str, Any]]:
+    product_ids = [row['id'] for row in chunk]
+    tags: dict[int, list[str]] = defaultdict(list)
+    for product_id, name in (ProductTag.objects.filter(product_id__in=product_ids)
+                             .order_by('tag__name').values_list('product_id', 'tag__name')):
+        tags[product_id].append(name)
+    images: dict[int, list[str]] = defaultdict(list)
+    for product_id, name in (ProductImage.objects.filter(product_id__in=product_ids)
+                             .order_by('pk').values_list('product_id', 'image')):
+        url = default_storage.url(name)
+        images[product_id].append(build_url(url) if build_url else url)
+    for row in chunk:
+        record = {key: row[field] for key, field in PRODUCT_FIELDS.items()}
+        record['tags'] = tags.get(row['id'], [])
+        record['images'] = images.get(row['id'], [])
+        yield record
+
+
+def render_ndjson(records: Iterable[dict[str, Any]]) -> Iterator[str]:
+    """
+    Возвращает записи построчно в формате NDJSON (один JSON-объект на строку).
+    """
+    for record in records:
+        yield json.dumps(record, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+class _Echo:
+    """
+    Псевдофайл для csv.writer: возвращает строку вместо записи в буфер.
+    """
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def render_csv(records: Iterable[dict[str, Any]]) -> Iterator[str]:
+    """
+    Возвращает записи построчно в формате CSV с заголовком.
+
+    Теги и изображения объединяются в одну ячейку через «;».
+    """
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_COLUMNS)
+    for record in records:
+        values = []
+        for column in CSV_COLUMNS:
+            value = record[column]
+            if isinstance(value, list):
+                value = ';'.join(value)
+            elif value is None:
+                value = ''
+            elif hasattr(value, 'isoformat'):
+                value = value.isoformat()
+            values.append(value)
+        yield writer.writerow(values)
+
+
+RENDERERS: dict[str, Callable[[Iterable[dict[str, Any]]], Iterator[str]]] = {
+    'ndjson': render_ndjson,
+    'csv': render_csv,
+}
+
+
+def encode(lines: Iterable[str], batch_lines: int = 500) -> Iterator[bytes]:
+    """
+    Кодирует строки в UTF-8, объединяя их в блоки по batch_lines строк.
+    """
+    buffer: list[str] = []
+    for line in lines:
+        buffer.append(line)
+        if len(buffer) >= batch_lines:
+            yield ''.join(buffer).encode('utf-8')
+            buffer = []
+    if buffer:
+        yield ''.join(buffer).encode('utf-8')
+
+
+def gzip_stream(blocks: Iterable[bytes], level: int = GZIP_LEVEL) -> Iterator[bytes]:
+    """
+    Сжимает поток блоков в формат gzip по мере поступления.
+
+    Args:
+        blocks (Iterable[bytes]): исходные блоки.
+        level (int): уровень сжатия.
+
+    Yields:
+        bytes: сжатые блоки (пустые не возвращаются).
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for block in blocks:
+        compressed = compressor.compress(block)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_products(file_format: str, compress: bool = False, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                    build_url: Optional[Callable[[str], str]] = None) -> Iterator[bytes]:
+    """
+    Возвращает поток байтов выгрузки каталога.
+
+    Args:
+        file_format (str): 'ndjson' или 'csv'.
+        compress (bool): сжимать ли поток gzip.
+        chunk_size (int): количество товаров в пачке чтения.
+        build_url (Optional[Callable]): построитель абсолютных URL изображений.
+
+    Returns:
+        Iterator[bytes]: блоки файла выгрузки.
+    """
+    lines = RENDERERS[file_format](iter_product_records(chunk_size, build_url))
+    blocks = encode(lines)
+    return gzip_stream(blocks) if compress else blocks
@@ -0,0 +1,164 @@
+from decimal import Decimal
+from typing import Any, Optional
+
+from django.core.cache import cache
+from django.db.models import Count, Q, QuerySet
+
+from . import cache as shop_cache
+from .models import Product
+
+FACETS_CACHE_TIMEOUT = 300
+
+# Границы ценовых диапазонов: [min, max)
+PRICE_BUCKETS: list[tuple[Decimal, Optional[Decimal]]] = [
+    (Decimal('0'), Decimal('1000')),
+    (Decimal('1000'), Decimal('3000')),
+    (Decimal('3000'), Decimal('5000')),
+    (Decimal('5000'), Decimal('10000')),
+    (Decimal('10000'), None),
+]
+
+# Для каждого фасета — параметры фильтра, которые игнорируются при его подсчёте
+FACET_OWN_FILTERS: dict[str, tuple[str, ...]] = {
+    'category': ('category',),
+    'brand': ('brand',),
+    'size': ('size',),
+    'tag': ('tag',),
+    'price': ('price_min', 'price_max'),
+    'in_stock': ('in_stock',),
+}
+
+
+def normalize_filter_key(filterset: Any) -> tuple:
+    """
+    Приводит состояние фильтра к каноничному виду для ключа кеша.
+
+    Args:
+        filterset (ProductFilter): провалидированный фильтр.
+
+    Returns:
+        tuple: отсортированные пары (параметр, значение) без пустых значений.
+    """
+    items = []
+    for name, value in filterset.form.cleaned_data.items():
+        if value in (None, ''):
+            continue
+        if isinstance(value, str):
+            value = value.strip().lower()
+        items.append((name, str(value)))
+    return tuple(sorted(items))
+
+
+def _filtered(filterset: Any, facet: str) -> QuerySet:
+    """
+    Применяет все фильтры, кроме собственных фильтров фасета.
+    """
+    data = filterset.data.copy()
+    for name in FACET_OWN_FILTERS[facet]:
+        data.pop(name, None)
+    other = type(filterset)(data=data, queryset=filterset.queryset, request=filterset.request)
+    # Сортировка по релевантности/дате иначе попадёт в GROUP BY
+    return other.qs.order_by()
+
+
+def _category_counts(filterset: Any) -> list[dict[str, Any]]:
+    rows = (_filtered(filterset, 'category')
+            .values('category_id', 'category__name')
+            .annotate(count=Count('id', distinct=True))
+            .order_by('category__name'))
+    return [{'id': row['category_id'], 'name': row['category__name'], 'count': row['count']} for row in rows]
+
+
+def _brand_counts(filterset: Any) -> list[dict[str, Any]]:
+    rows = (_filtered(filterset, 'brand')
+            .values('brand_id', 'brand__name')
+            .annotate(count=Count('id', distinct=True))
+            .order_by('brand__name'))
+    return [{'id': row['brand_id'], 'name': row['brand__name'], 'count': row['count']} for row in rows]
+
+
+def _size_counts(filterset: Any) -> list[dict[str, Any]]:
+    labels = dict(Product.SIZE_CHOICES)
+    rows = (_filtered(filterset, 'size')
+            .values('size')
+            .annotate(count=Count('id', distinct=True))
+            .order_by('size'))
+    return [{'value': row['size'], 'label': labels.get(row['size'], row['size']), 'count': row['count']}
+            for row in rows]
+
+
+def _tag_counts(filterset: Any) -> list[dict[str, Any]]:
+    rows = (_filtered(filterset, 'tag')
+            .filter(tags__isnull=False)
+            .values('tags__id', 'tags__name')
+            .annotate(count=Count('id', distinct=True))
+            .order_by('tags__name'))
+    return [{'id': row['tags__id'], 'name': row['tags__name'], 'count': row['count']} for row in rows]
+
+
+def _price_counts(filterset: Any) -> list[dict[str, Any]]:
+    aggregates = {}
+    for index, (low, high) in enumerate(PRICE_BUCKETS):
+        condition = Q(price__gte=low)
+        if high is not None:
+            condition &= Q(price__lt=high)
+        aggregates[f'bucket_{index}'] = Count('id', filter=condition, distinct=True)
+    counts = _filtered(filterset, 'price').aggregate(**aggregates)
+    return [
+        {'min': low, 'max': high, 'count': counts[f'bucket_{index}']}
+        for index, (low, high) in enumerate(PRICE_BUCKETS)
+    ]
+
+
+def _in_stock_counts(filterset: Any) -> dict[str, int]:
+    counts = _filtered(filterset, 'in_stock').aggregate(
+        in_stock=Count('id', filter=Q(stock__gt=0), distinct=True),
+        out_of_stock=Count('id', filter=Q(stock=0), distinct=True),
+    )
+    return {'true': counts['in_stock'], 'false': counts['out_of_stock']}
+
+
+def compute_facets(filterset: Any) -> dict[str, Any]:
+    """
+    Считает фасеты для текущего состояния фильтра.
+
+    Каждый фасет считается одним сгруппированным запросом с применением всех
+    фильтров, кроме его собственного (семантика «exclude own facet»), так что
+    выбранная категория не обнуляет счётчики остальных категорий.
+
+    Args:
+        filterset (ProductFilter): провалидированный фильтр.
+
+    Returns:
+        dict: счётчики по категориям, брендам, размерам, тегам, ценам и наличию.
+    """
+    return {
+        'category': _category_counts(filterset),
+        'brand': _brand_counts(filterset),
+        'size': _size_counts(filterset),
+        'tag': _tag_counts(filterset),
+        'price': _price_counts(filterset),
+        'in_stock': _in_stock_counts(filterset),
+    }
+
+
+def get_facets(filterset: Any) -> dict[str, Any]:
+    """
+    Возвращает фасеты из кеша или считает и кеширует их.
+
+    Ключ кеша строится из нормализованного состояния фильтра и версий
+    товаров и справочников, поэтому изменения каталога сразу дают новый ключ.
+
+    Args:
+        filterset (ProductFilter): провалидированный фильтр.
+
+    Returns:
+        dict: фасеты.
+    """
+    versions = shop_cache.get_versions(shop_cache.PRODUCTS, shop_cache.TAXONOMY)
+    key = shop_cache.make_key('facets', versions, normalize_filter_key(filterset))
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(filterset)
+        cache.set(key, facets, FACETS_CACHE_TIMEOUT)
+    return facets
@@ -0,0 +1,215 @@
+from typing import Any, Callable, Iterable, Optional
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Model, Prefetch, QuerySet
+from rest_framework import serializers
+
+# Дерево полей: {'id': {}, 'images': {'width': {}}}; пустой узел — все поля по умолчанию
+FieldTree = dict[str, 'FieldTree']
+
+
+def parse_field_tree(value: Optional[str]) -> Optional[FieldTree]:
+    """
+    Разбирает параметр вида "id,name,images.width" в дерево полей.
+
+    Args:
+        value (Optional[str]): значение ?fields= или ?expand=.
+
+    Returns:
+        Optional[FieldTree]: дерево или None, если параметр не задан.
+    """
+    if value is None or not value.strip():
+        return None
+    tree: FieldTree = {}
+    for path in value.split(','):
+        node = tree
+        for part in path.strip().split('.'):
+            if part:
+                node = node.setdefault(part, {})
+    return tree
+
+
+class DynamicFieldsMixin:
+    """
+    Примесь к ModelSerializer для выборочных полей (?fields=) и раскрытия связей (?expand=).
+
+    - fields ограничивает набор полей, вложенные поля задаются через точку
+      (items.product.name); без fields выводятся поля по умолчанию.
+    - expand заменяет ID связи вложенным объектом; раскрываемые связи
+      перечисляются в Meta.expandable_fields как фабрики сериализаторов.
+    - Meta.field_dependencies описывает, какие поля или связи модели нужны
+      вычисляемым полям (SerializerMethodField), чтобы apply_plan
+      загрузил их, даже если сами они не выводятся.
+    """
+
+    def __init__(self, *args: Any, fields: Any = None, expand: Any = None, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.requested_fields: Optional[FieldTree] = (
+            parse_field_tree(fields) if isinstance(fields, str) else fields
+        )
+        self.requested_expand: FieldTree = (
+            parse_field_tree(expand) if isinstance(expand, str) else expand
+        ) or {}
+
+    def get_fields(self) -> dict[str, serializers.Field]:
+        fields = super().get_fields()
+        expandable: dict[str, Callable[..., serializers.Field]] = getattr(self.Meta, 'expandable_fields', {})
+        requested = self.requested_fields
+        for name, factory in expandable.items():
+            if name in self.requested_expand:
+                fields[name] = factory()
+        # Все поля уровня (до отбора) нужны для зависимостей вычисляемых полей
+        self.available_fields = fields
+        if requested is not None:
+            fields = {name: field for name, field in fields.items() if name in requested}
+        for name, field in fields.items():
+            nested = getattr(field, 'child', field)
+            if isinstance(nested, DynamicFieldsMixin):
+                nested.requested_fields = (requested or {}).get(name) or None
+                nested.requested_expand = self.requested_expand.get(name, {})
+        return fields
+
+    def is_requested(self, name: str) -> bool:
+        """
+        Проверяет, будет ли поле выведено.
+        """
+        return name in self.fields
+
+
+def _ordering_fields(queryset: QuerySet) -> list[str]:
+    ordering = queryset.query.order_by or queryset.model._meta.ordering
+    names = []
+    for item in ordering:
+        if not isinstance(item, str):
+            continue
+        name = item.lstrip('-')
+        try:
+            queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            continue
+        names.append(name)
+    return names
+
+
+class _Plan:
+    """
+    Набор колонок, select_related и prefetch для одного уровня сериализатора.
+    """
+
+    def __init__(self) -> None:
+        self.only: Optional[set[str]] = set()
+        self.select: list[str] = []
+        self.prefetch: dict[str, Prefetch] = {}
+
+    def add_only(self, path: str) -> None:
+        if self.only is not None:
+            self.only.add(path)
+
+
+def _plan_attribute(plan: _Plan, model: type[Model], attr: str, field: Any, prefix: str) -> None:
+    """
+    Добавляет в план всё, что нужно для поля или связи модели attr.
+    """
+    try:
+        model_field = model._meta.get_field(attr)
+    except FieldDoesNotExist:
+        # Свойство или метод модели: не знаем, какие колонки он читает
+        plan.only = None
+        return
+    nested = field if isinstance(field, serializers.BaseSerializer) else None
+    child = getattr(nested, 'child', nested)
+
+    if not model_field.is_relation:
+        plan.add_only(prefix + attr)
+    elif model_field.many_to_one or model_field.one_to_one:
+        if model_field.concrete:
+            plan.add_only(prefix + attr)
+        if child is not None:
+            plan.select.append(prefix + attr)
+            _extend_plan(plan, child, f'{prefix}{attr}__')
+    else:
+        # Обратные FK и many-to-many загружаются отдельным запросом
+        related_model = model_field.related_model
+        if child is not None:
+            # Для обратного FK нужна колонка связи, иначе prefetch не сопоставит объекты
+            backlink = [model_field.remote_field.name] if model_field.one_to_many else []
+            queryset = apply_plan(related_model._default_manager.all(), child, backlink)
+        else:
+            queryset = related_model._default_manager.only('pk')
+        plan.prefetch[prefix + attr] = Prefetch(prefix + attr, queryset=queryset)
+
+
+def _extend_plan(plan: _Plan, serializer: serializers.BaseSerializer, prefix: str) -> None:
+    """
+    Добавляет в план требования полей сериализатора (prefix — путь связи от корня).
+    """
+    model = serializer.Meta.model
+    plan.add_only(prefix + model._meta.pk.name)
+    dependencies: dict[str, list[str]] = getattr(serializer.Meta, 'field_dependencies', {})
+    fields = serializer.fields
+    available = getattr(serializer, 'available_fields', fields)
+    for name, field in fields.items():
+        if isinstance(field, serializers.SerializerMethodField) or field.source == '*':
+            for dependency in dependencies.get(name, []):
+                _plan_attribute(plan, model, dependency, available.get(dependency), prefix)
+            continue
+        if field.source_attrs:
+            _plan_attribute(plan, model, field.source_attrs[0], field, prefix)
+
+
+def apply_plan(queryset: QuerySet, serializer: serializers.BaseSerializer,
+               extra_only: Iterable[str] = ()) -> QuerySet:
+    """
+    Настраивает queryset под поля сериализатора.
+
+    Загружаются только нужные колонки (only), связи для вложенных
+    объектов — через select_related или prefetch_related с такими же
+    урезанными queryset. Прежние select_related/prefetch_related queryset
+    заменяются. Если набор колонок определить нельзя (поле-свойство модели),
+    only не применяется, но связи всё равно подбираются.
+
+    Args:
+        queryset (QuerySet): исходный queryset.
+        serializer (BaseSerializer): сериализатор (или ListSerializer) с выбранными полями.
+        extra_only (Iterable[str]): дополнительные колонки (например, связь для prefetch).
+
+    Returns:
+        QuerySet: оптимизированный queryset.
+    """
+    serializer = getattr(serializer, 'child', serializer)
+    plan = _Plan()
+    _extend_plan(plan, serializer, '')
+    queryset = queryset.select_related(None).prefetch_related(None)
+    if plan.select:
+        queryset = queryset.select_related(*plan.select)
+    if plan.prefetch:
+        queryset = queryset.prefetch_related(*plan.prefetch.values())
+    if plan.only is not None:
+        queryset = queryset.only(*plan.only, *extra_only, *_ordering_fields(queryset))
+    return queryset
+
+
+class SparseFieldsMixin:
+    """
+    Примесь к GenericAPIView: передаёт ?fields= и ?expand= в сериализатор и
+    подстраивает под них queryset для чтения.
+    """
+
+    def get_sparse_params(self) -> dict[str, Optional[FieldTree]]:
+        params = self.request.query_params
+        return {
+            'fields': parse_field_tree(params.get('fields')),
+            'expand': parse_field_tree(params.get('expand')),
+        }
+
+    def get_serializer(self, *args: Any, **kwargs: Any) -> serializers.BaseSerializer:
+        if self.request.method in ('GET', 'HEAD'):
+            for name, value in self.get_sparse_params().items():
+                kwargs.setdefault(name, value)
+        return super().get_serializer(*args, **kwargs)
+
+    def get_queryset(self) -> QuerySet:
+        queryset = super().get_queryset()
+        if self.request.method not in ('GET', 'HEAD'):
+            return queryset
+        return apply_plan(queryset, self.get_serializer())
@@ -1,20 +1,25 @@
 import django_filters
 from django.db.models.query import QuerySet
 from .models import Product
+from .search import search_products
 
 class ProductFilter(django_filters.FilterSet):
     """
-    Фильтр для модели Product с поддержкой фильтрации по цене, категории, бренду и наличию на складе.
+    Фильтр для модели Product с поддержкой фильтрации по цене, категории, бренду,
+    наличию на складе и полнотекстовому поиску.
     """
+    search = django_filters.CharFilter(method='filter_search')
     price_min = django_filters.NumberFilter(field_name="price", lookup_expr='gte')
     price_max = django_filters.NumberFilter(field_name="price", lookup_expr='lte')
     category = django_filters.CharFilter(field_name="category__name", lookup_expr='icontains')
     brand = django_filters.CharFilter(field_name="brand__name", lookup_expr='icontains')
+    size = django_filters.ChoiceFilter(field_name="size", choices=Product.SIZE_CHOICES)
+    tag = django_filters.CharFilter(field_name="tags__name", lookup_expr='iexact', distinct=True)
     in_stock = django_filters.BooleanFilter(method='filter_in_stock')
 
     class Meta:
         model = Product
-        fields = ['category', 'brand', 'price_min', 'price_max', 'in_stock']
+        fields = ['search', 'category', 'brand', 'size', 'tag', 'price_min', 'price_max', 'in_stock']
 
     def filter_in_stock(self, queryset: QuerySet, name: str, value: bool) -> QuerySet:
         """
@@ -29,5 +34,22 @@ class ProductFilter(django_filters.FilterSet):
             QuerySet: отфильтрованный набор данных
         """
         if value:
-            return queryset.exclude(stock=0)
+            # Условие совпадает с частичным индексом shop_product_available_idx
+            return queryset.filter(stock__gt=0)
         return queryset
+
+    def filter_search(self, queryset: QuerySet, name: str, value: str) -> QuerySet:
+        """
+        Полнотекстовый поиск по названию, описанию, бренду и тегам.
+
+        Args:
+            queryset (QuerySet): исходный набор данных
+            name (str): имя фильтра (unused)
+            value (str): строка поиска
+
+        Returns:
+            QuerySet: найденные товары, отсортированные по релевантности
+        """
+        if not value.strip():
+            return queryset
+        return search_products(queryset, value)
@@ -1,3 +1,4 @@
+from typing import Any
 from django import forms
 from .models import Product
 
@@ -5,3 +6,24 @@ class ProductForm(forms.ModelForm):
     class Meta:
         model = Product
         fields = ['name', 'description', 'price', 'stock', 'category', 'brand', 'size']
+
+
+class ProductImportForm(forms.Form):
+    """
+    Форма загрузки файла поставщика для массового импорта товаров.
+    """
+    file = forms.FileField(label='Файл CSV или XLSX')
+    batch_size = forms.IntegerField(label='Размер пачки', min_value=1, max_value=10000, initial=1000)
+
+    def clean_file(self) -> Any:
+        """
+        Проверяет расширение файла.
+        """
+        from .importer import ImportFormatError, detect_format
+
+        upload = self.cleaned_data['file']
+        try:
+            detect_format(upload.name)
+        except ImportFormatError as exc:
+            raise forms.ValidationError(str(exc))
+        return upload
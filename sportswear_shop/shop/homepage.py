@@ -0,0 +1,82 @@
+from typing import Any, Callable, Optional
+
+from django.db.models import Avg, F
+
+from discounts.models import Discount
+
+from . import cache as shop_cache
+from .models import Category, Product
+
+HOMEPAGE_CACHE_TIMEOUT = 600
+BLOCK_SIZE = 5
+
+
+def _new_products() -> list[Product]:
+    return list(
+        Product.objects.select_related('brand').prefetch_related('images__renditions')
+        .order_by('-created_at', '-id')[:BLOCK_SIZE]
+    )
+
+
+def _popular_products() -> list[Product]:
+    return list(
+        Product.objects.select_related('brand', 'stats').prefetch_related('images__renditions')
+        .order_by(F('stats__order_count').desc(nulls_last=True), '-created_at')[:BLOCK_SIZE]
+    )
+
+
+def _active_discounts() -> list[Discount]:
+    return list(Discount.objects.filter(active=True).order_by('-discount_percent')[:BLOCK_SIZE])
+
+
+def _avg_price() -> Optional[float]:
+    return Product.objects.aggregate(Avg('price'))['price__avg']
+
+
+def _categories() -> list[Category]:
+    return list(Category.objects.all())
+
+
+# Блок главной страницы -> (функция расчёта, пространства версий, от которых он зависит)
+BLOCKS: dict[str, tuple[Callable[[], Any], tuple[str, ...]]] = {
+    'new_products': (_new_products, (shop_cache.PRODUCTS, shop_cache.IMAGES, shop_cache.TAXONOMY)),
+    'popular_products': (_popular_products, (shop_cache.PRODUCTS, shop_cache.IMAGES, shop_cache.TAXONOMY, shop_cache.SALES)),
+    'active_discounts': (_active_discounts, (shop_cache.DISCOUNTS,)),
+    'avg_price': (_avg_price, (shop_cache.PRODUCTS,)),
+    'categories': (_categories, (shop_cache.TAXONOMY,)),
+}
+
+
+def block_key(name: str) -> str:
+    """
+    Возвращает ключ кеша блока с учётом текущих версий его зависимостей.
+
+    Args:
+        name (str): имя блока из BLOCKS.
+
+    Returns:
+        str: ключ кеша.
+    """
+    _, namespaces = BLOCKS[name]
+    return shop_cache.make_key(f'homepage:{name}', shop_cache.get_versions(*namespaces))
+
+
+def get_block(name: str) -> Any:
+    """
+    Возвращает содержимое блока главной страницы из кеша.
+
+    Args:
+        name (str): имя блока из BLOCKS.
+
+    Returns:
+        Any: данные блока.
+    """
+    builder, _ = BLOCKS[name]
+    return shop_cache.get_or_set_coalesced(block_key(name), builder, HOMEPAGE_CACHE_TIMEOUT)
+
+
+def get_homepage_context() -> dict[str, Any]:
+    """
+    Собирает все блоки главной страницы.
+    """
+    return {name: get_block(name) for name in BLOCKS}
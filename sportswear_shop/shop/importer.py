@@ -0,0 +1,416 @@
+import csv
+import io
+import logging
+import time
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+from typing import IO, Any, Iterable, Iterator, Optional
+
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Model
+
+from . import cache as shop_cache
+from . import product_stats, search
+from .models import Brand, Category, Product, ProductTag, Tag
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 1000
+COLUMNS = ('sku', 'name', 'description', 'price', 'stock', 'size', 'category', 'brand', 'tags', 'external_page')
+REQUIRED_COLUMNS = ('sku', 'name', 'price', 'stock', 'size', 'category', 'brand')
+UPDATE_FIELDS = [
+    'name', 'description', 'price', 'stock', 'size', 'category', 'brand', 'external_page', 'updated_at',
+]
+# Необязательные колонки: если их нет в файле, прежние значения товара не трогаются
+OPTIONAL_FIELDS = ('description', 'external_page')
+TAG_SEPARATORS = (';', ',')
+
+
+class ImportFormatError(ValueError):
+    """
+    Файл нельзя импортировать целиком: неизвестный формат или нет обязательных колонок.
+    """
+
+
+@dataclass
+class RowError:
+    line: int
+    sku: str
+    message: str
+
+    def __str__(self) -> str:
+        return f'Строка {self.line} ({self.sku or "без артикула"}): {self.message}'
+
+
+@dataclass
+class ImportResult:
+    """
+    Итоги импорта.
+
+    Атрибуты:
+        rows (int): прочитано строк данных.
+        created (int): создано товаров.
+        updated (int): обновлено товаров.
+        errors (list[RowError]): ошибки по строкам.
+        seconds (float): длительность импорта.
+    """
+    rows: int = 0
+    created: int = 0
+    updated: int = 0
+    errors: list[RowError] = field(default_factory=list)
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+@dataclass
+class _ParsedRow:
+    line: int
+    sku: str
+    product: dict[str, Any]
+    category: str
+    brand: str
+    tags: Optional[list[str]]
+
+
+def detect_format(filename: str) -> str:
+    """
+    Определяет формат файла по расширению.
+
+    Args:
+        filename (str): имя файла.
+
+    Returns:
+        str: 'csv' или 'xlsx'.
+
+    Raises:
+        ImportFormatError: расширение не поддерживается.
+    """
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if extension not in ('csv', 'xlsx'):
+        raise ImportFormatError(f'Неподдерживаемый формат файла: {filename}')
+    return extension
+
+
+def _iter_csv(file: IO) -> Iterator[list[Any]]:
+    stream = file if isinstance(file, io.TextIOBase) else io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+    sample = stream.read(4096)
+    stream.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+    yield from csv.reader(stream, dialect)
+
+
+def _iter_xlsx(file: IO) -> Iterator[list[Any]]:
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        for row in workbook.active.iter_rows(values_only=True):
+            yield list(row)
+    finally:
+        workbook.close()
+
+
+def iter_rows(file: IO, file_format: str) -> Iterator[tuple[int, dict[str, Any]]]:
+    """
+    Потоково читает файл и возвращает строки данных в виде словарей.
+
+    Первая строка — заголовок; названия колонок приводятся к нижнему регистру,
+    лишние колонки игнорируются, пустые строки пропускаются.
+
+    Args:
+        file (IO): открытый файл (для CSV — бинарный или текстовый).
+        file_format (str): 'csv' или 'xlsx'.
+
+    Yields:
+        tuple[int, dict]: номер строки в файле и значения по колонкам.
+
+    Raises:
+        ImportFormatError: нет обязательных колонок.
+    """
+    rows = _iter_csv(file) if file_format == 'csv' else _iter_xlsx(file)
+    header = next(rows, None)
+    if header is None:
+        raise ImportFormatError('Файл пуст')
+    columns = [str(name or '').strip().lower() for name in header]
+    missing = [name for name in REQUIRED_COLUMNS if name not in columns]
+    if missing:
+        raise ImportFormatError(f'Нет обязательных колонок: {", ".join(missing)}')
+    positions = {name: columns.index(name) for name in COLUMNS if name in columns}
+    for line, row in enumerate(rows, start=2):
+        if not any(value not in (None, '') for value in row):
+            continue
+        yield line, {name: row[index] if index < len(row) else None for name, index in positions.items()}
+
+
+def _text(value: Any) -> str:
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def parse_row(line: int, values: dict[str, Any]) -> _ParsedRow:
+    """
+    Проверяет и приводит значения строки к типам полей товара.
+
+    Необязательные колонки, которых нет в файле, не попадают в результат
+    (tags равно None), чтобы импорт не затирал прежние значения.
+
+    Raises:
+        ValueError: с описанием первой найденной ошибки.
+    """
+    sku = _text(values.get('sku'))
+    for name in REQUIRED_COLUMNS:
+        if not _text(values.get(name)):
+            raise ValueError(f'не заполнено поле «{name}»')
+    if len(sku) > Product._meta.get_field('sku').max_length:
+        raise ValueError('слишком длинный артикул')
+    name = _text(values['name'])
+    if len(name) > Product._meta.get_field('name').max_length:
+        raise ValueError('слишком длинное название')
+    try:
+        price = Decimal(_text(values['price']).replace(',', '.').replace(' ', ''))
+    except InvalidOperation:
+        raise ValueError(f'некорректная цена «{values["price"]}»')
+    if not price.is_finite() or price < 0 or price >= Decimal('1e8') or price != price.quantize(Decimal('0.01')):
+        raise ValueError(f'некорректная цена «{values["price"]}»')
+    try:
+        stock = int(Decimal(_text(values['stock'])))
+    except (InvalidOperation, ValueError):
+        raise ValueError(f'некорректный остаток «{values["stock"]}»')
+    if stock < 0:
+        raise ValueError('остаток не может быть отрицательным')
+    size = _text(values['size']).upper()
+    sizes = {code: code for code, _ in Product.SIZE_CHOICES}
+    sizes.update({label.upper(): code for code, label in Product.SIZE_CHOICES})
+    if size not in sizes:
+        raise ValueError(f'неизвестный размер «{values["size"]}»')
+    product = {'sku': sku, 'name': name, 'price': price, 'stock': stock, 'size': sizes[size]}
+    if 'description' in values:
+        product['description'] = _text(values['description'])
+    if 'external_page' in values:
+        product['external_page'] = _text(values['external_page']) or None
+    tags = None
+    if 'tags' in values:
+        tags_value = _text(values['tags'])
+        separator = next((sep for sep in TAG_SEPARATORS if sep in tags_value), None)
+        tags = list(dict.fromkeys(
+            tag.strip() for tag in (tags_value.split(separator) if separator else [tags_value]) if tag.strip()
+        ))
+    return _ParsedRow(
+        line=line,
+        sku=sku,
+        product=product,
+        category=_text(values['category']),
+        brand=_text(values['brand']),
+        tags=tags,
+    )
+
+
+class _LookupMap:
+    """
+    Отображение «название → ID» для справочника, загруженное в память один раз.
+
+    Названия сравниваются без учёта регистра; недостающие записи создаются
+    одним bulk_create на пачку.
+    """
+
+    def __init__(self, model: type[Model]) -> None:
+        self.model = model
+        self.ids: dict[str, int] = {
+            name.casefold(): pk for pk, name in model.objects.values_list('pk', 'name')
+        }
+
+    def resolve(self, names: Iterable[str]) -> None:
+        missing = {}
+        for name in names:
+            missing.setdefault(name.casefold(), name)
+        for key in list(missing):
+            if key in self.ids:
+                del missing[key]
+        if not missing:
+            return
+        self.model.objects.bulk_create(
+            [self.model(name=name) for name in missing.values()], ignore_conflicts=True,
+        )
+        for pk, name in self.model.objects.filter(name__in=missing.values()).values_list('pk', 'name'):
+            self.ids[name.casefold()] = pk
+
+    def __getitem__(self, name: str) -> int:
+        return self.ids[name.casefold()]
+
+
+def _delete_product_tags(product_ids: Iterable[int]) -> None:
+    """
+    Удаляет связи товаров с тегами одним DELETE без сигналов.
+
+    Сигналы ProductTag переиндексировали бы товар и поднимали версию кеша на
+    каждую строку; импорт делает это сам один раз на пачку.
+    """
+    ids = list(product_ids)
+    if not ids:
+        return
+    table = connection.ops.quote_name(ProductTag._meta.db_table)
+    column = connection.ops.quote_name(ProductTag._meta.get_field('product').column)
+    placeholders = ', '.join(['%s'] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table} WHERE {column} IN ({placeholders})', ids)
+
+
+class ProductImporter:
+    """
+    Потоковый импорт товаров из CSV/XLSX пачками через bulk_create(update_conflicts=True).
+
+    Строки сопоставляются с существующими товарами по артикулу (sku). Бренды,
+    категории и теги ищутся в картах, загруженных в память один раз, а
+    недостающие создаются пачкой. Каждая пачка пишется в своей транзакции;
+    ошибки проверки не останавливают импорт, а попадают в отчёт по строкам.
+
+    Так как bulk_create не отправляет сигналы, после записи пачки импорт сам
+    обновляет поисковый индекс, статистику и версии кешей — по одному разу
+    на пачку; прежние теги удаляются тоже без сигналов.
+
+    Атрибуты:
+        batch_size (int): количество строк в пачке.
+    """
+
+    def __init__(self, batch_size: int = DEFAULT_BATCH_SIZE) -> None:
+        self.batch_size = batch_size
+        self._load_lookups()
+
+    def _load_lookups(self) -> None:
+        self.categories = _LookupMap(Category)
+        self.brands = _LookupMap(Brand)
+        self.tags = _LookupMap(Tag)
+
+    def run(self, file: IO, file_format: str) -> ImportResult:
+        """
+        Импортирует файл.
+
+        Args:
+            file (IO): открытый файл.
+            file_format (str): 'csv' или 'xlsx'.
+
+        Returns:
+            ImportResult: итоги импорта.
+
+        Raises:
+            ImportFormatError: файл нельзя разобрать целиком.
+        """
+        result = ImportResult()
+        started = time.monotonic()
+        batch: dict[str, _ParsedRow] = {}
+        for line, values in iter_rows(file, file_format):
+            result.rows += 1
+            try:
+                row = parse_row(line, values)
+            except ValueError as exc:
+                result.errors.append(RowError(line, _text(values.get('sku')), str(exc)))
+                continue
+            # Повтор артикула внутри пачки: побеждает последняя строка
+            batch.pop(row.sku, None)
+            batch[row.sku] = row
+            if len(batch) >= self.batch_size:
+                self._write_batch(list(batch.values()), result)
+                batch = {}
+                self._log_progress(result, started)
+        if batch:
+            self._write_batch(list(batch.values()), result)
+        result.seconds = time.monotonic() - started
+        logger.info(
+            'Импорт товаров завершён: %d строк, создано %d, обновлено %d, ошибок %d за %.1f с (%.0f строк/с)',
+            result.rows, result.created, result.updated, len(result.errors), result.seconds, result.rows_per_second,
+        )
+        return result
+
+    def _log_progress(self, result: ImportResult, started: float) -> None:
+        elapsed = time.monotonic() - started
+        logger.info('Импорт товаров: %d строк за %.1f с (%.0f строк/с)',
+                    result.rows, elapsed, result.rows / elapsed if elapsed else 0.0)
+
+    def _write_batch(self, rows: list[_ParsedRow], result: ImportResult) -> None:
+        """
+        Записывает пачку строк в одной транзакции.
+
+        При ошибке БД пачка откатывается целиком, а её строки попадают в отчёт.
+        """
+        try:
+            with transaction.atomic():
+                created, updated = self._upsert(rows)
+        except DatabaseError as exc:
+            logger.exception('Не удалось записать пачку товаров')
+            # Созданные в откаченной транзакции записи справочников не сохранились
+            self._load_lookups()
+            result.errors.extend(RowError(row.line, row.sku, f'ошибка записи: {exc}') for row in rows)
+            return
+        result.created += created
+        result.updated += updated
+        # Пачка записана: одна инвалидация кешей вместо сигналов на каждую строку
+        shop_cache.bump_version(shop_cache.PRODUCTS, shop_cache.TAXONOMY)
+
+    def _upsert(self, rows: list[_ParsedRow]) -> tuple[int, int]:
+        self.categories.resolve(row.category for row in rows)
+        self.brands.resolve(row.brand for row in rows)
+        # Колонки у всех строк пачки одни и те же — из заголовка файла
+        has_tags = rows[0].tags is not None
+        update_fields = [name for name in UPDATE_FIELDS if name not in OPTIONAL_FIELDS or name in rows[0].product]
+        if has_tags:
+            self.tags.resolve(tag for row in rows for tag in row.tags)
+
+        skus = [row.sku for row in rows]
+        existing = set(Product.objects.filter(sku__in=skus).values_list('sku', flat=True))
+        Product.objects.bulk_create(
+            [
+                Product(**row.product, category_id=self.categories[row.category], brand_id=self.brands[row.brand])
+                for row in rows
+            ],
+            update_conflicts=True,
+            unique_fields=['sku'],
+            update_fields=update_fields,
+        )
+        product_ids = dict(Product.objects.filter(sku__in=skus).values_list('sku', 'pk'))
+
+        # Теги из файла заменяют прежние теги товара; без колонки tags теги не меняются
+        if has_tags:
+            _delete_product_tags(product_ids.values())
+            ProductTag.objects.bulk_create([
+                ProductTag(product_id=product_ids[row.sku], tag_id=self.tags[tag])
+                for row in rows for tag in row.tags
+            ])
+
+        new_ids = [product_ids[sku] for sku in skus if sku not in existing]
+        product_stats.ensure_stats(new_ids)
+        search.index_products(product_ids.values())
+        return len(new_ids), len(rows) - len(new_ids)
+
+
+def import_products(file: IO, file_format: str, batch_size: int = DEFAULT_BATCH_SIZE) -> ImportResult:
+    """
+    Импортирует товары из файла (см. ProductImporter).
+
+    Args:
+        file (IO): открытый файл.
+        file_format (str): 'csv' или 'xlsx'.
+        batch_size (int): количество строк в пачке.
+
+    Returns:
+        ImportResult: итоги импорта.
+    """
+    return ProductImporter(batch_size).run(file, file_format)
+
+
+def format_errors(errors: list[RowError], limit: Optional[int] = None) -> list[str]:
+    """
+    Возвращает описания ошибок, при необходимости ограничивая их количество.
+    """
+    lines = [str(error) for error in errors[:limit]]
+    if limit is not None and len(errors) > limit:
+        lines.append(f'… и ещё {len(errors) - limit}')
+    return lines
@@ -0,0 +1,42 @@
+import random
+import timeit
+from decimal import Decimal
+from typing import Any, Callable
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from shop.pricing import ZERO, price_line, price_many, price_totals
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает скорость поштучного и пакетного расчёта цен (shop.pricing) на случайных позициях'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--rows', type=int, default=10000, help='Количество позиций')
+        parser.add_argument('--repeat', type=int, default=5, help='Количество замеров (берётся лучший)')
+        parser.add_argument('--seed', type=int, default=0, help='Начальное значение генератора')
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        rng = random.Random(options['seed'])
+        rows = [(Decimal(rng.randint(1, 5000000)).scaleb(-2), rng.randint(1, 10),
+                 rng.choice((0, 5, 10, 15, 33))) for _ in range(options['rows'])]
+
+        def scalar_lines() -> list:
+            return [price_line(*row) for row in rows]
+
+        def scalar_totals() -> Decimal:
+            return sum((price_line(*row).total for row in rows), ZERO)
+
+        if price_many(rows) != scalar_lines() or price_totals(rows).total != scalar_totals():
+            self.stderr.write(self.style.ERROR('Пакетный расчёт расходится с поштучным'))
+            return
+
+        cases: list[tuple[str, Callable[[], Any]]] = [
+            ('price_line, позиции', scalar_lines),
+            ('price_many, позиции', lambda: price_many(rows)),
+            ('price_line, итог', scalar_totals),
+            ('price_totals, итог', lambda: price_totals(rows)),
+        ]
+        for name, func in cases:
+            best = min(timeit.repeat(func, number=1, repeat=options['repeat']))
+            self.stdout.write(f'{name:<22} {best * 1000:8.2f} мс  ({len(rows) / best:,.0f} позиций/с)')
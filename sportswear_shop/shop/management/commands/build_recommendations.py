@@ -0,0 +1,24 @@
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from shop import recommendations
+
+
+class Command(BaseCommand):
+    help = 'Строит рекомендации «часто покупают вместе» по новым заказам (или заново с --full)'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--full', action='store_true', help='Пересчитать матрицу по всем заказам')
+        parser.add_argument('--top-k', type=int, default=recommendations.DEFAULT_TOP_K,
+                            help='Сколько рекомендаций хранить на товар')
+        parser.add_argument('--chunk-size', type=int, default=recommendations.DEFAULT_CHUNK_SIZE,
+                            help='Размер пачки чтения позиций заказов')
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        record = recommendations.run(options['full'], options['top_k'], options['chunk_size'])
+        duration = (record.finished_at - record.started_at).total_seconds()
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано заказов: {record.orders_processed}, обновлено товаров: {record.products_updated} '
+            f'за {duration:.1f} с'
+        ))
@@ -0,0 +1,35 @@
+import sys
+import time
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from shop.exporter import DEFAULT_CHUNK_SIZE, EXPORT_FORMATS, export_products
+
+
+class Command(BaseCommand):
+    help = 'Выгружает весь каталог товаров в NDJSON или CSV (при необходимости со сжатием gzip)'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('output', help='Путь к файлу выгрузки или «-» для stdout')
+        parser.add_argument('--file-format', choices=EXPORT_FORMATS, default='ndjson', help='Формат выгрузки')
+        parser.add_argument('--gzip', action='store_true', help='Сжимать выгрузку gzip')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Количество товаров в пачке')
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        started = time.monotonic()
+        blocks = export_products(options['file_format'], options['gzip'], options['chunk_size'])
+        written = 0
+        if options['output'] == '-':
+            for block in blocks:
+                sys.stdout.buffer.write(block)
+                written += len(block)
+            sys.stdout.buffer.flush()
+            return
+        with open(options['output'], 'wb') as file:
+            for block in blocks:
+                file.write(block)
+                written += len(block)
+        self.stdout.write(self.style.SUCCESS(
+            f'Каталог выгружен в {options["output"]}: {written} байт за {time.monotonic() - started:.1f} с'
+        ))
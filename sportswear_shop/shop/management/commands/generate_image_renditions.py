@@ -0,0 +1,55 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from shop import thumbnails
+from shop.models import ProductImage
+
+
+class Command(BaseCommand):
+    help = 'Создаёт уменьшенные копии (WebP/JPEG) для уже загруженных изображений товаров'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--all', action='store_true', help='Пересоздать копии и для изображений, у которых они уже есть')
+        parser.add_argument('--workers', type=int, default=thumbnails.worker_count() or 2, help='Количество процессов')
+        parser.add_argument('--batch-size', type=int, default=50, help='Количество изображений в пачке')
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        images = ProductImage.objects.order_by('pk')
+        if not options['all']:
+            images = images.filter(renditions__isnull=True)
+        image_ids = list(images.values_list('pk', flat=True).distinct())
+        widths = thumbnails.rendition_widths()
+        started = time.monotonic()
+        done = failed = 0
+
+        with ProcessPoolExecutor(max_workers=max(1, options['workers'])) as executor:
+            for start in range(0, len(image_ids), options['batch_size']):
+                batch = ProductImage.objects.filter(pk__in=image_ids[start:start + options['batch_size']])
+                sources = {}
+                for image in batch:
+                    try:
+                        with image.image.open('rb') as source:
+                            sources[image.pk] = source.read()
+                        if image.width is None:
+                            image.save(update_fields=['width', 'height'])
+                    except (OSError, ValueError) as exc:
+                        failed += 1
+                        self.stderr.write(f'Изображение {image.pk}: {exc}')
+                futures = {
+                    image_id: executor.submit(thumbnails.render_image, data, widths)
+                    for image_id, data in sources.items()
+                }
+                for image_id, future in futures.items():
+                    try:
+                        thumbnails.store_renditions(image_id, future.result())
+                        done += 1
+                    except Exception as exc:
+                        failed += 1
+                        self.stderr.write(f'Изображение {image_id}: {exc}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано изображений: {done}, ошибок: {failed}, за {time.monotonic() - started:.1f} с'
+        ))
@@ -0,0 +1,29 @@
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from shop.importer import DEFAULT_BATCH_SIZE, ImportFormatError, detect_format, format_errors, import_products
+
+
+class Command(BaseCommand):
+    help = 'Импортирует товары из CSV/XLSX-файла поставщика (сопоставление по артикулу)'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('path', help='Путь к файлу .csv или .xlsx')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Количество строк в пачке')
+        parser.add_argument('--max-errors', type=int, default=50, help='Сколько ошибок по строкам вывести')
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        try:
+            file_format = detect_format(options['path'])
+            with open(options['path'], 'rb') as file:
+                result = import_products(file, file_format, batch_size=options['batch_size'])
+        except (OSError, ImportFormatError) as exc:
+            raise CommandError(str(exc))
+
+        for line in format_errors(result.errors, options['max_errors']):
+            self.stderr.write(line)
+        self.stdout.write(self.style.SUCCESS(
+            f'Строк: {result.rows}, создано: {result.created}, обновлено: {result.updated}, '
+            f'ошибок: {len(result.errors)}, за {result.seconds:.1f} с ({result.rows_per_second:.0f} строк/с)'
+        ))
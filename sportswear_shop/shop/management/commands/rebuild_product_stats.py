@@ -0,0 +1,20 @@
+import time
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from shop import product_stats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает статистику товаров (продажи, отзывы) с нуля'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--batch-size', type=int, default=1000, help='Количество товаров в пачке')
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        started = time.monotonic()
+        processed = product_stats.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Статистика пересчитана для {processed} товаров за {time.monotonic() - started:.1f} с'
+        ))
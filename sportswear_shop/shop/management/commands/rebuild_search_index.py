@@ -0,0 +1,16 @@
+from typing import Any
+
+from django.core.management.base import BaseCommand
+
+from shop import search
+
+
+class Command(BaseCommand):
+    help = 'Полностью перестраивает полнотекстовый индекс товаров'
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        if not search.is_supported():
+            self.stdout.write(self.style.WARNING('Полнотекстовый индекс поддерживается только на SQLite'))
+            return
+        search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS('Поисковый индекс перестроен'))
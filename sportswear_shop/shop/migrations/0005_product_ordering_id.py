@@ -0,0 +1,17 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:57
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0004_productcomment_rating'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='product',
+            options={'ordering': ['-created_at', '-id'], 'verbose_name': 'Товар', 'verbose_name_plural': 'Товары'},
+        ),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations
+
+FTS_TABLE = 'shop_product_fts'
+
+
+def create_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+        f"USING fts5(name, description, brand, tags, tokenize='unicode61 remove_diacritics 2')"
+    )
+    schema_editor.execute(
+        f"INSERT INTO {FTS_TABLE}(rowid, name, description, brand, tags) "
+        f"SELECT p.id, p.name, p.description, b.name, "
+        f"(SELECT group_concat(t.name, ' ') FROM shop_producttag pt "
+        f"JOIN shop_tag t ON t.id = pt.tag_id WHERE pt.product_id = p.id) "
+        f"FROM shop_product p JOIN shop_brand b ON b.id = p.brand_id"
+    )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0005_product_ordering_id'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.4 on 2026-10-18 13:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0006_product_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductStats',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='shop.product', verbose_name='Товар')),
+                ('units_sold', models.PositiveIntegerField(default=0, verbose_name='Продано единиц')),
+                ('order_count', models.PositiveIntegerField(default=0, verbose_name='Позиций в заказах')),
+                ('review_count', models.PositiveIntegerField(default=0, verbose_name='Отзывов')),
+                ('rating_sum', models.PositiveIntegerField(default=0, verbose_name='Сумма оценок')),
+                ('average_rating', models.FloatField(default=0, verbose_name='Средняя оценка')),
+                ('rating_1', models.PositiveIntegerField(default=0, verbose_name='Оценок 1')),
+                ('rating_2', models.PositiveIntegerField(default=0, verbose_name='Оценок 2')),
+                ('rating_3', models.PositiveIntegerField(default=0, verbose_name='Оценок 3')),
+                ('rating_4', models.PositiveIntegerField(default=0, verbose_name='Оценок 4')),
+                ('rating_5', models.PositiveIntegerField(default=0, verbose_name='Оценок 5')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+            ],
+            options={
+                'verbose_name': 'Статистика товара',
+                'verbose_name_plural': 'Статистика товаров',
+                'indexes': [models.Index(fields=['-order_count'], name='shop_stats_order_count_idx')],
+            },
+        ),
+    ]
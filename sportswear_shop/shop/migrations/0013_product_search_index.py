@@ -0,0 +1,46 @@
+# Generated by Django 5.1.4 on 2026-10-18 14:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+FTS_TABLE = 'shop_product_fts'
+
+
+def configure_rank(apps, schema_editor):
+    # Колонка rank считает bm25 с весами name, description, brand, tags
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank) VALUES ('rank', 'bm25(10.0, 1.0, 5.0, 3.0)')"
+    )
+
+
+def reset_rank(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank) VALUES ('rank', 'bm25()')")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0012_product_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchIndex',
+            fields=[
+                ('product', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_index', serialize=False, to='shop.product', verbose_name='Товар')),
+                ('document', models.TextField(db_column='shop_product_fts', verbose_name='Документ')),
+                ('rank', models.FloatField(verbose_name='Релевантность')),
+            ],
+            options={
+                'verbose_name': 'Поисковый индекс товара',
+                'verbose_name_plural': 'Поисковый индекс товаров',
+                'db_table': 'shop_product_fts',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(configure_rank, reset_rank),
+    ]
@@ -48,6 +48,9 @@ class Product(models.Model):
         ('XL', 'Extra Large'),
     ]
 
+    sku: models.CharField = models.CharField(
+        max_length=64, unique=True, null=True, blank=True, verbose_name="Артикул"
+    )
     name: models.CharField = models.CharField(max_length=255, verbose_name="Название")
     description: models.TextField = models.TextField(verbose_name="Описание")
     price: models.DecimalField = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Цена")
@@ -55,6 +58,7 @@ class Product(models.Model):
     category: models.ForeignKey = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='products', verbose_name="Категория")
     brand: models.ForeignKey = models.ForeignKey(Brand, on_delete=models.CASCADE, related_name='products', verbose_name="Бренд")
     created_at: models.DateTimeField = models.DateTimeField(default=timezone.now, verbose_name="Дата создания")
+    updated_at: models.DateTimeField = models.DateTimeField(auto_now=True, verbose_name="Дата изменения")
     size: models.CharField = models.CharField(max_length=2, choices=SIZE_CHOICES, verbose_name="Размер")
 
     tags: models.ManyToManyField = models.ManyToManyField("Tag", through="ProductTag", verbose_name="Теги")
@@ -67,9 +71,20 @@ class Product(models.Model):
     )
 
     class Meta:
-        ordering = ['-created_at']
+        ordering = ['-created_at', '-id']
         verbose_name = "Товар"
         verbose_name_plural = "Товары"
+        indexes = [
+            # Лента каталога и keyset-пагинация по (-created_at, -id)
+            models.Index(fields=['-created_at', '-id'], name='shop_product_created_idx'),
+            # Только товары в наличии (ProductManager.available, ?in_stock=)
+            models.Index(fields=['-created_at', '-id'], name='shop_product_available_idx',
+                         condition=models.Q(stock__gt=0)),
+            # Лента категории: фильтр по category_id без сортировки во временном B-дереве
+            models.Index(fields=['category', '-created_at', '-id'], name='shop_product_category_idx'),
+            # Диапазоны цены (?price_min=, ?price_max=) и сортировка по цене в обе стороны
+            models.Index(fields=['price', 'id'], name='shop_product_price_idx'),
+        ]
 
     def get_absolute_url(self) -> str:
         """
@@ -113,7 +128,11 @@ class ProductImage(models.Model):
     Изображение товара.
     """
     product: models.ForeignKey = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='images', verbose_name="Товар")
-    image: models.ImageField = models.ImageField(upload_to='products/', verbose_name="Изображение")
+    image: models.ImageField = models.ImageField(
+        upload_to='products/', width_field='width', height_field='height', verbose_name="Изображение"
+    )
+    width: models.PositiveIntegerField = models.PositiveIntegerField(null=True, blank=True, editable=False, verbose_name="Ширина")
+    height: models.PositiveIntegerField = models.PositiveIntegerField(null=True, blank=True, editable=False, verbose_name="Высота")
     uploaded_at: models.DateTimeField = models.DateTimeField(auto_now_add=True, verbose_name="Дата загрузки")
 
     class Meta:
@@ -122,3 +141,182 @@ class ProductImage(models.Model):
 
     def __str__(self) -> str:
         return f"Изображение для {self.product.name}"
+
+    def srcset(self, image_format: str = 'jpeg') -> str:
+        """
+        Возвращает значение атрибута srcset из уменьшенных копий заданного формата.
+
+        Args:
+            image_format (str): 'webp' или 'jpeg'.
+
+        Returns:
+            str: строка вида "url 320w, url 640w" или пустая строка, если копий нет.
+        """
+        return ', '.join(
+            f'{rendition.file.url} {rendition.width}w'
+            for rendition in self.renditions.all()
+            if rendition.format == image_format
+        )
+
+
+class ProductImageRendition(models.Model):
+    """
+    Уменьшенная копия изображения товара в заданном формате и ширине.
+    """
+    FORMAT_CHOICES = [
+        ('webp', 'WebP'),
+        ('jpeg', 'JPEG'),
+    ]
+
+    image: models.ForeignKey = models.ForeignKey(ProductImage, on_delete=models.CASCADE, related_name='renditions', verbose_name="Изображение")
+    format: models.CharField = models.CharField(max_length=4, choices=FORMAT_CHOICES, verbose_name="Формат")
+    width: models.PositiveIntegerField = models.PositiveIntegerField(verbose_name="Ширина")
+    height: models.PositiveIntegerField = models.PositiveIntegerField(verbose_name="Высота")
+    size: models.PositiveIntegerField = models.PositiveIntegerField(verbose_name="Размер в байтах")
+    file: models.FileField = models.FileField(upload_to='products/renditions/', max_length=255, verbose_name="Файл")
+    created_at: models.DateTimeField = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+
+    class Meta:
+        verbose_name = "Копия изображения"
+        verbose_name_plural = "Копии изображений"
+        ordering = ['width']
+        constraints = [
+            models.UniqueConstraint(fields=['image', 'format', 'width'], name='shop_rendition_unique'),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.format} {self.width}x{self.height}"
+
+class ProductStats(models.Model):
+    """
+    Денормализованная статистика товара: продажи и отзывы.
+
+    Обновляется инкрементально сигналами OrderItem и Review,
+    полностью пересчитывается командой rebuild_product_stats.
+    """
+    product: models.OneToOneField = models.OneToOneField(
+        Product, on_delete=models.CASCADE, primary_key=True, related_name='stats', verbose_name="Товар"
+    )
+    units_sold: models.PositiveIntegerField = models.PositiveIntegerField(default=0, verbose_name="Продано единиц")
+    order_count: models.PositiveIntegerField = models.PositiveIntegerField(default=0, verbose_name="Позиций в заказах")
+    review_count: models.PositiveIntegerField = models.PositiveIntegerField(default=0, verbose_name="Отзывов")
+    rating_sum: models.PositiveIntegerField = models.PositiveIntegerField(default=0, verbose_name="Сумма оценок")
+    average_rating: models.FloatField = models.FloatField(default=0, verbose_name="Средняя оценка")
+    rating_1: models.PositiveIntegerField = models.PositiveIntegerField(default=0, verbose_name="Оценок 1")
+    rating_2: models.PositiveIntegerField = models.PositiveIntegerField(default=0, verbose_name="Оценок 2")
+    rating_3: models.PositiveIntegerField = models.PositiveIntegerField(default=0, verbose_name="Оценок 3")
+    rating_4: models.PositiveIntegerField = models.PositiveIntegerField(default=0, verbose_name="Оценок 4")
+    rating_5: models.PositiveIntegerField = models.PositiveIntegerField(default=0, verbose_name="Оценок 5")
+    updated_at: models.DateTimeField = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
+
+    class Meta:
+        verbose_name = "Статистика товара"
+        verbose_name_plural = "Статистика товаров"
+        indexes = [
+            models.Index(fields=['-order_count'], name='shop_stats_order_count_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f"Статистика {self.product_id}"
+
+    @property
+    def rating_histogram(self) -> list[int]:
+        """
+        Возвращает количество оценок от 1 до 5.
+        """
+        return [self.rating_1, self.rating_2, self.rating_3, self.rating_4, self.rating_5]
+
+
+class ProductPairCount(models.Model):
+    """
+    Разреженная матрица совместных покупок: в скольких заказах были оба товара.
+
+    Пара хранится один раз, product_a_id < product_b_id.
+    """
+    product_a: models.ForeignKey = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name='+', verbose_name="Товар A"
+    )
+    product_b: models.ForeignKey = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name='+', verbose_name="Товар B"
+    )
+    count: models.PositiveIntegerField = models.PositiveIntegerField(default=0, verbose_name="Совместных заказов")
+
+    class Meta:
+        verbose_name = "Совместная покупка"
+        verbose_name_plural = "Совместные покупки"
+        constraints = [
+            models.UniqueConstraint(fields=['product_a', 'product_b'], name='shop_pair_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['product_b'], name='shop_pair_product_b_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.product_a_id} + {self.product_b_id}: {self.count}"
+
+
+class ProductRecommendation(models.Model):
+    """
+    Top-K товаров, которые чаще всего покупают вместе с товаром.
+    """
+    product: models.ForeignKey = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name='recommendations', verbose_name="Товар"
+    )
+    recommended: models.ForeignKey = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name='+', verbose_name="Рекомендуемый товар"
+    )
+    score: models.PositiveIntegerField = models.PositiveIntegerField(default=0, verbose_name="Совместных заказов")
+    rank: models.PositiveSmallIntegerField = models.PositiveSmallIntegerField(verbose_name="Позиция")
+
+    class Meta:
+        verbose_name = "Рекомендация"
+        verbose_name_plural = "Рекомендации"
+        ordering = ['product', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'rank'], name='shop_recommendation_rank_unique'),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.product_id} → {self.recommended_id} ({self.score})"
+
+
+class RecommendationRun(models.Model):
+    """
+    Запуск построения рекомендаций; last_order_id — граница для следующего инкрементального запуска.
+    """
+    full: models.BooleanField = models.BooleanField(default=False, verbose_name="Полный пересчёт")
+    last_order_id: models.PositiveIntegerField = models.PositiveIntegerField(default=0, verbose_name="Последний заказ")
+    orders_processed: models.PositiveIntegerField = models.PositiveIntegerField(default=0, verbose_name="Обработано заказов")
+    products_updated: models.PositiveIntegerField = models.PositiveIntegerField(default=0, verbose_name="Обновлено товаров")
+    started_at: models.DateTimeField = models.DateTimeField(default=timezone.now, verbose_name="Начало")
+    finished_at: models.DateTimeField = models.DateTimeField(null=True, blank=True, verbose_name="Окончание")
+
+    class Meta:
+        verbose_name = "Запуск рекомендаций"
+        verbose_name_plural = "Запуски рекомендаций"
+        ordering = ['-started_at']
+
+    def __str__(self) -> str:
+        return f"Рекомендации {self.started_at:%Y-%m-%d %H:%M}"
+
+
+class ProductSearchIndex(models.Model):
+    """
+    Строка полнотекстового индекса товара (виртуальная таблица SQLite FTS5).
+
+    Таблица создаётся миграцией 0006_product_fts и заполняется shop.search;
+    модель нужна только для соединения с товарами в запросах поиска.
+    document — скрытая колонка FTS5 для MATCH, rank — релевантность bm25.
+    """
+    product: models.OneToOneField = models.OneToOneField(
+        Product, on_delete=models.DO_NOTHING, primary_key=True, db_column='rowid',
+        related_name='search_index', verbose_name="Товар"
+    )
+    document: models.TextField = models.TextField(db_column='shop_product_fts', verbose_name="Документ")
+    rank: models.FloatField = models.FloatField(verbose_name="Релевантность")
+
+    class Meta:
+        managed = False
+        db_table = 'shop_product_fts'
+        verbose_name = "Поисковый индекс товара"
+        verbose_name_plural = "Поисковый индекс товаров"
@@ -0,0 +1,334 @@
+import datetime
+import json
+from dataclasses import dataclass, field
+from typing import Any, Optional, Sequence
+
+from django.conf import settings
+from django.core import signing
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Model
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q, QuerySet
+from django.http import Http404, HttpRequest
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+CURSOR_SALT = 'shop.pagination.cursor'
+DEFAULT_ORDERING: tuple[str, ...] = ('-created_at', '-id')
+SEARCH_ORDERING: tuple[str, ...] = ('search_rank', '-created_at', '-id')
+DEFAULT_ESTIMATE_THRESHOLD = 10000
+
+
+def ordering_for(queryset: QuerySet) -> tuple[str, ...]:
+    """
+    Выбирает ключ сортировки: результаты поиска листаются по релевантности.
+    """
+    if 'search_rank' in queryset.query.annotations:
+        return SEARCH_ORDERING
+    return DEFAULT_ORDERING
+
+
+class _CursorEncoder(DjangoJSONEncoder):
+    """
+    JSON-кодировщик значений курсора.
+
+    Даты сохраняются с микросекундами: DjangoJSONEncoder обрезает их до
+    миллисекунд, и строки с одинаковым префиксом времени терялись бы между страницами.
+    """
+    def default(self, o: Any) -> Any:
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class _CursorSerializer(signing.JSONSerializer):
+    """
+    Сериализатор подписанного курсора.
+    """
+    def dumps(self, obj: Any) -> bytes:
+        return json.dumps(obj, separators=(',', ':'), cls=_CursorEncoder).encode('latin-1')
+
+
+class InvalidCursor(ValueError):
+    """
+    Курсор повреждён, подделан или не соответствует сортировке.
+    """
+
+
+@dataclass
+class KeysetPage:
+    """
+    Страница keyset-пагинации.
+
+    Атрибуты:
+        items (list): объекты текущей страницы.
+        next_cursor (Optional[str]): курсор следующей страницы.
+        previous_cursor (Optional[str]): курсор предыдущей страницы.
+    """
+    items: list = field(default_factory=list)
+    next_cursor: Optional[str] = None
+    previous_cursor: Optional[str] = None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    @property
+    def has_other_pages(self) -> bool:
+        return bool(self.next_cursor or self.previous_cursor)
+
+
+class KeysetPaginator:
+    """
+    Keyset (seek) пагинация по составному ключу сортировки.
+
+    Вместо OFFSET страница выбирается условием «строго после последней
+    увиденной строки», поэтому глубокие страницы стоят столько же, сколько первая.
+    Курсор подписан и непрозрачен для клиента.
+    """
+
+    def __init__(self, ordering: Sequence[str] = DEFAULT_ORDERING, page_size: int = 24) -> None:
+        self.ordering: tuple[str, ...] = tuple(ordering)
+        self.page_size: int = page_size
+
+    def encode_cursor(self, values: list[Any], reverse: bool) -> str:
+        """
+        Кодирует позицию в подписанную строку.
+
+        Args:
+            values (list): значения полей сортировки граничной строки.
+            reverse (bool): True для курсора предыдущей страницы.
+
+        Returns:
+            str: непрозрачный курсор.
+        """
+        payload = {'o': list(self.ordering), 'v': values, 'r': int(reverse)}
+        return signing.dumps(payload, salt=CURSOR_SALT, compress=True, serializer=_CursorSerializer)
+
+    def decode_cursor(self, cursor: str) -> tuple[list[Any], bool]:
+        """
+        Декодирует курсор, проверяя подпись и сортировку.
+
+        Raises:
+            InvalidCursor: если курсор невалиден.
+        """
+        try:
+            payload = signing.loads(cursor, salt=CURSOR_SALT, serializer=_CursorSerializer)
+        except signing.BadSignature as exc:
+            raise InvalidCursor('Некорректный курсор') from exc
+        if not isinstance(payload, dict) or payload.get('o') != list(self.ordering):
+            raise InvalidCursor('Курсор не соответствует сортировке')
+        values = payload.get('v')
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise InvalidCursor('Некорректный курсор')
+        return values, bool(payload.get('r'))
+
+    def _seek_filter(self, values: list[Any], reverse: bool) -> Q:
+        """
+        Строит условие (a, b, ...) «после» (va, vb, ...) с учётом направлений сортировки.
+        """
+        condition = Q()
+        for index in range(len(self.ordering) - 1, -1, -1):
+            name = self.ordering[index].lstrip('-')
+            descending = self.ordering[index].startswith('-')
+            if descending != reverse:
+                step = Q(**{f'{name}__lt': values[index]})
+            else:
+                step = Q(**{f'{name}__gt': values[index]})
+            if index == len(self.ordering) - 1:
+                condition = step
+            else:
+                condition = step | (Q(**{name: values[index]}) & condition)
+        return condition
+
+    def _row_values(self, obj: Any) -> list[Any]:
+        return [getattr(obj, name.lstrip('-')) for name in self.ordering]
+
+    def paginate(self, queryset: QuerySet, cursor: Optional[str] = None) -> KeysetPage:
+        """
+        Возвращает страницу queryset, начиная с позиции курсора.
+
+        Args:
+            queryset (QuerySet): исходный набор данных.
+            cursor (Optional[str]): курсор из предыдущего ответа.
+
+        Returns:
+            KeysetPage: объекты страницы и курсоры соседних страниц.
+        """
+        reverse = False
+        values: Optional[list[Any]] = None
+        if cursor:
+            values, reverse = self.decode_cursor(cursor)
+
+        if reverse:
+            order_by = [name[1:] if name.startswith('-') else f'-{name}' for name in self.ordering]
+        else:
+            order_by = list(self.ordering)
+        queryset = queryset.order_by(*order_by)
+        if values is not None:
+            queryset = queryset.filter(self._seek_filter(values, reverse))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        page = KeysetPage(items=rows)
+        if not rows:
+            return page
+        first = self._row_values(rows[0])
+        last = self._row_values(rows[-1])
+        if reverse:
+            page.previous_cursor = self.encode_cursor(first, True) if has_more else None
+            page.next_cursor = self.encode_cursor(last, False)
+        else:
+            page.next_cursor = self.encode_cursor(last, False) if has_more else None
+            page.previous_cursor = self.encode_cursor(first, True) if values is not None else None
+        return page
+
+
+def paginate_products(request: HttpRequest, queryset: QuerySet, page_size: int = 24) -> dict[str, Any]:
+    """
+    Keyset-пагинация для HTML-страниц каталога.
+
+    Args:
+        request (HttpRequest): HTTP-запрос (курсор берётся из ?cursor=).
+        queryset (QuerySet): отфильтрованные товары.
+        page_size (int): размер страницы.
+
+    Returns:
+        dict: контекст шаблона с ключами page, next_url, previous_url, first_url.
+
+    Raises:
+        Http404: если курсор невалиден.
+    """
+    paginator = KeysetPaginator(ordering_for(queryset), page_size)
+    try:
+        page = paginator.paginate(queryset, request.GET.get('cursor'))
+    except InvalidCursor as exc:
+        raise Http404(str(exc))
+    url = request.get_full_path()
+    return {
+        'page': page,
+        'next_url': replace_query_param(url, 'cursor', page.next_cursor) if page.next_cursor else None,
+        'previous_url': replace_query_param(url, 'cursor', page.previous_cursor) if page.previous_cursor else None,
+        'first_url': remove_query_param(url, 'cursor'),
+    }
+
+
+class ProductCursorPagination(BasePagination):
+    """
+    Курсорная пагинация DRF по ключу (created_at, id) или по релевантности для поиска.
+    """
+    page_size: int = 24
+    page_size_query_param: str = 'page_size'
+    max_page_size: int = 100
+    cursor_query_param: str = 'cursor'
+
+    def get_page_size(self, request: Any) -> int:
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def paginate_queryset(self, queryset: QuerySet, request: Any, view: Any = None) -> list:
+        self.request = request
+        paginator = KeysetPaginator(ordering_for(queryset), self.get_page_size(request))
+        try:
+            self.page = paginator.paginate(queryset, request.query_params.get(self.cursor_query_param))
+        except InvalidCursor as exc:
+            raise NotFound(str(exc))
+        return self.page.items
+
+    def _link(self, cursor: Optional[str]) -> Optional[str]:
+        if not cursor:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, cursor)
+
+    def get_next_link(self) -> Optional[str]:
+        return self._link(self.page.next_cursor)
+
+    def get_previous_link(self) -> Optional[str]:
+        return self._link(self.page.previous_cursor)
+
+    def get_paginated_response(self, data: Any) -> Response:
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema: dict) -> dict:
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+def estimate_row_count(model: type[Model], using: str = 'default') -> Optional[int]:
+    """
+    Оценивает число строк таблицы без COUNT(*) по всей таблице.
+
+    PostgreSQL и MySQL берут оценку из статистики планировщика, остальные
+    СУБД — максимальный первичный ключ (читается по индексу; удалённые
+    строки завышают оценку).
+
+    Args:
+        model (type[Model]): модель таблицы.
+        using (str): алиас БД.
+
+    Returns:
+        Optional[int]: оценка или None, если её нет (таблица не анализировалась).
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+        elif connection.vendor == 'mysql':
+            cursor.execute('SELECT table_rows FROM information_schema.tables '
+                           'WHERE table_schema = DATABASE() AND table_name = %s', [table])
+        else:
+            pk = connection.ops.quote_name(model._meta.pk.column)
+            cursor.execute(f'SELECT MAX({pk}) FROM {connection.ops.quote_name(table)}')
+        row = cursor.fetchone()
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Пагинатор админки для больших таблиц: не считает COUNT(*) по всей таблице.
+
+    Без фильтров число строк берётся из оценки СУБД (estimate_row_count),
+    если она не меньше порога ADMIN_ESTIMATED_COUNT_THRESHOLD. Отфильтрованный
+    список считается точно: оценки для условия нет, а урезанное число
+    скрывало бы дальние страницы результата.
+    """
+
+    @cached_property
+    def threshold(self) -> int:
+        return getattr(settings, 'ADMIN_ESTIMATED_COUNT_THRESHOLD', DEFAULT_ESTIMATE_THRESHOLD)
+
+    @cached_property
+    def count(self) -> int:
+        queryset = self.object_list
+        if isinstance(queryset, QuerySet) and not queryset.query.has_filters():
+            estimate = estimate_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= self.threshold:
+                return estimate
+        return super().count
@@ -0,0 +1,124 @@
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Iterable, Iterator, NamedTuple, Union
+
+CENT = Decimal('0.01')
+ZERO = Decimal('0.00')
+
+Percent = Union[int, Decimal, None]
+PriceRow = tuple[Decimal, int, Percent]
+
+
+class LinePrice(NamedTuple):
+    """
+    Цена позиции: сумма без скидки, скидка и сумма к оплате (все — в копейках).
+    """
+    subtotal: Decimal
+    discount: Decimal
+    total: Decimal
+
+
+def money(value: Decimal) -> Decimal:
+    """
+    Округляет сумму до копеек (половина — вверх).
+
+    Args:
+        value (Decimal): сумма.
+
+    Returns:
+        Decimal: сумма с двумя знаками после запятой.
+    """
+    return value.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def price_line(price: Decimal, quantity: int = 1, percent: Percent = 0) -> LinePrice:
+    """
+    Рассчитывает позицию: сумма = цена × количество, скидка округляется
+    до копеек от суммы позиции, к оплате — их разность.
+
+    Args:
+        price (Decimal): цена за единицу.
+        quantity (int): количество.
+        percent (Percent): скидка в процентах (0 или None — без скидки).
+
+    Returns:
+        LinePrice: сумма, скидка и сумма к оплате.
+    """
+    if not isinstance(price, Decimal):
+        price = Decimal(str(price))
+    subtotal = money(price * quantity)
+    discount = money(subtotal * Decimal(percent) / 100) if percent else ZERO
+    return LinePrice(subtotal, discount, subtotal - discount)
+
+
+def discounted_unit_price(price: Decimal, percent: Percent) -> Decimal:
+    """
+    Возвращает цену единицы со скидкой, округлённую до копеек.
+    """
+    return price_line(price, 1, percent).total
+
+
+def _round_hundredths(value: int) -> int:
+    """
+    Делит целое на 100 с округлением половины от нуля (как ROUND_HALF_UP).
+    """
+    magnitude = (2 * abs(value) + 100) // 200
+    return magnitude if value >= 0 else -magnitude
+
+
+def _batch_cents(rows: Iterable[PriceRow]) -> Iterator[tuple[int, int]]:
+    """
+    Возвращает для каждой строки (сумма, скидка) в копейках.
+
+    Строки с целыми копейками и целым процентом считаются в целых числах:
+    скидка = round_half_up(сумма × процент / 100) без промежуточных Decimal.
+    Остальные строки (дробные копейки или процент) считаются через
+    price_line, так что результат всегда совпадает со скалярным API.
+    """
+    for price, quantity, percent in rows:
+        scaled = price * 100
+        cents = int(scaled)
+        if cents != scaled or (percent and not isinstance(percent, int)):
+            line = price_line(price, quantity, percent)
+            yield int(line.subtotal * 100), int(line.discount * 100)
+            continue
+        subtotal = cents * quantity
+        yield subtotal, _round_hundredths(subtotal * percent) if percent else 0
+
+
+def price_many(rows: Iterable[PriceRow]) -> list[LinePrice]:
+    """
+    Рассчитывает пачку позиций (цена, количество, процент) за один проход.
+
+    Результат совпадает с price_line для каждой строки; расчёт идёт в целых
+    копейках, а Decimal создаются только для результата (сравнение
+    скорости — команда benchmark_pricing).
+
+    Args:
+        rows (Iterable[PriceRow]): кортежи (цена, количество, скидка в процентах).
+
+    Returns:
+        list[LinePrice]: цены позиций в порядке строк.
+    """
+    # CENT × копейки даёт Decimal ровно с двумя знаками, как quantize
+    return [LinePrice(CENT * subtotal, CENT * discount, CENT * (subtotal - discount))
+            for subtotal, discount in _batch_cents(rows)]
+
+
+def price_totals(rows: Iterable[PriceRow]) -> LinePrice:
+    """
+    Возвращает итоги пачки позиций: сумму, скидку и сумму к оплате.
+
+    Суммы складываются в целых копейках и переводятся в Decimal один раз,
+    поэтому итог равен сумме округлённых позиций.
+
+    Args:
+        rows (Iterable[PriceRow]): кортежи (цена, количество, скидка в процентах).
+
+    Returns:
+        LinePrice: итоги.
+    """
+    subtotal_sum = discount_sum = 0
+    for subtotal, discount in _batch_cents(rows):
+        subtotal_sum += subtotal
+        discount_sum += discount
+    return LinePrice(CENT * subtotal_sum, CENT * discount_sum, CENT * (subtotal_sum - discount_sum))
@@ -0,0 +1,157 @@
+from typing import Iterable, Mapping, Optional
+
+from django.db.models import Case, Count, F, FloatField, IntegerField, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, Now, NullIf
+
+from .models import Product, ProductStats
+
+RATING_FIELDS = {rating: f'rating_{rating}' for rating in range(1, 6)}
+
+
+def ensure_stats(product_ids: Iterable[int]) -> None:
+    """
+    Создаёт пустые строки статистики для товаров, у которых их ещё нет.
+    """
+    ProductStats.objects.bulk_create(
+        [ProductStats(product_id=product_id) for product_id in set(product_ids)],
+        ignore_conflicts=True,
+    )
+
+
+def apply_sales_delta(product_id: int, units: int, lines: int, create: bool = True) -> None:
+    """
+    Изменяет счётчики продаж товара на заданную величину.
+
+    Args:
+        product_id (int): ID товара.
+        units (int): изменение количества проданных единиц.
+        lines (int): изменение количества позиций в заказах.
+        create (bool): создать строку статистики, если её нет. При удалениях
+            строку не создаём: товар может удаляться каскадом в той же транзакции.
+    """
+    if not units and not lines:
+        return
+    if create:
+        ensure_stats([product_id])
+    ProductStats.objects.filter(pk=product_id).update(
+        units_sold=F('units_sold') + units,
+        order_count=F('order_count') + lines,
+        updated_at=Now(),
+    )
+
+
+def apply_sales_batch(units: Mapping[int, int]) -> None:
+    """
+    Добавляет продажи нескольких товаров (по одной позиции на товар) одним UPDATE.
+
+    Используется при оформлении заказа, где позиции создаются bulk_create
+    без сигналов.
+
+    Args:
+        units (Mapping[int, int]): {ID товара: проданное количество}.
+    """
+    if not units:
+        return
+    ensure_stats(units)
+    ProductStats.objects.filter(pk__in=list(units)).update(
+        units_sold=F('units_sold') + Case(
+            *(When(pk=product_id, then=Value(quantity)) for product_id, quantity in units.items()),
+            output_field=IntegerField(),
+        ),
+        order_count=F('order_count') + 1,
+        updated_at=Now(),
+    )
+
+
+def apply_rating_delta(product_id: int, rating: int, sign: int, create: bool = True) -> None:
+    """
+    Добавляет (sign=1) или убирает (sign=-1) одну оценку товара.
+
+    Средняя оценка пересчитывается тем же UPDATE из новых значений счётчиков.
+
+    Args:
+        product_id (int): ID товара.
+        rating (int): оценка от 1 до 5.
+        sign (int): 1 при добавлении отзыва, -1 при удалении.
+        create (bool): создать строку статистики, если её нет.
+    """
+    if create:
+        ensure_stats([product_id])
+    new_sum = F('rating_sum') + sign * rating
+    new_count = F('review_count') + sign
+    ProductStats.objects.filter(pk=product_id).update(
+        review_count=new_count,
+        rating_sum=new_sum,
+        average_rating=Coalesce(
+            Cast(new_sum, FloatField()) / NullIf(new_count, Value(0)),
+            Value(0.0),
+        ),
+        **{RATING_FIELDS[rating]: F(RATING_FIELDS[rating]) + sign},
+        updated_at=Now(),
+    )
+
+
+def touch(product_id: int) -> None:
+    """
+    Обновляет отметку времени статистики товара без изменения счётчиков.
+    """
+    ProductStats.objects.filter(pk=product_id).update(updated_at=Now())
+
+
+def rebuild(batch_size: int = 1000, product_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Пересчитывает статистику с нуля пачками товаров.
+
+    Args:
+        batch_size (int): количество товаров в пачке.
+        product_ids (Optional[Iterable[int]]): ограничить пересчёт этими товарами.
+
+    Returns:
+        int: количество обработанных товаров.
+    """
+    from orders.models import OrderItem
+    from reviews.models import Review
+
+    ids_queryset = Product.objects.order_by('pk').values_list('pk', flat=True)
+    if product_ids is not None:
+        ids_queryset = ids_queryset.filter(pk__in=list(product_ids))
+
+    processed = 0
+    last_id = 0
+    while True:
+        batch = list(ids_queryset.filter(pk__gt=last_id)[:batch_size])
+        if not batch:
+            break
+        last_id = batch[-1]
+
+        stats = {product_id: ProductStats(product_id=product_id) for product_id in batch}
+        sales = (OrderItem.objects.filter(product_id__in=batch)
+                 .values('product_id')
+                 .annotate(units=Sum('quantity'), lines=Count('id'))
+                 .order_by())
+        for row in sales:
+            stats[row['product_id']].units_sold = row['units'] or 0
+            stats[row['product_id']].order_count = row['lines']
+        ratings = (Review.objects.filter(product_id__in=batch)
+                   .values('product_id', 'rating')
+                   .annotate(count=Count('id'))
+                   .order_by())
+        for row in ratings:
+            item = stats[row['product_id']]
+            setattr(item, RATING_FIELDS[row['rating']], row['count'])
+            item.review_count += row['count']
+            item.rating_sum += row['rating'] * row['count']
+        for item in stats.values():
+            item.average_rating = item.rating_sum / item.review_count if item.review_count else 0
+
+        ProductStats.objects.bulk_create(
+            stats.values(),
+            update_conflicts=True,
+            unique_fields=['product'],
+            update_fields=[
+                'units_sold', 'order_count', 'review_count', 'rating_sum', 'average_rating',
+                *RATING_FIELDS.values(), 'updated_at',
+            ],
+        )
+        processed += len(batch)
+    return processed
@@ -0,0 +1,234 @@
+import heapq
+import logging
+import time
+from collections import Counter
+from itertools import combinations
+from typing import Iterable, Iterator, Optional
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q, QuerySet
+from django.utils import timezone
+
+from . import cache as shop_cache
+from .models import Product, ProductPairCount, ProductRecommendation, RecommendationRun
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOP_K = 10
+DEFAULT_CHUNK_SIZE = 5000
+# Крупные корзины (оптовые заказы) дают квадратичное число пар и мало смысла
+MAX_BASKET_SIZE = 50
+# Сколько пар накапливать в памяти перед записью в БД
+FLUSH_PAIRS = 50000
+PRODUCTS_BATCH = 500
+RECOMMENDATIONS_CACHE_TIMEOUT = 3600
+
+
+def iter_baskets(after_order_id: int, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[tuple[int, list[int]]]:
+    """
+    Перебирает корзины заказов с ID больше after_order_id.
+
+    Позиции читаются одним курсором, упорядоченным по заказу, пачками по
+    chunk_size строк, и группируются в корзины на лету.
+
+    Args:
+        after_order_id (int): граница предыдущего запуска.
+        chunk_size (int): размер пачки чтения.
+
+    Yields:
+        tuple[int, list[int]]: ID заказа и отсортированные ID различных товаров в нём.
+    """
+    from orders.models import OrderItem
+
+    rows = (OrderItem.objects.filter(order_id__gt=after_order_id)
+            .order_by('order_id', 'product_id')
+            .values_list('order_id', 'product_id')
+            .iterator(chunk_size=chunk_size))
+    current_order: Optional[int] = None
+    basket: list[int] = []
+    for order_id, product_id in rows:
+        if order_id != current_order:
+            if current_order is not None:
+                yield current_order, basket
+            current_order, basket = order_id, []
+        if not basket or basket[-1] != product_id:
+            basket.append(product_id)
+    if current_order is not None:
+        yield current_order, basket
+
+
+def _flush_pairs(pairs: Counter) -> set[int]:
+    """
+    Прибавляет накопленные счётчики пар к таблице ProductPairCount.
+
+    Returns:
+        set[int]: товары, у которых изменились счётчики.
+    """
+    if not pairs:
+        return set()
+    keys = list(pairs)
+    existing: dict[tuple[int, int], int] = {}
+    products_a = {a for a, _ in keys}
+    for start in range(0, len(keys), PRODUCTS_BATCH):
+        chunk = keys[start:start + PRODUCTS_BATCH]
+        condition = Q()
+        for a in {a for a, _ in chunk}:
+            condition |= Q(product_a_id=a, product_b_id__in=[b for pa, b in chunk if pa == a])
+        existing.update(
+            ((a, b), count) for a, b, count in
+            ProductPairCount.objects.filter(condition).values_list('product_a_id', 'product_b_id', 'count')
+        )
+    ProductPairCount.objects.bulk_create(
+        [ProductPairCount(product_a_id=a, product_b_id=b, count=existing.get((a, b), 0) + count)
+         for (a, b), count in pairs.items()],
+        update_conflicts=True,
+        unique_fields=['product_a', 'product_b'],
+        update_fields=['count'],
+        batch_size=PRODUCTS_BATCH,
+    )
+    return products_a | {b for _, b in keys}
+
+
+def accumulate_pairs(baskets: Iterable[tuple[int, list[int]]]) -> tuple[int, int, set[int]]:
+    """
+    Считает совместные покупки по корзинам и прибавляет их к матрице.
+
+    Разреженная матрица накапливается в Counter по парам (a < b) и
+    сбрасывается в БД каждые FLUSH_PAIRS пар, так что память ограничена
+    независимо от числа заказов.
+
+    Returns:
+        tuple: (число заказов, ID последнего заказа, изменённые товары).
+    """
+    pairs: Counter = Counter()
+    touched: set[int] = set()
+    orders = 0
+    last_order_id = 0
+    for order_id, basket in baskets:
+        orders += 1
+        last_order_id = order_id
+        if 1 < len(basket) <= MAX_BASKET_SIZE:
+            pairs.update(combinations(basket, 2))
+        if len(pairs) >= FLUSH_PAIRS:
+            touched |= _flush_pairs(pairs)
+            pairs.clear()
+    touched |= _flush_pairs(pairs)
+    return orders, last_order_id, touched
+
+
+def rebuild_top_k(product_ids: Iterable[int], top_k: int = DEFAULT_TOP_K) -> int:
+    """
+    Пересчитывает top-K соседей для указанных товаров по матрице пар.
+
+    Args:
+        product_ids (Iterable[int]): товары, у которых изменились пары.
+        top_k (int): сколько рекомендаций хранить на товар.
+
+    Returns:
+        int: количество обработанных товаров.
+    """
+    ids = sorted(set(product_ids))
+    for start in range(0, len(ids), PRODUCTS_BATCH):
+        batch = ids[start:start + PRODUCTS_BATCH]
+        batch_set = set(batch)
+        neighbours: dict[int, list[tuple[int, int]]] = {product_id: [] for product_id in batch}
+        rows = (ProductPairCount.objects
+                .filter(Q(product_a_id__in=batch) | Q(product_b_id__in=batch))
+                .values_list('product_a_id', 'product_b_id', 'count')
+                .iterator(chunk_size=DEFAULT_CHUNK_SIZE))
+        for a, b, count in rows:
+            if a in batch_set:
+                neighbours[a].append((count, b))
+            if b in batch_set:
+                neighbours[b].append((count, a))
+
+        recommendations = []
+        for product_id, candidates in neighbours.items():
+            best = heapq.nsmallest(top_k, candidates, key=lambda item: (-item[0], item[1]))
+            recommendations.extend(
+                ProductRecommendation(product_id=product_id, recommended_id=other, score=count, rank=rank)
+                for rank, (count, other) in enumerate(best, start=1)
+            )
+        with transaction.atomic():
+            ProductRecommendation.objects.filter(product_id__in=batch).delete()
+            ProductRecommendation.objects.bulk_create(recommendations, batch_size=PRODUCTS_BATCH)
+    return len(ids)
+
+
+def run(full: bool = False, top_k: int = DEFAULT_TOP_K, chunk_size: int = DEFAULT_CHUNK_SIZE) -> RecommendationRun:
+    """
+    Строит или обновляет рекомендации «часто покупают вместе».
+
+    Инкрементальный запуск обрабатывает только заказы с ID больше границы
+    прошлого запуска и пересчитывает top-K лишь для затронутых товаров.
+    Полный запуск очищает матрицу и считает всё заново.
+
+    Args:
+        full (bool): пересчитать с нуля.
+        top_k (int): сколько рекомендаций хранить на товар.
+        chunk_size (int): размер пачки чтения позиций заказов.
+
+    Returns:
+        RecommendationRun: запись о запуске.
+    """
+    started = time.monotonic()
+    previous = RecommendationRun.objects.filter(finished_at__isnull=False).order_by('-last_order_id').first()
+    after_order_id = 0 if full or previous is None else previous.last_order_id
+    record = RecommendationRun.objects.create(full=full, last_order_id=after_order_id)
+
+    with transaction.atomic():
+        if full:
+            ProductPairCount.objects.all().delete()
+            ProductRecommendation.objects.all().delete()
+        orders, last_order_id, touched = accumulate_pairs(iter_baskets(after_order_id, chunk_size))
+        if full:
+            touched = set(ProductPairCount.objects.values_list('product_a_id', flat=True).distinct()) | set(
+                ProductPairCount.objects.values_list('product_b_id', flat=True).distinct())
+        products_updated = rebuild_top_k(touched, top_k)
+
+    record.orders_processed = orders
+    record.last_order_id = max(after_order_id, last_order_id)
+    record.products_updated = products_updated
+    record.finished_at = timezone.now()
+    record.save()
+    shop_cache.bump_version(shop_cache.RECOMMENDATIONS)
+    logger.info('Рекомендации: %d заказов, %d товаров за %.1f с',
+                orders, products_updated, time.monotonic() - started)
+    return record
+
+
+def get_recommended_ids(product_id: int) -> list[int]:
+    """
+    Возвращает ID рекомендуемых товаров из кеша или из таблицы top-K.
+    """
+    versions = shop_cache.get_versions(shop_cache.RECOMMENDATIONS)
+    key = shop_cache.make_key('recommendations', versions, product_id)
+    ids = cache.get(key)
+    if ids is None:
+        ids = list(ProductRecommendation.objects.filter(product_id=product_id)
+                   .order_by('rank').values_list('recommended_id', flat=True))
+        cache.set(key, ids, RECOMMENDATIONS_CACHE_TIMEOUT)
+    return ids
+
+
+def recommended_products(product_id: int, queryset: Optional[QuerySet] = None,
+                         limit: int = DEFAULT_TOP_K) -> list[Product]:
+    """
+    Возвращает рекомендуемые товары в порядке ранга.
+
+    Args:
+        product_id (int): ID товара.
+        queryset (Optional[QuerySet]): базовый queryset товаров (select/prefetch вызывающего).
+        limit (int): сколько товаров вернуть.
+
+    Returns:
+        list[Product]: товары (удалённые после запуска пропускаются).
+    """
+    ids = get_recommended_ids(product_id)[:limit]
+    if not ids:
+        return []
+    queryset = Product.objects.all() if queryset is None else queryset
+    products = queryset.in_bulk(ids)
+    return [products[pk] for pk in ids if pk in products]
+
@@ -0,0 +1,151 @@
+import re
+from typing import Any, Iterable
+
+from django.db import connection
+from django.db.models import F, Lookup, Q, QuerySet
+
+from .models import ProductSearchIndex
+
+FTS_TABLE = ProductSearchIndex._meta.db_table
+# Веса колонок для bm25 (колонка rank): name, description, brand, tags
+FTS_WEIGHTS = (10.0, 1.0, 5.0, 3.0)
+INDEX_BATCH_SIZE = 500
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+_INDEX_SELECT_SQL = f"""
+    SELECT p.id, p.name, p.description, b.name,
+           (SELECT group_concat(t.name, ' ')
+              FROM shop_producttag pt
+              JOIN shop_tag t ON t.id = pt.tag_id
+             WHERE pt.product_id = p.id)
+      FROM shop_product p
+      JOIN shop_brand b ON b.id = p.brand_id
+"""
+
+
+def is_supported() -> bool:
+    """
+    Проверяет, что текущая БД поддерживает полнотекстовый индекс (SQLite FTS5).
+    """
+    return connection.vendor == 'sqlite'
+
+
+def build_match_query(text: str) -> str:
+    """
+    Преобразует пользовательский ввод в безопасное выражение FTS5 MATCH.
+
+    Каждое слово экранируется кавычками и ищется по префиксу, слова объединяются через AND.
+
+    Args:
+        text (str): строка поиска.
+
+    Returns:
+        str: выражение MATCH или пустая строка, если слов нет.
+    """
+    words = _TOKEN_RE.findall(text.lower())
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def _chunks(ids: list[int], size: int) -> Iterable[list[int]]:
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def index_products(product_ids: Iterable[int]) -> None:
+    """
+    Переиндексирует указанные товары.
+
+    Args:
+        product_ids (Iterable[int]): ID товаров.
+    """
+    if not is_supported():
+        return
+    ids = sorted(set(product_ids))
+    with connection.cursor() as cursor:
+        for chunk in _chunks(ids, INDEX_BATCH_SIZE):
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', chunk)
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE}(rowid, name, description, brand, tags) '
+                f'{_INDEX_SELECT_SQL} WHERE p.id IN ({placeholders})',
+                chunk,
+            )
+
+
+def remove_products(product_ids: Iterable[int]) -> None:
+    """
+    Удаляет товары из индекса.
+
+    Args:
+        product_ids (Iterable[int]): ID товаров.
+    """
+    if not is_supported():
+        return
+    ids = sorted(set(product_ids))
+    with connection.cursor() as cursor:
+        for chunk in _chunks(ids, INDEX_BATCH_SIZE):
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', chunk)
+
+
+def rebuild_index() -> None:
+    """
+    Полностью перестраивает индекс по всем товарам и заново задаёт веса bm25.
+    """
+    if not is_supported():
+        return
+    weights = ', '.join(str(weight) for weight in FTS_WEIGHTS)
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(f'INSERT INTO {FTS_TABLE}(rowid, name, description, brand, tags) {_INDEX_SELECT_SQL}')
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank) VALUES ('rank', %s)", [f'bm25({weights})'])
+
+
+class Match(Lookup):
+    """
+    Полнотекстовый поиск FTS5: <таблица>.<скрытая колонка> MATCH %s.
+    """
+    lookup_name = 'match'
+
+    def as_sql(self, compiler: Any, connection: Any) -> tuple[str, list]:
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', [*lhs_params, *rhs_params]
+
+
+ProductSearchIndex._meta.get_field('document').register_lookup(Match)
+
+
+def search_products(queryset: QuerySet, text: str) -> QuerySet:
+    """
+    Фильтрует товары по полнотекстовому запросу и аннотирует релевантность.
+
+    На SQLite используется индекс FTS5: товары соединяются с таблицей
+    индекса (ProductSearchIndex) и фильтруются одним MATCH, queryset получает
+    аннотацию search_rank (колонка rank, bm25, меньше — релевантнее) и
+    сортируется по ней. Для группировок (values().annotate(), агрегаты)
+    сортировку нужно сбросить через order_by(). На других СУБД выполняется
+    прежний поиск через icontains без ранжирования.
+
+    Args:
+        queryset (QuerySet): исходный набор товаров.
+        text (str): строка поиска.
+
+    Returns:
+        QuerySet: найденные товары.
+    """
+    match = build_match_query(text)
+    if not match:
+        return queryset.none()
+    if not is_supported():
+        return queryset.filter(
+            Q(name__icontains=text) |
+            Q(description__icontains=text) |
+            Q(brand__name__icontains=text) |
+            Q(tags__name__icontains=text)
+        ).distinct()
+
+    return queryset.filter(search_index__document__match=match).annotate(
+        search_rank=F('search_index__rank'),
+    ).order_by('search_rank', '-created_at', '-id')
@@ -1,40 +1,171 @@
-from typing import Any, Optional
+from typing import Any, Iterable, Optional
 from rest_framework import serializers
-from .models import Product, ProductImage, Category, Brand
+from django.utils import timezone
+from discounts import resolver
+from .fieldsets import DynamicFieldsMixin
+from .models import Product, ProductImage, ProductImageRendition, Category, Brand
+from .pricing import discounted_unit_price
 
-class ProductImageSerializer(serializers.ModelSerializer):
+class CategorySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """
-    Сериализатор для изображений товара.
+    Сериализатор категории (для ?expand=category).
     """
+    class Meta:
+        model = Category
+        fields = ['id', 'name']
+
+class BrandSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """
+    Сериализатор бренда (для ?expand=brand).
+    """
+    class Meta:
+        model = Brand
+        fields = ['id', 'name']
+
+class ProductImageRenditionSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """
+    Сериализатор для уменьшенной копии изображения.
+    """
+    url = serializers.FileField(source='file', read_only=True)
+
+    class Meta:
+        model = ProductImageRendition
+        fields = ['format', 'width', 'height', 'size', 'url']
+
+class ProductImageSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """
+    Сериализатор для изображений товара с размерами и уменьшенными копиями.
+    """
+    renditions = ProductImageRenditionSerializer(many=True, read_only=True)
+    srcset = serializers.SerializerMethodField()
+
     class Meta:
         model = ProductImage
-        fields = ['id', 'image']
+        fields = ['id', 'image', 'width', 'height', 'srcset', 'renditions']
+        field_dependencies = {'srcset': ['renditions']}
+
+    def get_srcset(self, obj: ProductImage) -> dict[str, str]:
+        """
+        Возвращает строки srcset по форматам.
+
+        Args:
+            obj (ProductImage): изображение товара.
+
+        Returns:
+            dict[str, str]: {'webp': '...', 'jpeg': '...'}.
+        """
+        request = self.context.get('request')
+        result = {}
+        for image_format, _ in ProductImageRendition.FORMAT_CHOICES:
+            items = [r for r in obj.renditions.all() if r.format == image_format]
+            result[image_format] = ', '.join(
+                f'{request.build_absolute_uri(r.file.url) if request else r.file.url} {r.width}w' for r in items
+            )
+        return result
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """
     Сериализатор для товара с вложенными изображениями и полем избранного.
+
+    Поддерживает ?fields= (например, id,name,price) и ?expand=category,brand.
     """
     images = ProductImageSerializer(many=True, read_only=True)
     is_favorite = serializers.SerializerMethodField()
+    discount = serializers.SerializerMethodField()
+    discounted_price = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
-        fields = ['id', 'name', 'price', 'stock', 'category', 'brand', 'images', 'is_favorite']
+        fields = ['id', 'name', 'price', 'stock', 'category', 'brand', 'images', 'is_favorite',
+                  'discount', 'discounted_price']
+        expandable_fields = {
+            'category': lambda: CategorySerializer(read_only=True),
+            'brand': lambda: BrandSerializer(read_only=True),
+        }
+        field_dependencies = {'is_favorite': [], 'discount': [], 'discounted_price': ['price']}
 
     def get_is_favorite(self, obj: Product) -> bool:
         """
         Определяет, является ли товар избранным для текущего пользователя.
 
+        Если view передал в контекст множество 'favorite_ids' (см.
+        get_favorite_ids), ответ берётся из него без запросов к БД.
+
         Args:
             obj (Product): экземпляр продукта.
 
         Returns:
             bool: True, если товар в избранных пользователя, иначе False.
         """
+        favorite_ids: Optional[set[int]] = self.context.get('favorite_ids')
+        if favorite_ids is not None:
+            return obj.pk in favorite_ids
         user: Optional[Any] = self.context.get('user')
         if user and user.is_authenticated:
-            # Предполагается, что у пользователя есть related_name 'favorite_products'
-            favorite_products = getattr(user, 'favorite_products', None)
-            if favorite_products:
-                return favorite_products.filter(pk=obj.pk).exists()
+            # Без подготовленного множества загружаем избранное один раз на весь ответ
+            self.context['favorite_ids'] = set(user.favorite_products.values_list('pk', flat=True))
+            return obj.pk in self.context['favorite_ids']
         return False
+
+    def _best_discount(self, obj: Product) -> Optional[resolver.DiscountOffer]:
+        """
+        Возвращает лучшую действующую скидку товара из индекса скидок.
+
+        Индекс и текущее время берутся один раз на весь ответ, так что
+        список товаров не выполняет запросов к БД ради скидок.
+        """
+        if 'discount_index' not in self.context:
+            self.context['discount_index'] = resolver.get_index()
+            self.context['discount_moment'] = timezone.now()
+        return self.context['discount_index'].best(obj.pk, self.context['discount_moment'])
+
+    def get_discount(self, obj: Product) -> Optional[dict[str, Any]]:
+        """
+        Возвращает лучшую действующую скидку товара.
+
+        Args:
+            obj (Product): экземпляр продукта.
+
+        Returns:
+            Optional[dict[str, Any]]: {'id', 'name', 'discount_percent'} или None.
+        """
+        offer = self._best_discount(obj)
+        if offer is None:
+            return None
+        return {'id': offer.id, 'name': offer.name, 'discount_percent': offer.discount_percent}
+
+    def get_discounted_price(self, obj: Product) -> str:
+        """
+        Возвращает цену с лучшей действующей скидкой (строкой, как DecimalField).
+
+        Args:
+            obj (Product): экземпляр продукта.
+
+        Returns:
+            str: цена со скидкой или обычная цена.
+        """
+        offer = self._best_discount(obj)
+        price = obj.price if offer is None else discounted_unit_price(obj.price, offer.discount_percent)
+        return f'{price:.2f}'
+
+
+def get_favorite_ids(user: Any, products: Iterable[Product]) -> set[int]:
+    """
+    Возвращает ID избранных товаров пользователя среди переданных товаров.
+
+    Выполняет один запрос, ограниченный товарами текущей страницы, вместо
+    запроса на каждый товар.
+
+    Args:
+        user (Any): текущий пользователь (может быть анонимным).
+        products (Iterable[Product]): сериализуемые товары.
+
+    Returns:
+        set[int]: ID товаров, добавленных пользователем в избранное.
+    """
+    if not user or not user.is_authenticated:
+        return set()
+    product_ids = [product.pk for product in products]
+    if not product_ids:
+        return set()
+    return set(user.favorite_products.filter(pk__in=product_ids).values_list('pk', flat=True))
@@ -0,0 +1,320 @@
+from typing import Any
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from discounts.models import Discount
+from orders.models import OrderItem
+from reviews.models import Review
+
+from . import cache as shop_cache
+from . import autocomplete, product_stats, search, thumbnails
+from .models import Brand, Category, Product, ProductImage, ProductImageRendition, ProductTag, Tag
+
+AUTOCOMPLETE_KINDS = {
+    Product: autocomplete.PRODUCT,
+    Brand: autocomplete.BRAND,
+    Category: autocomplete.CATEGORY,
+    Tag: autocomplete.TAG,
+}
+
+
+@receiver(post_save, sender=Product)
+def index_product_on_save(sender: type, instance: Product, raw: bool = False, **kwargs: Any) -> None:
+    """
+    Обновляет поисковый индекс после сохранения товара.
+    """
+    if not raw:
+        search.index_products([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_from_index(sender: type, instance: Product, **kwargs: Any) -> None:
+    """
+    Удаляет товар из поискового индекса.
+    """
+    search.remove_products([instance.pk])
+
+
+@receiver(post_save, sender=Brand)
+def index_brand_products(sender: type, instance: Brand, raw: bool = False, created: bool = False, **kwargs: Any) -> None:
+    """
+    Переиндексирует товары бренда после его переименования.
+    """
+    if not raw and not created:
+        search.index_products(instance.products.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Tag)
+def index_tag_products(sender: type, instance: Tag, raw: bool = False, created: bool = False, **kwargs: Any) -> None:
+    """
+    Переиндексирует товары с тегом после его переименования.
+    """
+    if not raw and not created:
+        search.index_products(
+            ProductTag.objects.filter(tag=instance).values_list('product_id', flat=True)
+        )
+
+
+@receiver(post_save, sender=ProductTag)
+@receiver(post_delete, sender=ProductTag)
+def index_product_tags(sender: type, instance: ProductTag, raw: bool = False, **kwargs: Any) -> None:
+    """
+    Переиндексирует товар при добавлении или удалении тега.
+    """
+    if not raw:
+        search.index_products([instance.product_id])
+
+
+@receiver(m2m_changed, sender=Product.tags.through)
+def index_product_tags_m2m(sender: type, instance: Any, action: str, pk_set: Any, **kwargs: Any) -> None:
+    """
+    Переиндексирует товары при изменении тегов через Product.tags.
+    """
+    if action == 'pre_clear' and not isinstance(instance, Product):
+        # После очистки связей уже не узнать, какие товары были затронуты
+        instance._search_cleared_ids = list(
+            ProductTag.objects.filter(tag=instance).values_list('product_id', flat=True)
+        )
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if isinstance(instance, Product):
+        search.index_products([instance.pk])
+    elif action == 'post_clear':
+        search.index_products(getattr(instance, '_search_cleared_ids', []))
+    else:
+        search.index_products(pk_set or [])
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductTag)
+@receiver(post_delete, sender=ProductTag)
+@receiver(m2m_changed, sender=Product.tags.through)
+def bump_products_version(sender: type, **kwargs: Any) -> None:
+    """
+    Инвалидирует кеши, зависящие от товаров и их тегов.
+    """
+    if kwargs.get('action', 'post').startswith('post'):
+        shop_cache.bump_version_on_commit(shop_cache.PRODUCTS)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Brand)
+@receiver(post_delete, sender=Brand)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def bump_taxonomy_version(sender: type, **kwargs: Any) -> None:
+    """
+    Инвалидирует кеши, зависящие от категорий, брендов и тегов.
+    """
+    shop_cache.bump_version_on_commit(shop_cache.TAXONOMY)
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def bump_images_version(sender: type, **kwargs: Any) -> None:
+    """
+    Инвалидирует кеши, в которых выводятся изображения товаров.
+    """
+    shop_cache.bump_version_on_commit(shop_cache.IMAGES)
+
+
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def bump_sales_version(sender: type, **kwargs: Any) -> None:
+    """
+    Инвалидирует кеши, зависящие от продаж (популярные товары).
+    """
+    shop_cache.bump_version_on_commit(shop_cache.SALES)
+
+
+@receiver(post_save, sender=Discount)
+@receiver(post_delete, sender=Discount)
+@receiver(m2m_changed, sender=Discount.products.through)
+def bump_discounts_version(sender: type, **kwargs: Any) -> None:
+    """
+    Инвалидирует кеши, зависящие от скидок.
+    """
+    if kwargs.get('action', 'post').startswith('post'):
+        shop_cache.bump_version_on_commit(shop_cache.DISCOUNTS)
+
+
+@receiver(m2m_changed, sender=get_user_model().favorite_products.through)
+def bump_favorites_version(sender: type, instance: Any, action: str, pk_set: Any, reverse: bool = False, **kwargs: Any) -> None:
+    """
+    Инвалидирует условные ответы API для пользователей, чьё избранное изменилось.
+    """
+    if not action.startswith('post'):
+        return
+    if not reverse:
+        shop_cache.bump_version_on_commit(shop_cache.favorites_namespace(instance.pk))
+    elif pk_set:
+        shop_cache.bump_version_on_commit(*(shop_cache.favorites_namespace(user_id) for user_id in pk_set))
+
+
+@receiver(post_save, sender=Product)
+def create_product_stats(sender: type, instance: Product, created: bool = False, raw: bool = False, **kwargs: Any) -> None:
+    """
+    Создаёт пустую статистику для нового товара.
+    """
+    if created and not raw:
+        product_stats.ensure_stats([instance.pk])
+
+
+@receiver(pre_save, sender=OrderItem)
+def remember_order_item(sender: type, instance: OrderItem, raw: bool = False, **kwargs: Any) -> None:
+    """
+    Запоминает прежние товар и количество позиции, чтобы применить разницу после сохранения.
+    """
+    instance._stats_previous = None
+    if instance.pk and not raw:
+        instance._stats_previous = (
+            OrderItem.objects.filter(pk=instance.pk).values_list('product_id', 'quantity').first()
+        )
+
+
+@receiver(post_save, sender=OrderItem)
+def update_sales_stats(sender: type, instance: OrderItem, raw: bool = False, **kwargs: Any) -> None:
+    """
+    Применяет изменение позиции заказа к статистике продаж.
+    """
+    if raw:
+        return
+    previous = getattr(instance, '_stats_previous', None)
+    if previous:
+        product_id, quantity = previous
+        if (product_id, quantity) == (instance.product_id, instance.quantity):
+            return
+        product_stats.apply_sales_delta(product_id, -quantity, -1, create=False)
+    product_stats.apply_sales_delta(instance.product_id, instance.quantity, 1)
+
+
+@receiver(post_delete, sender=OrderItem)
+def remove_sales_stats(sender: type, instance: OrderItem, **kwargs: Any) -> None:
+    """
+    Вычитает удалённую позицию заказа из статистики продаж.
+    """
+    product_stats.apply_sales_delta(instance.product_id, -instance.quantity, -1, create=False)
+
+
+@receiver(pre_save, sender=Review)
+def remember_review(sender: type, instance: Review, raw: bool = False, **kwargs: Any) -> None:
+    """
+    Запоминает прежние товар и оценку отзыва.
+    """
+    instance._stats_previous = None
+    if instance.pk and not raw:
+        instance._stats_previous = (
+            Review.objects.filter(pk=instance.pk).values_list('product_id', 'rating').first()
+        )
+
+
+@receiver(post_save, sender=Review)
+def update_rating_stats(sender: type, instance: Review, raw: bool = False, **kwargs: Any) -> None:
+    """
+    Применяет новый или изменённый отзыв к статистике оценок.
+    """
+    if raw:
+        return
+    previous = getattr(instance, '_stats_previous', None)
+    if previous:
+        product_id, rating = previous
+        if (product_id, rating) == (instance.product_id, instance.rating):
+            return
+        product_stats.apply_rating_delta(product_id, rating, -1, create=False)
+    product_stats.apply_rating_delta(instance.product_id, instance.rating, 1)
+
+
+@receiver(post_delete, sender=Review)
+def remove_rating_stats(sender: type, instance: Review, **kwargs: Any) -> None:
+    """
+    Убирает удалённый отзыв из статистики оценок.
+    """
+    product_stats.apply_rating_delta(instance.product_id, instance.rating, -1, create=False)
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def touch_product_stats(sender: type, instance: Review, raw: bool = False, **kwargs: Any) -> None:
+    """
+    Отмечает изменение отзывов товара (в том числе текста без смены оценки).
+    """
+    if not raw:
+        product_stats.touch(instance.product_id)
+
+
+@receiver(pre_save, sender=ProductImage)
+def remember_image_file(sender: type, instance: ProductImage, raw: bool = False, **kwargs: Any) -> None:
+    """
+    Запоминает прежний файл изображения, чтобы не пересоздавать копии без необходимости.
+    """
+    instance._previous_image_name = None
+    if instance.pk and not raw:
+        instance._previous_image_name = (
+            ProductImage.objects.filter(pk=instance.pk).values_list('image', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=ProductImage)
+def schedule_image_renditions(sender: type, instance: ProductImage, created: bool = False, raw: bool = False, **kwargs: Any) -> None:
+    """
+    После коммита ставит построение уменьшенных копий нового или заменённого изображения.
+    """
+    if raw or not instance.image:
+        return
+    if created or instance.image.name != getattr(instance, '_previous_image_name', None):
+        image_id = instance.pk
+        transaction.on_commit(lambda: thumbnails.schedule_renditions(image_id))
+
+
+@receiver(post_delete, sender=ProductImageRendition)
+def delete_rendition_file(sender: type, instance: ProductImageRendition, **kwargs: Any) -> None:
+    """
+    Удаляет файл копии вместе с записью.
+    """
+    if instance.file:
+        instance.file.delete(save=False)
+
+
+@receiver(pre_save, sender=Product)
+@receiver(pre_save, sender=Brand)
+@receiver(pre_save, sender=Category)
+@receiver(pre_save, sender=Tag)
+@receiver(pre_delete, sender=Product)
+@receiver(pre_delete, sender=Brand)
+@receiver(pre_delete, sender=Category)
+@receiver(pre_delete, sender=Tag)
+def remember_autocomplete_versions(sender: type, instance: Any, raw: bool = False, **kwargs: Any) -> None:
+    """
+    Запоминает версии каталога до изменения записи (см. autocomplete._apply).
+    """
+    if not raw:
+        autocomplete.remember_versions()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Brand)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Tag)
+def update_autocomplete_entry(sender: type, instance: Any, raw: bool = False, **kwargs: Any) -> None:
+    """
+    Обновляет запись индекса автодополнения (после инвалидации версий выше).
+    """
+    if not raw:
+        autocomplete.update_entry(AUTOCOMPLETE_KINDS[sender], instance.pk, instance.name)
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Brand)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Tag)
+def remove_autocomplete_entry(sender: type, instance: Any, **kwargs: Any) -> None:
+    """
+    Удаляет запись из индекса автодополнения.
+    """
+    autocomplete.remove_entry(AUTOCOMPLETE_KINDS[sender], instance.pk)
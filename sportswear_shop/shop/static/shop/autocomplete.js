@@ -0,0 +1,31 @@
+// Подсказки для поля поиска: <input data-autocomplete-url="..." list="...">
+document.addEventListener('DOMContentLoaded', function() {
+  document.querySelectorAll('input[data-autocomplete-url]').forEach(function(input) {
+    var list = document.getElementById(input.getAttribute('list'));
+    var timer = null;
+    var controller = null;
+    input.addEventListener('input', function() {
+      clearTimeout(timer);
+      var query = input.value.trim();
+      if (!query) {
+        list.innerHTML = '';
+        return;
+      }
+      timer = setTimeout(function() {
+        if (controller) controller.abort();
+        controller = new AbortController();
+        fetch(input.dataset.autocompleteUrl + '?q=' + encodeURIComponent(query), {signal: controller.signal})
+          .then(function(response) { return response.json(); })
+          .then(function(data) {
+            list.innerHTML = '';
+            data.results.forEach(function(item) {
+              var option = document.createElement('option');
+              option.value = item.label;
+              list.appendChild(option);
+            });
+          })
+          .catch(function() {});
+      }, 150);
+    });
+  });
+});
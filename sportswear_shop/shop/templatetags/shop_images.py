@@ -0,0 +1,46 @@
+from typing import Any, Optional
+
+from django import template
+
+from shop.models import ProductImage
+
+register = template.Library()
+
+
+@register.inclusion_tag('shop/includes/picture.html')
+def product_picture(image: Optional[ProductImage], alt: str = '', sizes: str = '100vw',
+                    css_class: str = '', width: Optional[int] = None, height: Optional[int] = None) -> dict[str, Any]:
+    """
+    Выводит изображение товара тегом <picture> с WebP/JPEG srcset и размерами.
+
+    Копии берутся из image.renditions, поэтому во view их стоит загрузить
+    через prefetch_related('images__renditions').
+
+    Args:
+        image (Optional[ProductImage]): изображение товара.
+        alt (str): альтернативный текст.
+        sizes (str): значение атрибута sizes.
+        css_class (str): CSS-класс тега img.
+        width (Optional[int]): ширина для атрибута width (по умолчанию — исходная).
+        height (Optional[int]): высота для атрибута height (по умолчанию — по пропорциям).
+
+    Returns:
+        dict: контекст шаблона shop/includes/picture.html.
+    """
+    if image is None or not image.image:
+        return {'image': None}
+    if width and not height and image.width and image.height:
+        height = round(image.height * width / image.width)
+    renditions = list(image.renditions.all())
+    fallback = next((r for r in renditions if r.format == 'jpeg'), None)
+    return {
+        'image': image,
+        'alt': alt,
+        'sizes': sizes,
+        'css_class': css_class,
+        'src': fallback.file.url if fallback else image.image.url,
+        'webp_srcset': image.srcset('webp'),
+        'jpeg_srcset': image.srcset('jpeg'),
+        'width': width or image.width,
+        'height': height or image.height,
+    }
@@ -1,12 +1,25 @@
+from decimal import Decimal
 from django.test import TestCase, Client
 from django.urls import reverse
-from django.db import IntegrityError
+from django.db import IntegrityError, connection
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from shop.models import Product, Category, Brand
 from reviews.models import Review
 
 User = get_user_model()
 
+
+def app_queries(context) -> list[dict]:
+    """
+    Возвращает запросы приложения без служебных запросов django-silk.
+    """
+    return [
+        query for query in context.captured_queries
+        if 'silk_' not in query['sql']
+        and not query['sql'].startswith(('EXPLAIN', 'SAVEPOINT', 'RELEASE SAVEPOINT'))
+    ]
+
 class ShopTests(TestCase):
     def setUp(self) -> None:
         """
@@ -17,7 +30,7 @@ class ShopTests(TestCase):
         self.category = Category.objects.create(name='Обувь')
         self.brand = Brand.objects.create(name='Nike')
         self.product = Product.objects.create(
-            name='Кроссовки', price=1000, category=self.category, brand=self.brand
+            name='Кроссовки', price=1000, stock=10, size='M', category=self.category, brand=self.brand
         )
 
     def test_product_creation(self) -> None:
@@ -72,4 +85,1186 @@ class ShopTests(TestCase):
         review = Review.objects.create(product=self.product, user=self.user, rating=5, comment='Тест')
         url = reverse('delete_review', args=[review.pk])
         response = self.client.post(url)
-        self.assertEqual(Review.objects.count(), 0)
\ No newline at end of file
+        self.assertEqual(Review.objects.count(), 0)
+
+class ProductPaginationTests(TestCase):
+    def setUp(self) -> None:
+        """
+        Создаёт товары с одинаковой датой создания, чтобы проверить сортировку по id.
+        """
+        from django.utils import timezone
+        self.category = Category.objects.create(name='Обувь')
+        self.brand = Brand.objects.create(name='Nike')
+        created_at = timezone.now()
+        self.products = [
+            Product.objects.create(
+                name=f'Товар {i}', price=100 + i, stock=1, size='M',
+                category=self.category, brand=self.brand, created_at=created_at,
+            )
+            for i in range(7)
+        ]
+
+    def test_keyset_pages_cover_all_products_once(self):
+        from shop.pagination import KeysetPaginator
+        paginator = KeysetPaginator(page_size=3)
+        seen = []
+        cursor = None
+        while True:
+            page = paginator.paginate(Product.objects.all(), cursor)
+            seen.extend(p.pk for p in page)
+            if not page.next_cursor:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(seen, sorted((p.pk for p in self.products), reverse=True))
+
+    def test_previous_cursor_returns_previous_page(self):
+        from shop.pagination import KeysetPaginator
+        paginator = KeysetPaginator(page_size=3)
+        first = paginator.paginate(Product.objects.all())
+        second = paginator.paginate(Product.objects.all(), first.next_cursor)
+        back = paginator.paginate(Product.objects.all(), second.previous_cursor)
+        self.assertEqual([p.pk for p in back], [p.pk for p in first])
+        self.assertIsNone(back.previous_cursor)
+
+    def test_api_product_list_is_paginated(self):
+        response = self.client.get(reverse('api_product_list'), {'page_size': 5})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertIsNotNone(response.data['next'])
+        response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('api_product_list'), {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(reverse('product_list'), {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_category_page_is_paginated(self):
+        url = reverse('product_list_by_category', args=[self.category.pk])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.context['next_url'])
+        self.assertEqual(len(response.context['products']), 7)
+
+
+class ProductSearchTests(TestCase):
+    def setUp(self) -> None:
+        """
+        Создаёт товары разных брендов и тегов для проверки полнотекстового поиска.
+        """
+        from shop.models import Tag, ProductTag
+        category = Category.objects.create(name='Обувь')
+        self.nike = Brand.objects.create(name='Nike')
+        adidas = Brand.objects.create(name='Adidas')
+        self.air = Product.objects.create(
+            name='Кроссовки Air Force', description='Белые', price=9000, stock=3, size='M',
+            category=category, brand=self.nike,
+        )
+        self.boots = Product.objects.create(
+            name='Ботинки', description='Зимние кроссовки на меху', price=7000, stock=0, size='L',
+            category=category, brand=adidas,
+        )
+        ProductTag.objects.create(product=self.boots, tag=Tag.objects.create(name='зима'))
+
+    def test_search_ranks_name_matches_first(self):
+        from shop.search import search_products
+        results = list(search_products(Product.objects.all(), 'кроссовки'))
+        self.assertEqual(results, [self.air, self.boots])
+
+    def test_search_is_prefix_and_case_insensitive(self):
+        from shop.search import search_products
+        self.assertEqual(list(search_products(Product.objects.all(), 'КРОСС')), [self.air, self.boots])
+        self.assertEqual(list(search_products(Product.objects.all(), 'зим')), [self.boots])
+
+    def test_search_queries_fts_index_once(self):
+        from shop.search import search_products
+        queryset = search_products(Product.objects.filter(stock__gte=0), 'кроссовки')
+        sql = str(queryset.query)
+        self.assertEqual(sql.count('MATCH'), 1)
+        self.assertEqual(queryset.count(), 2)
+        # Курсорная пагинация фильтрует по search_rank; результат можно использовать как подзапрос
+        self.assertEqual(list(Product.objects.filter(pk__in=queryset.values('pk')).order_by('pk')),
+                         [self.air, self.boots])
+
+    def test_search_result_supports_grouping_and_facets(self):
+        from django.db.models import Count, Sum
+        from shop.search import search_products
+        queryset = search_products(Product.objects.all(), 'кроссовки')
+        self.assertEqual(queryset.aggregate(total=Sum('price'))['total'], 16000)
+        self.assertEqual(
+            {row['brand__name']: row['count'] for row in queryset.values('brand__name').annotate(count=Count('id'))},
+            {'Nike': 1, 'Adidas': 1},
+        )
+        response = self.client.get(reverse('api_product_list'), {'search': 'кроссовки', 'facets': '1'})
+        self.assertEqual(response.status_code, 200)
+        facets = response.data['facets']
+        self.assertEqual({brand['name']: brand['count'] for brand in facets['brand']}, {'Nike': 1, 'Adidas': 1})
+        self.assertEqual(facets['in_stock'], {'true': 1, 'false': 1})
+
+    def test_index_follows_brand_and_tag_changes(self):
+        from shop.search import search_products
+        self.nike.name = 'Jordan'
+        self.nike.save()
+        self.assertEqual(list(search_products(Product.objects.all(), 'jordan')), [self.air])
+        self.boots.tags.clear()
+        self.assertEqual(list(search_products(Product.objects.all(), 'зима')), [])
+
+    def test_deleted_product_leaves_index(self):
+        from shop.search import search_products
+        self.air.delete()
+        self.assertEqual(list(search_products(Product.objects.all(), 'air')), [])
+
+    def test_views_and_api_use_search(self):
+        response = self.client.get(reverse('product_list'), {'search': 'меху'})
+        self.assertEqual(list(response.context['products']), [self.boots])
+        response = self.client.get(reverse('index'), {'q': 'air'})
+        self.assertEqual(list(response.context['search_results']), [self.air])
+        response = self.client.get(reverse('api_product_list'), {'search': 'кроссовки', 'page_size': 1})
+        self.assertEqual([p['id'] for p in response.data['results']], [self.air.pk])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([p['id'] for p in response.data['results']], [self.boots.pk])
+
+
+class ProductFacetTests(TestCase):
+    def setUp(self) -> None:
+        """
+        Создаёт небольшой каталог из двух категорий и двух брендов.
+        """
+        from django.core.cache import cache
+        from shop.models import Tag, ProductTag
+        cache.clear()
+        shoes = Category.objects.create(name='Обувь')
+        bags = Category.objects.create(name='Сумки')
+        nike = Brand.objects.create(name='Nike')
+        puma = Brand.objects.create(name='Puma')
+        sale = Tag.objects.create(name='sale')
+        for name, price, stock, size, category, brand in [
+            ('A', 500, 1, 'M', shoes, nike),
+            ('B', 2000, 0, 'L', shoes, puma),
+            ('C', 12000, 4, 'M', bags, nike),
+        ]:
+            product = Product.objects.create(
+                name=name, price=price, stock=stock, size=size, category=category, brand=brand,
+            )
+            if stock:
+                ProductTag.objects.create(product=product, tag=sale)
+
+    def facets(self, **params):
+        response = self.client.get(reverse('api_product_list'), {'facets': '1', **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data['facets']
+
+    def test_facets_without_filters(self):
+        facets = self.facets()
+        self.assertEqual({c['name']: c['count'] for c in facets['category']}, {'Обувь': 2, 'Сумки': 1})
+        self.assertEqual({t['name']: t['count'] for t in facets['tag']}, {'sale': 2})
+        self.assertEqual([b['count'] for b in facets['price']], [1, 1, 0, 0, 1])
+        self.assertEqual(facets['in_stock'], {'true': 2, 'false': 1})
+
+    def test_own_facet_is_excluded(self):
+        facets = self.facets(category='Обувь', brand='Nike')
+        # Категории считаются без фильтра по категории, но с фильтром по бренду
+        self.assertEqual({c['name']: c['count'] for c in facets['category']}, {'Обувь': 1, 'Сумки': 1})
+        # Бренды считаются без фильтра по бренду, но с фильтром по категории
+        self.assertEqual({b['name']: b['count'] for b in facets['brand']}, {'Nike': 1, 'Puma': 1})
+        self.assertEqual({s['value']: s['count'] for s in facets['size']}, {'M': 1})
+
+    def test_facets_use_bounded_queries_and_cache(self):
+        from shop.facets import get_facets
+        from shop.filters import ProductFilter
+        filterset = ProductFilter(data={'size': 'M', 'brand': 'nike'}, queryset=Product.objects.all())
+        self.assertTrue(filterset.is_valid())
+        with CaptureQueriesContext(connection) as context:
+            get_facets(filterset)
+        self.assertEqual(len(app_queries(context)), 6)
+        filterset = ProductFilter(data={'brand': 'NIKE ', 'size': 'M'}, queryset=Product.objects.all())
+        self.assertTrue(filterset.is_valid())
+        with CaptureQueriesContext(connection) as context:
+            get_facets(filterset)
+        self.assertEqual(app_queries(context), [])
+
+    def test_cache_invalidated_on_product_change(self):
+        self.assertEqual(self.facets()['in_stock'], {'true': 2, 'false': 1})
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(name='B').get().delete()
+        self.assertEqual(self.facets()['in_stock'], {'true': 2, 'false': 0})
+
+
+class ProductStatsTests(TestCase):
+    def setUp(self) -> None:
+        """
+        Создаёт товар, покупателей и заказ.
+        """
+        from orders.models import Order
+        category = Category.objects.create(name='Обувь')
+        brand = Brand.objects.create(name='Nike')
+        self.product = Product.objects.create(
+            name='Кроссовки', price=1000, stock=10, size='M', category=category, brand=brand,
+        )
+        self.other = Product.objects.create(
+            name='Кеды', price=500, stock=10, size='M', category=category, brand=brand,
+        )
+        self.users = [User.objects.create_user(username=f'user{i}', password='pass') for i in range(3)]
+        self.order = Order.objects.create(user=self.users[0])
+
+    def stats(self, product=None):
+        from shop.models import ProductStats
+        return ProductStats.objects.get(pk=(product or self.product).pk)
+
+    def test_sales_follow_order_items(self):
+        from orders.models import OrderItem
+        item = OrderItem.objects.create(order=self.order, product=self.product, quantity=2, price=1000)
+        OrderItem.objects.create(order=self.order, product=self.product, quantity=1, price=1000)
+        self.assertEqual((self.stats().units_sold, self.stats().order_count), (3, 2))
+        item.quantity = 5
+        item.save()
+        self.assertEqual((self.stats().units_sold, self.stats().order_count), (6, 2))
+        item.product = self.other
+        item.save()
+        self.assertEqual((self.stats().units_sold, self.stats().order_count), (1, 1))
+        self.assertEqual((self.stats(self.other).units_sold, self.stats(self.other).order_count), (5, 1))
+        self.order.delete()
+        self.assertEqual((self.stats().units_sold, self.stats(self.other).units_sold), (0, 0))
+
+    def test_ratings_follow_reviews(self):
+        first = Review.objects.create(product=self.product, user=self.users[0], rating=5, comment='A')
+        Review.objects.create(product=self.product, user=self.users[1], rating=2, comment='B')
+        stats = self.stats()
+        self.assertEqual(stats.review_count, 2)
+        self.assertAlmostEqual(stats.average_rating, 3.5)
+        self.assertEqual(stats.rating_histogram, [0, 1, 0, 0, 1])
+        first.rating = 4
+        first.save()
+        self.assertEqual(self.stats().rating_histogram, [0, 1, 0, 1, 0])
+        first.delete()
+        Review.objects.filter(user=self.users[1]).delete()
+        stats = self.stats()
+        self.assertEqual((stats.review_count, stats.average_rating), (0, 0))
+
+    def test_rebuild_matches_incremental_updates(self):
+        from orders.models import OrderItem
+        from shop import product_stats
+        from shop.models import ProductStats
+        OrderItem.objects.create(order=self.order, product=self.product, quantity=3, price=1000)
+        Review.objects.create(product=self.product, user=self.users[2], rating=4, comment='C')
+        expected = list(ProductStats.objects.order_by('pk').values_list(
+            'units_sold', 'order_count', 'review_count', 'average_rating', 'rating_4'))
+        ProductStats.objects.all().delete()
+        self.assertEqual(product_stats.rebuild(batch_size=1), 2)
+        actual = list(ProductStats.objects.order_by('pk').values_list(
+            'units_sold', 'order_count', 'review_count', 'average_rating', 'rating_4'))
+        self.assertEqual(actual, expected)
+
+    def test_index_ranks_popular_by_stats(self):
+        from orders.models import OrderItem
+        OrderItem.objects.create(order=self.order, product=self.other, quantity=1, price=500)
+        response = self.client.get(reverse('index'))
+        self.assertEqual(list(response.context['popular_products'])[0], self.other)
+
+
+class HomepageCacheTests(TestCase):
+    def setUp(self) -> None:
+        """
+        Очищает кеш и создаёт товар и скидку.
+        """
+        from django.core.cache import cache
+        from django.utils import timezone
+        from discounts.models import Discount
+        cache.clear()
+        category = Category.objects.create(name='Обувь')
+        self.brand = Brand.objects.create(name='Nike')
+        self.product = Product.objects.create(
+            name='Кроссовки', price=1000, stock=10, size='M', category=category, brand=self.brand,
+        )
+        self.discount = Discount.objects.create(
+            name='Лето', discount_percent=10, start_date=timezone.now(), end_date=timezone.now(),
+        )
+
+    def test_blocks_are_served_from_cache(self):
+        from shop.homepage import get_homepage_context
+        get_homepage_context()
+        with CaptureQueriesContext(connection) as context:
+            blocks = get_homepage_context()
+        self.assertEqual(app_queries(context), [])
+        self.assertEqual(blocks['new_products'], [self.product])
+        self.assertEqual(blocks['active_discounts'], [self.discount])
+
+    def test_discount_change_keeps_product_blocks(self):
+        from shop.homepage import block_key
+        product_keys = [block_key(name) for name in ('new_products', 'popular_products', 'avg_price')]
+        discounts_key = block_key('active_discounts')
+        self.discount.discount_percent = 20
+        with self.captureOnCommitCallbacks(execute=True):
+            self.discount.save()
+        self.assertEqual([block_key(name) for name in ('new_products', 'popular_products', 'avg_price')], product_keys)
+        self.assertNotEqual(block_key('active_discounts'), discounts_key)
+
+    def test_product_change_invalidates_product_blocks_only(self):
+        from shop.homepage import block_key
+        categories_key = block_key('categories')
+        new_key = block_key('new_products')
+        self.product.price = 2000
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        self.assertNotEqual(block_key('new_products'), new_key)
+        self.assertEqual(block_key('categories'), categories_key)
+
+    def test_version_is_bumped_after_commit_only(self):
+        from django.db import transaction
+        from shop import cache as shop_cache
+        version = shop_cache.get_version(shop_cache.PRODUCTS)
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.product.save()
+            raise RuntimeError
+        self.assertEqual(shop_cache.get_version(shop_cache.PRODUCTS), version)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+            # До фиксации промах кеша не может сохранить старые данные под новой версией
+            self.assertEqual(shop_cache.get_version(shop_cache.PRODUCTS), version)
+        self.assertNotEqual(shop_cache.get_version(shop_cache.PRODUCTS), version)
+
+    def test_concurrent_miss_waits_for_lock_holder(self):
+        from django.core.cache import cache
+        from shop.cache import get_or_set_coalesced
+        calls = []
+        cache.add('test:block:lock', 1)
+        # Владелец блокировки не успел: значение считается без записи в кеш
+        self.assertEqual(get_or_set_coalesced('test:block', lambda: calls.append(1) or 'fresh', 60, wait=0.1), 'fresh')
+        self.assertIsNone(cache.get('test:block'))
+        cache.delete('test:block:lock')
+        cache.set('test:block', 'cached')
+        self.assertEqual(get_or_set_coalesced('test:block', lambda: calls.append(1), 60), 'cached')
+        self.assertEqual(len(calls), 1)
+
+
+class CatalogStatisticsTests(TestCase):
+    def setUp(self) -> None:
+        """
+        Создаёт товары в двух категориях.
+        """
+        from django.core.cache import cache
+        cache.clear()
+        shoes = Category.objects.create(name='Обувь')
+        bags = Category.objects.create(name='Сумки')
+        brand = Brand.objects.create(name='Nike')
+        for name, price, stock, category in [
+            ('Кроссовки', 6000, 2, shoes), ('Кеды', 2000, 0, shoes), ('Рюкзак', 3000, 5, bags),
+        ]:
+            Product.objects.create(name=name, price=price, stock=stock, size='M', category=category, brand=brand)
+
+    def test_summary_is_one_query_and_respects_filters(self):
+        from shop.catalog_stats import CatalogStatistics
+        stats = CatalogStatistics(Product.objects.filter(category__name='Обувь'), ('', 'обувь'))
+        with CaptureQueriesContext(connection) as context:
+            summary = (stats.count, stats.avg_price, stats.total_stock,
+                       stats.expensive_count, stats.available_count, stats.category_counts)
+        self.assertEqual(len(app_queries(context)), 1)
+        self.assertEqual(summary[:5], (2, Decimal('4000.00'), 2, 1, 1))
+        self.assertEqual(summary[5], [{'category__name': 'Обувь', 'count': 2}])
+
+    def test_summary_is_cached_per_filter_key(self):
+        from shop.catalog_stats import CatalogStatistics
+        CatalogStatistics(Product.objects.all(), ('', '')).count
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(CatalogStatistics(Product.objects.all(), ('', '')).count, 3)
+        self.assertEqual(app_queries(context), [])
+        self.assertEqual(CatalogStatistics(Product.objects.filter(stock=0), ('', 'x')).count, 1)
+
+    def test_product_list_does_not_evaluate_unused_sublists(self):
+        response = self.client.get(reverse('product_list'), {'search': 'кроссовки'})
+        stats = response.context['catalog_stats']
+        self.assertEqual(stats.count, 1)
+        self.assertNotIn('expensive_products', stats.__dict__)
+        self.assertEqual(list(stats.expensive_products.values_list('name', flat=True)), ['Кроссовки'])
+
+
+class ImageRenditionTests(TestCase):
+    def setUp(self) -> None:
+        """
+        Создаёт товар и временный каталог для медиафайлов.
+        """
+        import shutil
+        import tempfile
+        from django.test import override_settings
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(
+            MEDIA_ROOT=media_root, PRODUCT_IMAGE_WORKERS=0, PRODUCT_IMAGE_RENDITION_WIDTHS=(320, 640, 1024),
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.product = Product.objects.create(
+            name='Кроссовки', price=1000, stock=10, size='M',
+            category=Category.objects.create(name='Обувь'), brand=Brand.objects.create(name='Nike'),
+        )
+
+    def make_upload(self, width: int = 800, height: int = 400):
+        import io
+        from PIL import Image
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        buffer = io.BytesIO()
+        Image.new('RGBA', (width, height), (200, 30, 30, 128)).save(buffer, 'PNG')
+        return SimpleUploadedFile('shoe.png', buffer.getvalue(), content_type='image/png')
+
+    def test_upload_generates_renditions_without_upscaling(self):
+        from shop.models import ProductImage
+        with self.captureOnCommitCallbacks(execute=True):
+            image = ProductImage.objects.create(product=self.product, image=self.make_upload())
+        self.assertEqual((image.width, image.height), (800, 400))
+        renditions = list(image.renditions.order_by('format', 'width'))
+        self.assertEqual([(r.format, r.width, r.height) for r in renditions],
+                         [('jpeg', 320, 160), ('jpeg', 640, 320), ('webp', 320, 160), ('webp', 640, 320)])
+        for rendition in renditions:
+            self.assertEqual(rendition.size, rendition.file.size)
+        self.assertIn(' 640w', image.srcset('webp'))
+
+    def test_replacing_image_regenerates_renditions(self):
+        from shop.models import ProductImageRendition, ProductImage
+        with self.captureOnCommitCallbacks(execute=True):
+            image = ProductImage.objects.create(product=self.product, image=self.make_upload())
+        old_files = [r.file.path for r in image.renditions.all()]
+        with self.captureOnCommitCallbacks(execute=True):
+            image.image = self.make_upload(200, 100)
+            image.save()
+        self.assertEqual(set(image.renditions.values_list('width', flat=True)), {200})
+        self.assertEqual(ProductImageRendition.objects.count(), 2)
+        import os
+        self.assertFalse(any(os.path.exists(path) for path in old_files))
+
+    def test_detail_page_renders_picture_element(self):
+        from shop.models import ProductImage
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductImage.objects.create(product=self.product, image=self.make_upload())
+        response = self.client.get(reverse('product_detail', args=[self.product.pk]))
+        self.assertContains(response, '<source type="image/webp"')
+        self.assertContains(response, 'loading="lazy"')
+        api = self.client.get(reverse('api_product_detail', args=[self.product.pk]))
+        self.assertEqual(len(api.json()['images'][0]['renditions']), 4)
+
+
+class FavoriteLookupTests(TestCase):
+    def setUp(self) -> None:
+        """
+        Создаёт пользователя и несколько товаров, часть из них — в избранном.
+        """
+        self.user = User.objects.create_user(username='fan', password='pass')
+        category = Category.objects.create(name='Обувь')
+        brand = Brand.objects.create(name='Nike')
+        self.products = [
+            Product.objects.create(name=f'Товар {i}', price=100 + i, stock=1, size='M', category=category, brand=brand)
+            for i in range(6)
+        ]
+        self.user.favorite_products.add(self.products[0], self.products[3])
+
+    def test_list_loads_favorites_once_per_page(self):
+        self.client.login(username='fan', password='pass')
+        url = reverse('api_product_list')
+        self.client.get(url, {'page_size': 2})
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(url, {'page_size': 2})
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(url)
+        self.assertEqual(len(app_queries(small)), len(app_queries(large)))
+        favorites = {item['id'] for item in response.json()['results'] if item['is_favorite']}
+        self.assertEqual(favorites, {self.products[0].pk, self.products[3].pk})
+
+    def test_detail_and_anonymous(self):
+        self.client.login(username='fan', password='pass')
+        detail = self.client.get(reverse('api_product_detail', args=[self.products[3].pk]))
+        self.assertTrue(detail.json()['is_favorite'])
+        self.client.logout()
+        response = self.client.get(reverse('api_product_list'))
+        self.assertFalse(any(item['is_favorite'] for item in response.json()['results']))
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self) -> None:
+        """
+        Создаёт товар и пользователя; кеш версий очищается.
+        """
+        from django.core.cache import cache
+        cache.clear()
+        self.user = User.objects.create_user(username='fan', password='pass')
+        self.category = Category.objects.create(name='Обувь')
+        self.product = Product.objects.create(
+            name='Кроссовки', price=1000, stock=1, size='M', category=self.category, brand=Brand.objects.create(name='Nike'),
+        )
+
+    def revalidate(self, url: str, response):
+        with CaptureQueriesContext(connection) as context:
+            second = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        return second, app_queries(context)
+
+    def test_api_list_returns_304_without_querying(self):
+        url = reverse('api_product_list')
+        first = self.client.get(url)
+        self.assertIn('ETag', first)
+        self.assertIn('Last-Modified', first)
+        second, queries = self.revalidate(url, first)
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(queries, [])
+        modified = self.client.get(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(modified.status_code, 304)
+
+    def test_catalog_changes_invalidate_etag(self):
+        from django.utils import timezone
+        from discounts.models import Discount
+        url = reverse('api_product_list')
+        now = timezone.now()
+        for change in (
+            self.product.save,
+            self.category.save,
+            lambda: Discount.objects.create(name='Скидка', discount_percent=10, start_date=now, end_date=now),
+        ):
+            first = self.client.get(url)
+            with self.captureOnCommitCallbacks(execute=True):
+                change()
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+
+    def test_discount_expiry_invalidates_etag(self):
+        from datetime import timedelta
+        from unittest import mock
+        from django.utils import timezone
+        from discounts.models import Discount
+        now = timezone.now()
+        sale = Discount.objects.create(name='Скидка', discount_percent=10, start_date=now - timedelta(days=1),
+                                       end_date=now + timedelta(hours=1))
+        sale.products.add(self.product)
+        for url in (reverse('api_product_detail', args=[self.product.pk]), reverse('api_product_list')):
+            with self.subTest(url=url):
+                first = self.client.get(url)
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+                # Скидка заканчивается без правок: валидаторы устаревают сами
+                with mock.patch('django.utils.timezone.now', return_value=now + timedelta(hours=2)):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'],
+                                               HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+                self.assertEqual(response.status_code, 200)
+                data = response.json()
+                product = data if 'discounted_price' in data else data['results'][0]
+                self.assertEqual((product['discount'], product['discounted_price']), (None, '1000.00'))
+
+    def test_api_detail_and_favorites(self):
+        self.client.login(username='fan', password='pass')
+        url = reverse('api_product_detail', args=[self.product.pk])
+        first = self.client.get(url)
+        second, queries = self.revalidate(url, first)
+        self.assertEqual(second.status_code, 304)
+        self.assertLessEqual(len(queries), 3, queries)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.favorite_products.add(self.product)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+        self.assertEqual(self.client.get(reverse('api_product_detail', args=[999999])).status_code, 404)
+
+    def test_html_pages_are_conditional_for_anonymous_only(self):
+        url = reverse('product_detail', args=[self.product.pk])
+        first = self.client.get(url)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+        Review.objects.create(product=self.product, user=self.user, rating=5, comment='Отлично')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+        list_url = reverse('product_list')
+        first = self.client.get(list_url)
+        self.assertEqual(self.client.get(list_url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+        self.client.login(username='fan', password='pass')
+        response = self.client.get(list_url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+
+
+class ProductImportTests(TestCase):
+    CSV = (
+        'sku;name;price;stock;size;category;brand;tags\n'
+        'A-1;Кроссовки беговые;4999,90;5;M;Обувь;nike;бег, лето\n'
+        'A-2;Рюкзак;2500;0;Large;Сумки;Adidas;\n'
+        'A-3;Без цены;;1;M;Обувь;Nike;\n'
+        'A-4;Футболка;abc;1;M;Одежда;Nike;\n'
+        'A-5;Шорты;900;1;XXL;Одежда;Nike;\n'
+    )
+
+    def setUp(self) -> None:
+        """
+        Создаёт существующие бренд и категорию, которые файл должен переиспользовать.
+        """
+        self.brand = Brand.objects.create(name='Nike')
+        self.category = Category.objects.create(name='Обувь')
+
+    def run_import(self, content: str, batch_size: int = 2):
+        import io
+        from shop.importer import import_products
+        return import_products(io.BytesIO(content.encode('utf-8')), 'csv', batch_size=batch_size)
+
+    def test_csv_import_creates_products_and_reports_row_errors(self):
+        result = self.run_import(self.CSV)
+        self.assertEqual((result.rows, result.created, result.updated), (5, 2, 0))
+        self.assertEqual([error.line for error in result.errors], [4, 5, 6])
+        shoes = Product.objects.get(sku='A-1')
+        self.assertEqual(shoes.price, Decimal('4999.90'))
+        self.assertEqual(shoes.brand, self.brand)
+        self.assertEqual(shoes.category, self.category)
+        self.assertEqual(sorted(shoes.tags.values_list('name', flat=True)), ['бег', 'лето'])
+        self.assertEqual(Product.objects.get(sku='A-2').size, 'L')
+        self.assertTrue(Brand.objects.filter(name='Adidas').exists())
+        self.assertEqual(Brand.objects.filter(name__iexact='nike').count(), 1)
+        self.assertTrue(hasattr(shoes, 'stats'))
+        from shop.search import search_products
+        self.assertIn(shoes, search_products(Product.objects.all(), 'беговые'))
+
+    def test_reimport_updates_by_sku_in_batches(self):
+        self.run_import(self.CSV)
+        with CaptureQueriesContext(connection) as context:
+            result = self.run_import(
+                'sku,name,price,stock,size,category,brand,tags\n'
+                'A-1,Кроссовки беговые,3999.00,7,M,Обувь,Nike,бег\n'
+                'A-2,Рюкзак,2500,3,L,Сумки,Adidas,\n'
+                'A-6,Кепка,500,3,S,Аксессуары,Puma,\n',
+                batch_size=100,
+            )
+        self.assertEqual((result.created, result.updated, result.errors), (1, 2, []))
+        shoes = Product.objects.get(sku='A-1')
+        self.assertEqual((shoes.price, shoes.stock), (Decimal('3999.00'), 7))
+        self.assertEqual(list(shoes.tags.values_list('name', flat=True)), ['бег'])
+        self.assertEqual(Product.objects.count(), 3)
+        self.assertLess(len(app_queries(context)), 30)
+
+    def test_reimport_replaces_tags_without_per_row_signals(self):
+        from unittest import mock
+        from shop import cache as shop_cache
+        self.run_import(self.CSV, batch_size=100)
+        with CaptureQueriesContext(connection) as context, \
+                mock.patch.object(shop_cache, 'bump_version', wraps=shop_cache.bump_version) as bump:
+            self.run_import(self.CSV.replace('бег, лето', 'зал'), batch_size=100)
+        fts_writes = [query for query in app_queries(context) if query['sql'].startswith('INSERT INTO shop_product_fts')]
+        self.assertEqual(len(fts_writes), 1)
+        self.assertEqual(bump.call_count, 1)
+        self.assertEqual(list(Product.objects.get(sku='A-1').tags.values_list('name', flat=True)), ['зал'])
+
+    def test_reimport_without_optional_columns_keeps_existing_values(self):
+        self.run_import(
+            'sku;name;description;price;stock;size;category;brand;tags;external_page\n'
+            'A-1;Кроссовки;Лёгкие;4999;5;M;Обувь;Nike;бег, лето;https://example.com/a-1\n'
+        )
+        result = self.run_import('sku;name;price;stock;size;category;brand\nA-1;Кроссовки;3999;2;M;Обувь;Nike\n')
+        self.assertEqual((result.updated, result.errors), (1, []))
+        shoes = Product.objects.get(sku='A-1')
+        self.assertEqual((shoes.price, shoes.stock), (Decimal('3999.00'), 2))
+        self.assertEqual((shoes.description, shoes.external_page), ('Лёгкие', 'https://example.com/a-1'))
+        self.assertEqual(sorted(shoes.tags.values_list('name', flat=True)), ['бег', 'лето'])
+
+    def test_xlsx_import_and_command(self):
+        import io
+        import os
+        import tempfile
+        from django.core.management import call_command
+        from openpyxl import Workbook
+        workbook = Workbook()
+        workbook.active.append(['SKU', 'Name', 'Price', 'Stock', 'Size', 'Category', 'Brand'])
+        workbook.active.append(['X-1', 'Мяч', 1200.5, 4, 'S', 'Инвентарь', 'Nike'])
+        with tempfile.NamedTemporaryFile(suffix='.xlsx', delete=False) as file:
+            workbook.save(file)
+        self.addCleanup(os.unlink, file.name)
+        out = io.StringIO()
+        call_command('import_products', file.name, stdout=out, stderr=io.StringIO())
+        self.assertIn('создано: 1', out.getvalue())
+        self.assertEqual(Product.objects.get(sku='X-1').price, Decimal('1200.50'))
+
+    def test_admin_import_view(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        User.objects.create_superuser(username='admin', password='pass', email='admin@example.com')
+        self.client.login(username='admin', password='pass')
+        url = reverse('admin:shop_product_import')
+        self.assertContains(self.client.get(reverse('admin:shop_product_changelist')), url)
+        self.assertEqual(self.client.get(url).status_code, 200)
+        upload = SimpleUploadedFile('goods.csv', self.CSV.encode('utf-8'), content_type='text/csv')
+        response = self.client.post(url, {'file': upload, 'batch_size': 1000})
+        self.assertRedirects(response, reverse('admin:shop_product_changelist'))
+        self.assertEqual(Product.objects.filter(sku__isnull=False).count(), 2)
+
+
+class ProductExportTests(TestCase):
+    def setUp(self) -> None:
+        """
+        Создаёт несколько товаров с тегами.
+        """
+        from shop.models import Tag
+        category = Category.objects.create(name='Обувь')
+        brand = Brand.objects.create(name='Nike')
+        tag = Tag.objects.create(name='бег')
+        self.products = []
+        for i in range(5):
+            product = Product.objects.create(
+                name=f'Товар {i}', description='Описание, с запятой', price=Decimal('100.50') + i, stock=i,
+                size='M', category=category, brand=brand, sku=f'S-{i}',
+            )
+            product.tags.add(tag)
+            self.products.append(product)
+
+    def read(self, response) -> bytes:
+        return b''.join(response.streaming_content)
+
+    def test_ndjson_export_streams_in_chunks(self):
+        import json
+        url = reverse('api_product_export', args=['ndjson'])
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, {'chunk_size': 2})
+            body = self.read(response)
+        self.assertTrue(response.streaming)
+        records = [json.loads(line) for line in body.decode('utf-8').splitlines()]
+        self.assertEqual([record['sku'] for record in records], [f'S-{i}' for i in range(5)])
+        self.assertEqual(records[0]['price'], '100.50')
+        self.assertEqual(records[0]['category'], 'Обувь')
+        self.assertEqual(records[0]['tags'], ['бег'])
+        # Товары читаются одним курсором, изображения и теги — по запросу на пачку из трёх
+        self.assertLessEqual(len(app_queries(context)), 1 + 2 * 3)
+
+    def test_csv_export_with_gzip(self):
+        import csv
+        import gzip
+        import io
+        url = reverse('api_product_export', args=['csv'])
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        rows = list(csv.DictReader(io.StringIO(gzip.decompress(self.read(response)).decode('utf-8'))))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]['description'], 'Описание, с запятой')
+        self.assertEqual(self.client.get(reverse('api_product_export', args=['xml'])).status_code, 404)
+
+    def test_export_is_get_only(self):
+        url = reverse('api_product_export', args=['csv'])
+        self.assertEqual(self.client.post(url, HTTP_ACCEPT_ENCODING='gzip').status_code, 405)
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Content-Encoding', response)
+        self.assertFalse(self.read(response).startswith(b'\x1f\x8b'))
+
+    def test_export_respects_refused_gzip(self):
+        url = reverse('api_product_export', args=['csv'])
+        for header, compressed in (('gzip;q=0, deflate', False), ('GZIP; q=0.5', True), ('*', True),
+                                   ('*;q=0, identity', False), ('deflate', False), ('', False)):
+            with self.subTest(header=header):
+                response = self.client.get(url, HTTP_ACCEPT_ENCODING=header)
+                self.assertEqual(response.get('Content-Encoding') == 'gzip', compressed)
+                self.assertIn('Accept-Encoding', response['Vary'])
+                body = self.read(response)
+                self.assertEqual(body.startswith(b'\x1f\x8b'), compressed)
+
+    def test_export_command_writes_file(self):
+        import gzip
+        import io
+        import os
+        import tempfile
+        from django.core.management import call_command
+        path = os.path.join(tempfile.mkdtemp(), 'catalog.ndjson.gz')
+        self.addCleanup(os.unlink, path)
+        call_command('export_products', path, '--gzip', stdout=io.StringIO())
+        with gzip.open(path, 'rt', encoding='utf-8') as file:
+            self.assertEqual(len(file.readlines()), 5)
+
+
+class SparseFieldsetTests(TestCase):
+    def setUp(self) -> None:
+        """
+        Создаёт пользователя, товары, отзыв и заказ.
+        """
+        from orders.models import Order, OrderItem
+        self.user = User.objects.create_user(username='fan', password='pass')
+        category = Category.objects.create(name='Обувь')
+        brand = Brand.objects.create(name='Nike')
+        self.products = [
+            Product.objects.create(name=f'Товар {i}', description='Длинное описание', price=100 + i, stock=1,
+                                   size='M', category=category, brand=brand)
+            for i in range(4)
+        ]
+        Review.objects.create(product=self.products[0], user=self.user, rating=5, comment='Отлично')
+        order = Order.objects.create(user=self.user, total_price=300, discounted_total=300)
+        for product in self.products[:3]:
+            OrderItem.objects.create(order=order, product=product, quantity=1, price=product.price)
+        self.client.login(username='fan', password='pass')
+
+    def get(self, url: str, params: dict):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, params)
+        queries = [query['sql'] for query in app_queries(context)]
+        return response.json(), queries
+
+    def test_lean_product_list_selects_only_requested_columns(self):
+        data, queries = self.get(reverse('api_product_list'), {'fields': 'id,name,price'})
+        self.assertEqual(set(data['results'][0]), {'id', 'name', 'price'})
+        product_queries = [sql for sql in queries if 'FROM "shop_product"' in sql]
+        self.assertEqual(len(product_queries), 1)
+        self.assertNotIn('description', product_queries[0])
+        self.assertFalse(any('shop_productimage' in sql or 'favorite_products' in sql for sql in queries))
+
+    def test_default_fields_and_expand(self):
+        data, _ = self.get(reverse('api_product_list'), {})
+        self.assertEqual(set(data['results'][0]),
+                         {'id', 'name', 'price', 'stock', 'category', 'brand', 'images', 'is_favorite',
+                          'discount', 'discounted_price'})
+        self.assertIsInstance(data['results'][0]['category'], int)
+        data, queries = self.get(reverse('api_product_list'), {'expand': 'category,brand', 'fields': 'id,category,brand.name'})
+        self.assertEqual(data['results'][0]['category'], {'id': self.products[0].category_id, 'name': 'Обувь'})
+        self.assertEqual(data['results'][0]['brand'], {'name': 'Nike'})
+        self.assertEqual(len([sql for sql in queries if 'shop_category' in sql]), 1)
+
+    def test_product_detail_fields(self):
+        data, _ = self.get(reverse('api_product_detail', args=[self.products[1].pk]), {'fields': 'id,is_favorite'})
+        self.assertEqual(data, {'id': self.products[1].pk, 'is_favorite': False})
+
+    def test_orders_nested_fields_have_constant_queries(self):
+        data, queries = self.get(reverse('api_order_list'), {'fields': 'id,items.quantity,items.product.name'})
+        self.assertEqual(data[0]['items'][0], {'quantity': 1, 'product': {'name': self.products[0].name}})
+        # Заказы и позиции с товарами (select_related) — по одному запросу
+        self.assertEqual(len([sql for sql in queries if 'orders_' in sql]), 2)
+        data, _ = self.get(reverse('api_order_list'), {})
+        self.assertIn('can_cancel', data[0])
+        self.assertIn('images', data[0]['items'][0]['product'])
+
+    def test_reviews_expand_user_and_product(self):
+        data, _ = self.get(reverse('api_review_list_create'),
+                           {'expand': 'user,product', 'fields': 'id,user.username,product.name'})
+        self.assertEqual(data[0]['user'], {'username': 'fan'})
+        self.assertEqual(data[0]['product'], {'name': self.products[0].name})
+
+
+class AutocompleteTests(TestCase):
+    def setUp(self) -> None:
+        """
+        Создаёт каталог с продажами и строит индекс автодополнения.
+        """
+        from orders.models import Order, OrderItem
+        from shop import autocomplete
+        from shop.models import Tag
+        self.addCleanup(autocomplete.reset)
+        autocomplete.reset()
+        user = User.objects.create_user(username='buyer', password='pass')
+        self.category = Category.objects.create(name='Кроссовки')
+        self.brand = Brand.objects.create(name='Nike')
+        Tag.objects.create(name='кросс-кантри')
+        self.runner = Product.objects.create(name='Кроссовки беговые', price=100, stock=5, size='M',
+                                             category=self.category, brand=self.brand)
+        self.court = Product.objects.create(name='Кроссовки для зала', price=100, stock=5, size='M',
+                                            category=self.category, brand=self.brand)
+        self.hedgehog = Product.objects.create(name='Ёжик-брелок', price=10, stock=5, size='S',
+                                               category=self.category, brand=self.brand)
+        order = Order.objects.create(user=user, total_price=0, discounted_total=0)
+        OrderItem.objects.create(order=order, product=self.court, quantity=5, price=100)
+        autocomplete.build()
+
+    def labels(self, query: str, **params) -> list[str]:
+        response = self.client.get(reverse('api_autocomplete'), {'q': query, **params})
+        return [item['label'] for item in response.json()['results']]
+
+    def test_prefix_case_and_word_matching_ranked_by_popularity(self):
+        from shop import autocomplete
+        self.assertEqual(
+            self.labels('КРОС'),
+            ['Кроссовки', 'Кроссовки для зала', 'кросс-кантри', 'Кроссовки беговые'],
+        )
+        self.assertEqual(self.labels('бег'), ['Кроссовки беговые'])
+        self.assertEqual(self.labels('ежик'), ['Ёжик-брелок'])
+        self.assertEqual(self.labels('тшл'), ['Nike'])
+        self.assertEqual(self.labels('крос', limit=2), ['Кроссовки', 'Кроссовки для зала'])
+        self.assertEqual(autocomplete.normalize('  Кросс-Кантри  Ё '), 'кросс кантри е')
+
+    def test_lookup_does_not_query_database(self):
+        self.labels('кр')
+        with CaptureQueriesContext(connection) as context:
+            self.labels('кросс')
+        self.assertEqual(app_queries(context), [])
+
+    def test_signals_update_index_incrementally(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.runner.name = 'Шиповки беговые'
+            self.runner.save()
+            Brand.objects.create(name='Asics')
+            self.hedgehog.delete()
+        self.assertEqual(self.labels('шип'), ['Шиповки беговые'])
+        self.assertNotIn('Кроссовки беговые', self.labels('крос'))
+        self.assertEqual(self.labels('as'), ['Asics'])
+        self.assertEqual(self.labels('еж'), [])
+
+    def test_local_change_does_not_mark_foreign_changes_synced(self):
+        from shop import autocomplete
+        from shop import cache as shop_cache
+        index = autocomplete.get_index()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.brand.save()
+        synced = index.synced_versions
+        self.assertEqual(synced, shop_cache.get_versions(*autocomplete.SYNC_NAMESPACES))
+        # Другой процесс изменил каталог: локальное изменение не должно скрыть это
+        shop_cache.bump_version(shop_cache.PRODUCTS)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.runner.name = 'Шиповки беговые'
+            self.runner.save()
+        self.assertEqual(index.synced_versions, synced)
+        self.assertNotEqual(index.synced_versions, shop_cache.get_versions(*autocomplete.SYNC_NAMESPACES))
+
+    def test_rolled_back_change_does_not_reach_index(self):
+        from django.db import transaction
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self.runner.name = 'Шиповки беговые'
+                    self.runner.save()
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(self.labels('шип'), [])
+        self.assertIn('Кроссовки беговые', self.labels('крос'))
+
+    def test_short_prefix_top_is_kept_up_to_date(self):
+        from shop import autocomplete
+        index = autocomplete.get_index()
+        self.assertEqual(self.labels('к', limit=2), ['Кроссовки', 'Кроссовки для зала'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.court.delete()
+            Category.objects.create(name='Кепки')
+        self.assertIs(autocomplete.get_index(), index)
+        self.assertEqual(self.labels('к'), ['Кроссовки', 'Кепки', 'кросс-кантри', 'Кроссовки беговые'])
+        self.assertEqual(self.labels('ке'), ['Кепки'])
+
+
+class RecommendationTests(TestCase):
+    def setUp(self) -> None:
+        """
+        Создаёт товары и заказы с совместными покупками.
+        """
+        category = Category.objects.create(name='Обувь')
+        brand = Brand.objects.create(name='Nike')
+        self.user = User.objects.create_user(username='buyer', password='pass')
+        self.shoes, self.socks, self.laces, self.cap = [
+            Product.objects.create(name=name, price=100, stock=10, size='M', category=category, brand=brand)
+            for name in ('Кроссовки', 'Носки', 'Шнурки', 'Кепка')
+        ]
+        self.order([self.shoes, self.socks, self.laces])
+        self.order([self.shoes, self.socks])
+        self.order([self.cap])
+
+    def order(self, products):
+        from orders.models import Order, OrderItem
+        order = Order.objects.create(user=self.user, total_price=0, discounted_total=0)
+        for product in products:
+            OrderItem.objects.create(order=order, product=product, quantity=1, price=product.price)
+        return order
+
+    def recommended(self, product):
+        from shop.models import ProductRecommendation
+        return list(ProductRecommendation.objects.filter(product=product)
+                    .values_list('recommended_id', 'score', 'rank'))
+
+    def test_full_run_builds_ranked_top_k(self):
+        from shop import recommendations
+        record = recommendations.run(full=True, top_k=2)
+        self.assertEqual((record.orders_processed, record.products_updated), (3, 3))
+        self.assertEqual(self.recommended(self.shoes), [(self.socks.pk, 2, 1), (self.laces.pk, 1, 2)])
+        self.assertEqual(self.recommended(self.laces), [(self.shoes.pk, 1, 1), (self.socks.pk, 1, 2)])
+        self.assertEqual(self.recommended(self.cap), [])
+
+    def test_incremental_run_processes_only_new_orders(self):
+        from shop import recommendations
+        recommendations.run(full=True)
+        self.order([self.cap, self.laces])
+        self.order([self.cap, self.laces])
+        record = recommendations.run()
+        self.assertEqual((record.orders_processed, record.products_updated), (2, 2))
+        self.assertEqual(self.recommended(self.laces)[0], (self.cap.pk, 2, 1))
+        self.assertEqual(self.recommended(self.shoes), [(self.socks.pk, 2, 1), (self.laces.pk, 1, 2)])
+        self.assertEqual(recommendations.run().orders_processed, 0)
+
+    def test_served_ids_are_cached_until_next_run(self):
+        from shop import recommendations
+        recommendations.run(full=True)
+        self.assertEqual(recommendations.get_recommended_ids(self.shoes.pk), [self.socks.pk, self.laces.pk])
+        with CaptureQueriesContext(connection) as context:
+            recommendations.get_recommended_ids(self.shoes.pk)
+        self.assertEqual(app_queries(context), [])
+        self.order([self.shoes, self.cap])
+        self.order([self.shoes, self.cap])
+        self.order([self.shoes, self.cap])
+        recommendations.run()
+        self.assertEqual(recommendations.get_recommended_ids(self.shoes.pk)[0], self.cap.pk)
+
+    def test_detail_page_and_api_show_recommendations(self):
+        from shop import recommendations
+        recommendations.run(full=True)
+        response = self.client.get(reverse('product_detail', args=[self.shoes.pk]))
+        self.assertEqual(response.context['recommendations'], [self.socks, self.laces])
+        self.assertContains(response, 'Часто покупают вместе')
+        response = self.client.get(reverse('api_product_recommendations', args=[self.shoes.pk]),
+                                   {'fields': 'id,name'})
+        self.assertEqual(response.json(), [
+            {'id': self.socks.pk, 'name': 'Носки'}, {'id': self.laces.pk, 'name': 'Шнурки'},
+        ])
+        missing = self.client.get(reverse('api_product_recommendations', args=[0]))
+        self.assertEqual(missing.status_code, 404)
+
+
+class QueryPlanTests(TestCase):
+    """
+    Регрессионные тесты планов запросов каталога (EXPLAIN QUERY PLAN в SQLite).
+
+    Каждая страница запрашивается дважды: кеши прогреваются, и проверяются
+    только запросы, которые выполняются на каждый запрос. Тест падает, если
+    таблица товаров читается полным сканированием или сортируется во
+    временном B-дереве после обхода всей таблицы.
+    """
+    GUARDED_TABLES = ('shop_product', 'shop_producttag', 'shop_productimage', 'shop_productstats')
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.category = Category.objects.create(name='Обувь')
+        brand = Brand.objects.create(name='Nike')
+        cls.products = [
+            Product.objects.create(name=f'Кроссовки {i}', description='Беговые', price=1000 + i * 10,
+                                   stock=i % 3, size='M', category=cls.category, brand=brand)
+            for i in range(30)
+        ]
+
+    def setUp(self) -> None:
+        if connection.vendor != 'sqlite':
+            self.skipTest('Планы запросов проверяются только для SQLite')
+
+    def plan(self, sql: str, params: tuple = ()) -> list[str]:
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def full_scans(self, plan: list[str]) -> list[str]:
+        """
+        Возвращает шаги плана, читающие защищённую таблицу целиком.
+        """
+        problems = []
+        scanned = False
+        for step in plan:
+            parts = step.split()
+            if parts[:1] == ['SCAN'] and parts[1] in self.GUARDED_TABLES:
+                scanned = True
+                if 'USING' not in parts:
+                    problems.append(step)
+        if scanned and 'USE TEMP B-TREE FOR ORDER BY' in plan:
+            problems.append('USE TEMP B-TREE FOR ORDER BY')
+        return problems
+
+    def assert_indexed(self, url: str, params: dict = None) -> None:
+        self.client.get(url, params)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        for query in app_queries(context):
+            if not query['sql'].startswith('SELECT'):
+                continue
+            plan = self.plan(query['sql'])
+            with self.subTest(url=url, params=params, sql=query['sql']):
+                self.assertEqual(self.full_scans(plan), [], plan)
+
+    def test_product_list(self):
+        self.assert_indexed(reverse('product_list'))
+        self.assert_indexed(reverse('product_list'), {'category': 'обу'})
+        self.assert_indexed(reverse('product_list'), {'search': 'кроссовки'})
+
+    def test_product_list_next_page(self):
+        response = self.client.get(reverse('product_list'))
+        self.assert_indexed(reverse('product_list'), {'cursor': response.context['page'].next_cursor})
+
+    def test_product_list_by_category(self):
+        self.assert_indexed(reverse('product_list_by_category', args=[self.category.pk]))
+
+    def test_product_detail(self):
+        self.assert_indexed(reverse('product_detail', args=[self.products[0].pk]))
+        self.assert_indexed(reverse('api_product_detail', args=[self.products[0].pk]))
+
+    def test_api_filters(self):
+        url = reverse('api_product_list')
+        for params in ({}, {'price_min': 1050, 'price_max': 1100}, {'in_stock': 'true'},
+                       {'category': 'обу'}, {'size': 'M'}, {'search': 'беговые'}):
+            self.assert_indexed(url, params)
+
+    def test_available_products_use_partial_index(self):
+        queryset = Product.objects.available().order_by('-created_at', '-id')[:24]
+        plan = self.plan(*queryset.query.sql_with_params())
+        self.assertIn('SCAN shop_product USING INDEX shop_product_available_idx', plan)
+
+    def test_detects_full_scan(self):
+        queryset = Product.objects.filter(description__contains='x').order_by('name')
+        plan = self.plan(*queryset.query.sql_with_params())
+        self.assertNotEqual(self.full_scans(plan), [])
+
+
+class AdminChangelistTests(TestCase):
+    def setUp(self) -> None:
+        """
+        Создаёт администратора и каталог из нескольких брендов и категорий.
+        """
+        self.admin = User.objects.create_superuser(username='admin', password='pass')
+        self.client.force_login(self.admin)
+        self.add_products(3)
+
+    def add_products(self, count: int) -> None:
+        for i in range(count):
+            category = Category.objects.create(name=f'Категория {Category.objects.count()}')
+            brand = Brand.objects.create(name=f'Бренд {Brand.objects.count()}')
+            Product.objects.create(name=f'Товар {i}', price=100, stock=i % 2, size='M', category=category, brand=brand)
+
+    def changelist_queries(self, name: str, params: dict = None) -> list[str]:
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse(name), params or {})
+        self.assertEqual(response.status_code, 200)
+        return [query['sql'] for query in app_queries(context)]
+
+    def test_changelists_run_constant_number_of_queries(self):
+        for name in ('admin:shop_product_changelist', 'admin:shop_category_changelist', 'admin:shop_brand_changelist'):
+            with self.subTest(name=name):
+                before = len(self.changelist_queries(name))
+                self.add_products(4)
+                self.assertEqual(len(self.changelist_queries(name)), before)
+
+    def test_product_counts_are_annotated(self):
+        response = self.client.get(reverse('admin:shop_category_changelist'), {'o': '-3'})
+        self.assertEqual(response.context['cl'].result_list[0].product_count, 1)
+
+    def test_estimated_count_paginator(self):
+        from django.test import override_settings
+        from .pagination import EstimatedCountPaginator
+        with override_settings(ADMIN_ESTIMATED_COUNT_THRESHOLD=2):
+            paginator = EstimatedCountPaginator(Product.objects.order_by('pk'), 2)
+            with CaptureQueriesContext(connection) as context:
+                self.assertEqual(paginator.count, Product.objects.order_by('-pk').first().pk)
+            self.assertNotIn('COUNT(', app_queries(context)[0]['sql'])
+            self.assertEqual(EstimatedCountPaginator(Product.objects.filter(stock=1), 2).count, 1)
+        self.assertEqual(EstimatedCountPaginator(Product.objects.order_by('pk'), 2).count, 3)
+
+    def test_filter_matching_more_than_threshold_is_counted_exactly(self):
+        from django.test import override_settings
+        from .pagination import EstimatedCountPaginator
+        self.add_products(2)
+        with override_settings(ADMIN_ESTIMATED_COUNT_THRESHOLD=2):
+            paginator = EstimatedCountPaginator(Product.objects.filter(price=100).order_by('pk'), 2)
+            self.assertEqual((paginator.count, paginator.num_pages), (5, 3))
+            self.assertEqual(len(paginator.page(3)), 1)
+            response = self.client.get(reverse('admin:shop_product_changelist'), {'q': 'Товар'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cl'].result_count, 5)
+
+
+class PricingTests(TestCase):
+    def test_price_line_rounds_discount_per_line(self):
+        from .pricing import price_line
+        line = price_line(Decimal('999.99'), 3, 15)
+        self.assertEqual(line, (Decimal('2999.97'), Decimal('450.00'), Decimal('2549.97')))
+        # Половина копейки округляется вверх
+        self.assertEqual(price_line(Decimal('0.05'), 1, 50).discount, Decimal('0.03'))
+        self.assertEqual(str(price_line(Decimal('10'), 2).total), '20.00')
+
+    def test_batch_matches_scalar(self):
+        import random
+        from .pricing import price_line, price_many, price_totals
+        rng = random.Random(1)
+        rows = [(Decimal(rng.randint(0, 10 ** 7)).scaleb(-2), rng.randint(0, 20), rng.choice((0, None, 1, 15, 33, 99)))
+                for _ in range(2000)]
+        rows += [(Decimal('0.005'), 3, 10), (Decimal('12.34'), 2, Decimal('12.5')), (Decimal('-1.01'), 1, 50)]
+        expected = [price_line(*row) for row in rows]
+        self.assertEqual([tuple(map(str, line)) for line in price_many(rows)],
+                         [tuple(map(str, line)) for line in expected])
+        totals = price_totals(rows)
+        self.assertEqual(totals.subtotal, sum(line.subtotal for line in expected))
+        self.assertEqual(totals.total, sum(line.total for line in expected))
+        self.assertEqual(str(price_totals([]).total), '0.00')
@@ -0,0 +1,174 @@
+import io
+import logging
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+from . import cache as shop_cache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RENDITION_WIDTHS: tuple[int, ...] = (320, 640, 1024)
+RENDITION_FORMATS: dict[str, dict] = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'jpeg': {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True},
+}
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def rendition_widths() -> tuple[int, ...]:
+    return tuple(getattr(settings, 'PRODUCT_IMAGE_RENDITION_WIDTHS', DEFAULT_RENDITION_WIDTHS))
+
+
+def worker_count() -> int:
+    """
+    Количество процессов для обработки изображений; 0 — обработка в текущем процессе.
+    """
+    return getattr(settings, 'PRODUCT_IMAGE_WORKERS', 2)
+
+
+def render_image(data: bytes, widths: Iterable[int]) -> list[tuple[str, int, int, bytes]]:
+    """
+    Строит уменьшенные копии изображения во всех форматах.
+
+    Функция не обращается к Django и выполняется в дочернем процессе пула.
+    Изображение не увеличивается: ширины больше исходной пропускаются, а если
+    исходник уже всех меньше, создаётся одна копия исходной ширины.
+
+    Args:
+        data (bytes): содержимое исходного файла.
+        widths (Iterable[int]): целевые ширины.
+
+    Returns:
+        list: кортежи (формат, ширина, высота, содержимое файла).
+    """
+    with Image.open(io.BytesIO(data)) as source:
+        source = ImageOps.exif_transpose(source)
+        source.load()
+        targets = sorted({width for width in widths if width < source.width}) or [source.width]
+        results = []
+        for width in targets:
+            height = max(1, round(source.height * width / source.width))
+            resized = source.resize((width, height), Image.Resampling.LANCZOS)
+            for name, options in RENDITION_FORMATS.items():
+                image = resized
+                if name == 'jpeg' and image.mode not in ('RGB', 'L'):
+                    image = _flatten(image)
+                elif image.mode not in ('RGB', 'RGBA', 'L'):
+                    image = image.convert('RGBA')
+                buffer = io.BytesIO()
+                image.save(buffer, **options)
+                results.append((name, width, height, buffer.getvalue()))
+        return results
+
+
+def _flatten(image: Image.Image) -> Image.Image:
+    """
+    Накладывает изображение с прозрачностью на белый фон (JPEG не поддерживает альфа-канал).
+    """
+    image = image.convert('RGBA')
+    background = Image.new('RGB', image.size, (255, 255, 255))
+    background.paste(image, mask=image.getchannel('A'))
+    return background
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """
+    Возвращает общий для процесса пул обработчиков изображений.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=worker_count())
+        return _executor
+
+
+def store_renditions(image_id: int, renditions: list[tuple[str, int, int, bytes]]) -> None:
+    """
+    Сохраняет файлы копий и их метаданные, заменяя прежние копии изображения.
+
+    Args:
+        image_id (int): ID ProductImage.
+        renditions (list): результат render_image.
+    """
+    from .models import ProductImage, ProductImageRendition
+
+    if not ProductImage.objects.filter(pk=image_id).exists():
+        return
+    with transaction.atomic():
+        for old in ProductImageRendition.objects.filter(image_id=image_id):
+            old.delete()
+        objects = []
+        for image_format, width, height, content in renditions:
+            rendition = ProductImageRendition(
+                image_id=image_id, format=image_format, width=width, height=height, size=len(content),
+            )
+            extension = 'jpg' if image_format == 'jpeg' else image_format
+            rendition.file.save(f'{image_id}_{width}.{extension}', ContentFile(content), save=False)
+            objects.append(rendition)
+        ProductImageRendition.objects.bulk_create(objects)
+    shop_cache.bump_version(shop_cache.IMAGES)
+
+
+def generate_renditions(image_id: int) -> None:
+    """
+    Синхронно строит и сохраняет копии изображения.
+
+    Args:
+        image_id (int): ID ProductImage.
+    """
+    from .models import ProductImage
+
+    image = ProductImage.objects.filter(pk=image_id).first()
+    if image is None or not image.image:
+        return
+    with image.image.open('rb') as source:
+        data = source.read()
+    store_renditions(image_id, render_image(data, rendition_widths()))
+
+
+def _on_rendered(image_id: int, future: Future) -> None:
+    close_old_connections()
+    try:
+        store_renditions(image_id, future.result())
+    except Exception:
+        logger.exception('Не удалось создать копии изображения %s', image_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_renditions(image_id: int) -> Optional[Future]:
+    """
+    Ставит построение копий в пул процессов, не блокируя текущий запрос.
+
+    Файл читается в текущем процессе, масштабирование и кодирование идут в
+    дочернем, а результат сохраняется в потоке обратного вызова пула.
+    При PRODUCT_IMAGE_WORKERS = 0 копии строятся синхронно.
+
+    Args:
+        image_id (int): ID ProductImage.
+
+    Returns:
+        Optional[Future]: задача пула или None при синхронной обработке.
+    """
+    if worker_count() <= 0:
+        generate_renditions(image_id)
+        return None
+
+    from .models import ProductImage
+
+    image = ProductImage.objects.filter(pk=image_id).first()
+    if image is None or not image.image:
+        return None
+    with image.image.open('rb') as source:
+        data = source.read()
+    future = get_executor().submit(render_image, data, rendition_widths())
+    future.add_done_callback(lambda done: _on_rendered(image_id, done))
+    return future
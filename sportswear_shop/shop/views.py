@@ -1,11 +1,13 @@
 from typing import Optional
 from django.shortcuts import render, get_object_or_404, redirect
-from django.db.models import Count, Avg, Sum, Q, QuerySet
+from django.db.models import QuerySet
 from django.http import HttpRequest, HttpResponse
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition, require_GET
 from django.template.loader import render_to_string
-from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import generics
 from django_filters.rest_framework import DjangoFilterBackend
@@ -13,16 +15,35 @@ from django_filters.rest_framework import DjangoFilterBackend
 from .models import Product, Category
 from .forms import ProductForm
 from discounts.models import Discount
+from discounts import resolver
 from reviews.forms import ReviewForm
-from .serializers import ProductSerializer
+from .serializers import ProductSerializer, get_favorite_ids
 from .filters import ProductFilter
+from .pagination import ProductCursorPagination, paginate_products
+from .search import search_products
+from .facets import get_facets
+from .homepage import get_homepage_context
+from . import autocomplete, recommendations
+from .catalog_stats import CatalogStatistics
+from .fieldsets import SparseFieldsMixin
+from .exporter import CONTENT_TYPES, DEFAULT_CHUNK_SIZE, EXPORT_FORMATS, export_products
+from .conditional import (
+    anonymous_condition, catalog_etag, catalog_last_modified, product_etag, product_last_modified,
+)
 from reviews.models import Review
 
+PRODUCTS_PER_PAGE: int = 24
+SEARCH_RESULTS_LIMIT: int = 20
+EXPORT_MAX_CHUNK_SIZE: int = 10000
+RECOMMENDATIONS_LIMIT: int = 6
+
 
 def index(request: HttpRequest) -> HttpResponse:
     """
     Главная страница с подборками товаров и активными скидками.
 
+    Подборки берутся из кеша блоков (см. shop.homepage), поиск выполняется на каждый запрос.
+
     Args:
         request (HttpRequest): HTTP-запрос.
 
@@ -30,31 +51,27 @@ def index(request: HttpRequest) -> HttpResponse:
         HttpResponse: Отрендеренная главная страница.
     """
     search_query: str = request.GET.get('q', '')
-    new_products: QuerySet = Product.objects.order_by('-created_at')[:5]
-    popular_products: QuerySet = Product.objects.annotate(order_count=Count('order_items')).order_by('-order_count')[:5]
-    active_discounts: QuerySet = Discount.objects.filter(active=True).order_by('-discount_percent')[:5]
-    avg_price: Optional[float] = Product.objects.aggregate(Avg('price'))['price__avg']
-    categories: QuerySet = Category.objects.all()
 
     search_results: Optional[QuerySet] = None
     if search_query:
-        search_results = Product.objects.filter(name__icontains=search_query)
+        search_results = search_products(
+            Product.objects.prefetch_related('images__renditions'), search_query
+        )[:SEARCH_RESULTS_LIMIT]
 
     return render(request, 'shop/index.html', {
-        'new_products': new_products,
-        'popular_products': popular_products,
-        'active_discounts': active_discounts,
-        'avg_price': avg_price,
+        **get_homepage_context(),
         'search_query': search_query,
         'search_results': search_results,
-        'categories': categories,
     })
 
 
+@anonymous_condition(product_etag, product_last_modified)
 def product_detail(request: HttpRequest, pk: int) -> HttpResponse:
     """
     Детальная страница товара.
 
+    Анонимным пользователям отвечает 304, если карточка не менялась.
+
     Args:
         request (HttpRequest): HTTP-запрос.
         pk (int): ID товара.
@@ -62,9 +79,17 @@ def product_detail(request: HttpRequest, pk: int) -> HttpResponse:
     Returns:
         HttpResponse: Отрендеренная страница товара.
     """
-    product: Product = get_object_or_404(Product, pk=pk)
+    product: Product = get_object_or_404(
+        Product.objects.select_related('brand', 'category', 'stats').prefetch_related('images__renditions'), pk=pk
+    )
     form: ReviewForm = ReviewForm()
-    return render(request, 'shop/product_detail.html', {'product': product, 'form': form})
+    recommended = recommendations.recommended_products(
+        product.pk, Product.objects.prefetch_related('images__renditions'), RECOMMENDATIONS_LIMIT,
+    )
+    return render(request, 'shop/product_detail.html', {
+        'product': product, 'form': form, 'recommendations': recommended,
+        'discount': resolver.best_discount(product.pk),
+    })
 
 
 def discount_detail(request: HttpRequest, pk: int) -> HttpResponse:
@@ -96,10 +121,13 @@ def discount_list(request: HttpRequest) -> HttpResponse:
     return render(request, 'discounts/discount_list.html', {'discounts': discounts})
 
 
+@anonymous_condition(catalog_etag, catalog_last_modified)
 def product_list(request: HttpRequest) -> HttpResponse:
     """
     Список товаров с фильтрацией и поиском.
 
+    Анонимным пользователям отвечает 304, если каталог не менялся.
+
     Args:
         request (HttpRequest): HTTP-запрос.
 
@@ -112,33 +140,22 @@ def product_list(request: HttpRequest) -> HttpResponse:
     products: QuerySet = Product.objects.all().select_related('category', 'brand')
 
     if search_query:
-        products = products.filter(
-            Q(name__icontains=search_query) |
-            Q(description__icontains=search_query) |
-            Q(brand__name__icontains=search_query)
-        )
+        products = search_products(products, search_query)
 
     if category_filter:
         products = products.filter(category__name__icontains=category_filter)
 
-    expensive_products = products.filter(price__gt=5000)
-    available_products = products.exclude(stock=0)
-    sorted_products = products.order_by('-price')
-
-    avg_price = products.aggregate(Avg('price'))
-    total_stock = products.aggregate(Sum('stock'))
-    category_counts = Product.objects.values('category__name').annotate(Count('id'))
+    catalog_stats = CatalogStatistics(
+        products, (search_query.strip().lower(), category_filter.strip().lower())
+    )
 
-    products = products.prefetch_related('tags')
+    products = products.prefetch_related('tags', 'images__renditions')
+    pagination = paginate_products(request, products, PRODUCTS_PER_PAGE)
 
     return render(request, 'shop/product_list.html', {
-        'products': products,
-        'expensive_products': expensive_products,
-        'available_products': available_products,
-        'sorted_products': sorted_products,
-        'avg_price': avg_price,
-        'total_stock': total_stock,
-        'category_counts': category_counts,
+        **pagination,
+        'products': pagination['page'],
+        'catalog_stats': catalog_stats,
         'search_query': search_query,
     })
 
@@ -215,32 +232,173 @@ def product_list_by_category(request: HttpRequest, category_id: int) -> HttpResp
         HttpResponse: Отрендеренная страница со списком товаров.
     """
     category = get_object_or_404(Category, id=category_id)
-    products = Product.objects.filter(category=category)
+    products = Product.objects.filter(category=category).select_related('brand').prefetch_related('images__renditions')
+    pagination = paginate_products(request, products, PRODUCTS_PER_PAGE)
     return render(request, 'shop/product_list.html', {
-        'products': products,
+        **pagination,
+        'products': pagination['page'],
         'category': category,
     })
 
 
-class ProductDetailAPIView(APIView):
+class ProductSerializerMixin(SparseFieldsMixin):
     """
-    API для детальной информации о товаре.
+    Общая настройка сериализатора товаров для API: выборочные поля и избранное.
     """
-    def get(self, request: HttpRequest, pk: int) -> Response:
-        product = get_object_or_404(Product, pk=pk)
-        serializer = ProductSerializer(product, context={'user': request.user})
-        return Response(serializer.data)
+    queryset = Product.objects.all()
+    serializer_class = ProductSerializer
 
+    def get_serializer_context(self) -> dict:
+        context = super().get_serializer_context()
+        context['user'] = self.request.user
+        return context
+
+    def get_serializer(self, *args, **kwargs) -> ProductSerializer:
+        """
+        Передаёт в сериализатор избранное пользователя одним запросом на страницу,
+        если поле is_favorite запрошено.
+        """
+        serializer = super().get_serializer(*args, **kwargs)
+        if args:
+            product_serializer = getattr(serializer, 'child', serializer)
+            products = args[0] if kwargs.get('many') else [args[0]]
+            if product_serializer.is_requested('is_favorite'):
+                serializer.context['favorite_ids'] = get_favorite_ids(self.request.user, products)
+        return serializer
+
+
+@method_decorator(condition(etag_func=product_etag, last_modified_func=product_last_modified), name='get')
+class ProductDetailAPIView(ProductSerializerMixin, generics.RetrieveAPIView):
+    """
+    API для детальной информации о товаре с поддержкой If-None-Match/If-Modified-Since,
+    ?fields= и ?expand=.
+    """
 
-class ProductListAPIView(generics.ListAPIView):
+
+@method_decorator(condition(etag_func=catalog_etag, last_modified_func=catalog_last_modified), name='get')
+class ProductListAPIView(ProductSerializerMixin, generics.ListAPIView):
     """
-    API для списка товаров с фильтрацией.
+    API для списка товаров с фильтрацией, курсорной пагинацией, ?fields= и ?expand=.
+
+    Отвечает 304 на If-None-Match/If-Modified-Since, пока не изменилась версия каталога.
     """
-    queryset = Product.objects.all().select_related('category', 'brand')
-    serializer_class = ProductSerializer
+    pagination_class = ProductCursorPagination
     filter_backends = [DjangoFilterBackend]
     filterset_class = ProductFilter
 
+    def list(self, request: HttpRequest, *args, **kwargs) -> Response:
+        """
+        Возвращает страницу товаров; с параметром ?facets=1 добавляет счётчики фасетов.
+        """
+        response = super().list(request, *args, **kwargs)
+        if request.query_params.get('facets', '').lower() in ('1', 'true', 'yes'):
+            filterset = DjangoFilterBackend().get_filterset(request, self.get_queryset(), self)
+            if filterset.is_valid():
+                response.data['facets'] = get_facets(filterset)
+        return response
+
+
+class ProductRecommendationsAPIView(ProductSerializerMixin, generics.ListAPIView):
+    """
+    API «часто покупают вместе» для товара; поддерживает ?fields= и ?expand=.
+    """
+    pagination_class = None
+
+    def list(self, request: HttpRequest, *args, **kwargs) -> Response:
+        get_object_or_404(Product.objects.only('pk'), pk=kwargs['pk'])
+        products = recommendations.recommended_products(kwargs['pk'], self.get_queryset())
+        return Response(self.get_serializer(products, many=True).data)
+
+
+@require_GET
+def product_autocomplete(request: HttpRequest) -> JsonResponse:
+    """
+    Подсказки для строки поиска по товарам, брендам, категориям и тегам.
+
+    Ответ строится по индексу в памяти процесса (см. shop.autocomplete), без запросов к БД.
+
+    Args:
+        request (HttpRequest): HTTP-запрос с параметрами ?q= и ?limit=.
+
+    Returns:
+        JsonResponse: {'query': ..., 'results': [{'type', 'id', 'label', 'url'}, ...]}.
+    """
+    query = request.GET.get('q', '')
+    try:
+        limit = int(request.GET.get('limit', autocomplete.DEFAULT_LIMIT))
+    except ValueError:
+        limit = autocomplete.DEFAULT_LIMIT
+    limit = min(max(limit, 1), autocomplete.MAX_LIMIT)
+    results = autocomplete.suggest(query, limit)
+    return JsonResponse({'query': query, 'results': [suggestion.as_dict() for suggestion in results]})
+
+
+def _accepts_encoding(request: HttpRequest, coding: str) -> bool:
+    """
+    Проверяет по Accept-Encoding, что клиент принимает кодирование coding.
+
+    Учитываются q-значения: «gzip;q=0» означает отказ. Если кодирование не
+    названо явно, действует «*».
+
+    Args:
+        request (HttpRequest): HTTP-запрос.
+        coding (str): название кодирования, например 'gzip'.
+
+    Returns:
+        bool: True, если кодирование допустимо.
+    """
+    qualities: dict[str, float] = {}
+    for item in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        name, *params = [part.strip() for part in item.split(';')]
+        if not name:
+            continue
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name.lower()] = quality
+    quality = qualities.get(coding, qualities.get('*', 0.0))
+    return quality > 0
+
+
+@require_GET
+def product_export(request: HttpRequest, file_format: str) -> StreamingHttpResponse:
+    """
+    Потоковая выгрузка всего каталога в NDJSON или CSV.
+
+    Ответ формируется по мере чтения товаров пачками, поэтому память не
+    зависит от размера каталога. Если клиент принимает gzip, поток сжимается.
+
+    Args:
+        request (HttpRequest): HTTP-запрос; ?chunk_size= задаёт размер пачки.
+        file_format (str): 'ndjson' или 'csv'.
+
+    Returns:
+        StreamingHttpResponse: файл выгрузки.
+    """
+    if file_format not in EXPORT_FORMATS:
+        raise Http404('Неизвестный формат выгрузки')
+    try:
+        chunk_size = int(request.GET.get('chunk_size', DEFAULT_CHUNK_SIZE))
+    except ValueError:
+        chunk_size = DEFAULT_CHUNK_SIZE
+    chunk_size = min(max(chunk_size, 1), EXPORT_MAX_CHUNK_SIZE)
+    compress = _accepts_encoding(request, 'gzip')
+
+    response = StreamingHttpResponse(
+        export_products(file_format, compress, chunk_size, request.build_absolute_uri),
+        content_type=CONTENT_TYPES[file_format],
+    )
+    response['Content-Disposition'] = f'attachment; filename="catalog.{file_format}"'
+    patch_vary_headers(response, ['Accept-Encoding'])
+    if compress:
+        response['Content-Encoding'] = 'gzip'
+    return response
+
 
 @login_required
 def add_review(request: HttpRequest, pk: int) -> HttpResponse:
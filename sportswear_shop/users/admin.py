@@ -2,6 +2,7 @@ from typing import Optional
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.utils.html import format_html
+from django.db.models import Count, QuerySet
 from django.http import HttpRequest
 from .models import User, UserGroup
 
@@ -125,12 +126,15 @@ class UserGroupAdmin(admin.ModelAdmin):
     readonly_fields = ('users_in_group',)
     fields = ('name', 'permissions', 'users_in_group')
 
-    @admin.display(description='Пользователей')
+    def get_queryset(self, request: HttpRequest) -> QuerySet:
+        return super().get_queryset(request).annotate(user_count=Count('user'))
+
+    @admin.display(description='Пользователей', ordering='user_count')
     def user_count(self, obj: UserGroup) -> int:
         """
-        Возвращает количество пользователей в группе.
+        Возвращает количество пользователей в группе (аннотация get_queryset).
         """
-        return obj.user_set.count()
+        return obj.user_count
 
     @admin.display(description='Пользователи в группе')
     def users_in_group(self, obj: UserGroup) -> str:
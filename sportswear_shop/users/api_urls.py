@@ -0,0 +1,8 @@
+from django.urls import path
+from .api_views import FavoriteProductsAPIView, FavoriteProductsBulkAPIView
+
+urlpatterns = [
+    path('favorites/', FavoriteProductsAPIView.as_view(), name='api_favorites'),
+    path('favorites/add/', FavoriteProductsBulkAPIView.as_view(operation='add'), name='api_favorites_add'),
+    path('favorites/remove/', FavoriteProductsBulkAPIView.as_view(operation='remove'), name='api_favorites_remove'),
+]
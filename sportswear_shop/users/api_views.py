@@ -0,0 +1,52 @@
+from rest_framework import permissions, status
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .serializers import FavoriteProductsSerializer
+
+
+class FavoriteProductsAPIView(APIView):
+    """
+    API endpoint со списком ID избранных товаров текущего пользователя.
+    Разрешения: только для аутентифицированных пользователей.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request: Request) -> Response:
+        """
+        Возвращает ID избранных товаров.
+        """
+        product_ids = request.user.favorite_products.order_by('pk').values_list('pk', flat=True)
+        return Response({'product_ids': list(product_ids)})
+
+
+class FavoriteProductsBulkAPIView(APIView):
+    """
+    API endpoint для массового добавления или удаления товаров из избранного.
+
+    Принимает {"product_ids": [...]} и меняет связи одним запросом на вставку
+    или удаление вместо отдельного запроса на каждый товар.
+    Разрешения: только для аутентифицированных пользователей.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    operation: str = 'add'
+
+    def post(self, request: Request) -> Response:
+        """
+        Добавляет (operation='add') или удаляет (operation='remove') товары из избранного.
+
+        :param request: запрос с телом {"product_ids": [...]}
+        :return: ID изменённых товаров и общее количество избранного
+        """
+        serializer = FavoriteProductsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        product_ids = serializer.validated_data['product_ids']
+        if self.operation == 'add':
+            request.user.favorite_products.add(*product_ids)
+        else:
+            request.user.favorite_products.remove(*product_ids)
+        return Response(
+            {'product_ids': product_ids, 'count': request.user.favorite_products.count()},
+            status=status.HTTP_200_OK,
+        )
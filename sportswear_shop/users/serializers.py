@@ -0,0 +1,42 @@
+from django.contrib.auth import get_user_model
+from rest_framework import serializers
+
+from shop.fieldsets import DynamicFieldsMixin
+from shop.models import Product
+
+MAX_FAVORITES_BATCH = 500
+
+
+class FavoriteProductsSerializer(serializers.Serializer):
+    """
+    Сериализатор пачки товаров для массового изменения избранного.
+    """
+    product_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=MAX_FAVORITES_BATCH,
+    )
+
+    def validate_product_ids(self, value: list[int]) -> list[int]:
+        """
+        Убирает дубликаты и проверяет, что все товары существуют.
+
+        :param value: список ID товаров из запроса
+        :return: список уникальных ID в исходном порядке
+        :raises serializers.ValidationError: если часть товаров не найдена
+        """
+        product_ids = list(dict.fromkeys(value))
+        existing = set(Product.objects.filter(pk__in=product_ids).values_list('pk', flat=True))
+        missing = [product_id for product_id in product_ids if product_id not in existing]
+        if missing:
+            raise serializers.ValidationError(f'Товары не найдены: {", ".join(map(str, missing))}')
+        return product_ids
+
+
+class UserSummarySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """
+    Краткие данные пользователя для вложения в другие объекты (?expand=user).
+    """
+    class Meta:
+        model = get_user_model()
+        fields = ['id', 'username']
@@ -1,3 +1,58 @@
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from shop.models import Brand, Category, Product
+
+User = get_user_model()
+
+
+class FavoriteProductsAPITests(TestCase):
+    def setUp(self) -> None:
+        """
+        Создаёт пользователя и три товара.
+        """
+        self.user = User.objects.create_user(username='fan', password='pass')
+        category = Category.objects.create(name='Обувь')
+        brand = Brand.objects.create(name='Nike')
+        self.products = [
+            Product.objects.create(name=f'Товар {i}', price=100, stock=1, size='M', category=category, brand=brand)
+            for i in range(3)
+        ]
+        self.ids = [product.pk for product in self.products]
+
+    def test_requires_authentication(self):
+        response = self.client.post(reverse('api_favorites_add'), {'product_ids': self.ids}, content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+
+    def test_bulk_add_and_remove(self):
+        self.client.login(username='fan', password='pass')
+        response = self.client.post(reverse('api_favorites_add'), {'product_ids': self.ids + [self.ids[0]]},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 3)
+        response = self.client.post(reverse('api_favorites_remove'), {'product_ids': self.ids[:2]},
+                                    content_type='application/json')
+        self.assertEqual(response.json()['count'], 1)
+        self.assertEqual(self.client.get(reverse('api_favorites')).json()['product_ids'], [self.ids[2]])
+
+    def test_unknown_products_are_rejected(self):
+        self.client.login(username='fan', password='pass')
+        response = self.client.post(reverse('api_favorites_add'), {'product_ids': [self.ids[0], 999999]},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.user.favorite_products.count(), 0)
+
+
+class UserGroupAdminTests(TestCase):
+    def test_changelist_annotates_user_count(self):
+        from .models import UserGroup
+        group = UserGroup.objects.create(name='Тестовая группа')
+        admin = User.objects.create_superuser(username='admin', password='pass')
+        for name in ('first', 'second'):
+            User.objects.create_user(username=name, password='pass').groups.add(group)
+        UserGroup.objects.create(name='Пустая группа')
+        self.client.force_login(admin)
+        response = self.client.get(reverse('admin:users_usergroup_changelist'))
+        counts = {item.name: item.user_count for item in response.context['cl'].result_list}
+        self.assertEqual((counts['Тестовая группа'], counts['Пустая группа']), (2, 0))